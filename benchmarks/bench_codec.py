@@ -0,0 +1,51 @@
+'''
+Compares packing and unpacking packets through the serialize/unload_packet wrappers with the precompiled
+codec (encode_into on a reusable buffer and decode into records). Run from the repository root:
+
+    python benchmarks/bench_codec.py
+'''
+
+import argparse
+import struct
+import timeit
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared import packet
+
+SLOT = 1
+SEQ = 1
+
+def legacy_move_round_trip():
+    '''
+    The MOVE path as it was before the codec: a format string parsed on every call and a dictionary per packet.
+    It packs the same payload as the other MOVE cases, so only the codec differs.
+    '''
+    data = struct.pack("!cBIff", packet.Status.MOVE.value.encode(), SLOT, SEQ, 1.0, 2.0)
+    s = packet.Status(struct.unpack("!c", data[:1])[0].decode())
+    slot, seq, x, y = struct.unpack("!BIff", data[1:])
+    return {'status': s, 'slot': slot, 'seq': seq, 'x': x, 'y': y}
+
+def main():
+    parser = argparse.ArgumentParser(description="Packet codec microbenchmark.")
+    parser.add_argument("--number", type=int, default=200000, help="round trips per measurement")
+    args = parser.parse_args()
+
+    buffer = bytearray(packet.MAX_SIZE)
+    view = memoryview(buffer)
+    move_dict = {"slot": SLOT, "seq": SEQ, "x": 1.0, "y": 2.0}
+    ball_dict = {"x": 1.0, "y": 2.0}
+
+    cases = {
+        "MOVE legacy": legacy_move_round_trip,
+        "MOVE wrappers": lambda: packet.unload_packet(packet.serialize(move_dict, packet.Status.MOVE)),
+        "MOVE codec": lambda: packet.decode(view[:packet.encode_into(buffer, 0, packet.Status.MOVE, SLOT, SEQ, 1.0, 2.0)]),
+        "BALL_POS wrappers": lambda: packet.unload_packet(packet.serialize(ball_dict, packet.Status.BALL_POS)),
+        "BALL_POS codec": lambda: packet.decode(view[:packet.encode_into(buffer, 0, packet.Status.BALL_POS, 1.0, 2.0)]),
+    }
+
+    for name, fn in cases.items():
+        seconds = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print(f"{name:>18}: {seconds / args.number * 1e9:8.0f} ns per round trip")
+
+if __name__ == "__main__":
+    main()
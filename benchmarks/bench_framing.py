@@ -0,0 +1,100 @@
+'''
+Measures how many messages per second one connection can receive with the length prefixed frame_buffer,
+compared with the old newline split receive. Run from the repository root:
+
+    python benchmarks/bench_framing.py
+'''
+
+import argparse
+import socket
+import threading
+import time
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from shared import packet
+from shared import framing
+
+RECV_SIZE = 1024
+
+def legacy_receive(conn: socket.socket) -> bytes:
+    '''
+    The receive loop the client and server used before framing. Whatever follows the first newline is dropped.
+    '''
+    buff = b''
+    while True:
+        d = conn.recv(RECV_SIZE)
+
+        if not d:
+            raise ConnectionError("Connection closed.")
+        buff += d
+
+        if b'\n' in buff:
+            full_data, buff = buff.split(b'\n', 1)
+            return full_data
+
+        if len(buff) >= RECV_SIZE:
+            return buff
+
+def send_all(conn: socket.socket, message: bytes, count: int, batch: int) -> None:
+    '''
+    Sends count messages, batch messages per sendall so they get coalesced like they do under load.
+    '''
+    sent = 0
+    while sent < count:
+        n = min(batch, count - sent)
+        conn.sendall(message * n)
+        sent += n
+    conn.shutdown(socket.SHUT_WR)
+
+def run(receiver, message: bytes, count: int, batch: int) -> tuple[int, float]:
+    '''
+    Runs a sender thread and the receiver on a socket pair. Returns the messages received and the seconds taken.
+    '''
+    a, b = socket.socketpair()
+    t = threading.Thread(target=send_all, args=(a, message, count, batch), daemon=True)
+
+    start = time.perf_counter()
+    t.start()
+    received = receiver(b)
+    elapsed = time.perf_counter() - start
+
+    t.join()
+    a.close()
+    b.close()
+    return received, elapsed
+
+def receive_legacy(conn: socket.socket) -> int:
+    received = 0
+    try:
+        while True:
+            legacy_receive(conn)
+            received += 1
+    except ConnectionError:
+        return received
+
+def receive_framed(conn: socket.socket) -> int:
+    received = 0
+    buffer = framing.frame_buffer()
+    while buffer.recv_into(conn):
+        for payload in buffer.frames():
+            received += 1
+    return received
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive throughput of one connection.")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=16, help="messages written per sendall")
+    args = parser.parse_args()
+
+    payload = packet.serialize({"x": 450.0, "y": 300.0}, packet.Status.BALL_POS)
+
+    for name, receiver, message in (
+        ("newline split", receive_legacy, payload + b'\n'),
+        ("frame_buffer", receive_framed, framing.frame(payload)),
+    ):
+        received, elapsed = run(receiver, message, args.messages, args.batch)
+        print(f"{name:>14}: {received / elapsed:12,.0f} messages/s per connection, "
+              f"{received}/{args.messages} messages delivered")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+'''
+Runs every hot path benchmark, writes the results to a JSON file and compares them with a stored baseline.
+Exits with status 1 if any case got slower than the baseline by more than the threshold, so it can gate a review.
+Run from the repository root:
+
+    python benchmarks/run.py
+    python benchmarks/run.py --save-baseline      # once on a new machine, and after an intended change
+
+The cases are:
+    - codec/<STATUS>: packet.serialize and packet.unload_packet of one packet, for every Status
+    - codec/delta: packet.encode_delta and packet.decode_delta of a tick where the ball and one paddle moved
+    - physics/ball_update: Ball.update of a four player match for one tick
+    - physics/hit_player: Ball.hitPlayer of one move against four paddles
+    - broadcast/<N>_clients: room.update_clients of one SNAPSHOT to N clients on loopback sockets, until every
+      client received it
+    - framing/receive: client.receive of one SNAPSHOT frame from a socket
+    - calibration/python: plain Python arithmetic that no change to the repository affects
+
+Every case reports the best of --repeat runs in nanoseconds per operation. The baseline only means something on
+the machine it was recorded on, so it is not committed: every machine records its own benchmarks/baseline.json.
+The baseline times are scaled by how much slower or faster calibration/python ran than when the baseline was
+recorded, so a machine that is busier or clocked lower than it was does not fail every case. A case regresses only
+when it is both more than --threshold and more than --min-change nanoseconds slower than its scaled baseline, so the
+noise of the cases that take a few hundred nanoseconds does not fail a run.
+'''
+
+import argparse
+import gc
+import json
+import platform
+import socket
+import threading
+import time
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, 'server'))
+from shared import packet
+from shared import framing
+import game_server as gs
+import game_track as gt
+import simulation
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+RESULTS_PATH = os.path.join(os.path.dirname(__file__), 'results.json')
+THRESHOLD = 0.25 # a case regresses when it takes more than this fraction longer than in the baseline.
+MIN_CHANGE = 100 # nanoseconds per operation, smaller slowdowns are noise however large a fraction they are.
+CALIBRATION = "calibration/python"
+REPEAT = 15
+FAN_OUT_SIZES = (4, 64)
+UUID = b"3f2b7c1e-9a4d-4e8b-b5c6-0d1e2f3a4b5c"
+
+# a value for every struct code used in packet.FORMATS.
+SAMPLE_VALUES = {"d": 2.5, "f": 1.5, "i": 3, "I": 7, "H": 0, "B": 1, "b": -1, "c": b"u", "36s": UUID}
+
+
+def measure(cases: dict, repeat: int) -> dict:
+    '''
+    Runs every case repeat times and returns the best time per operation of each in nanoseconds.
+    A case runs its operation a number of times and returns that number and the seconds it took.
+    The cases take turns, so a slow moment of the machine costs every case one run instead of all runs of one case.
+    '''
+    best = {}
+
+    for _ in range(repeat):
+        for name, case in cases.items():
+            ops, seconds = case()
+            per_op = seconds / ops * 1e9
+            best[name] = min(best.get(name, per_op), per_op)
+
+    return best
+
+
+def loop(operation, number: int):
+    '''
+    Returns a case that calls operation number times. The garbage collector is off while it runs, like in timeit.
+    '''
+    def case():
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(number):
+                operation()
+            return number, time.perf_counter() - start
+        finally:
+            gc.enable()
+
+    return case
+
+
+def codec_cases(number: int) -> dict:
+    cases = {}
+
+    for status, fields in packet.FORMATS.items():
+        data = {name: SAMPLE_VALUES[code] for name, code in fields}
+        cases[f"codec/{status.name}"] = loop(lambda data=data, status=status: packet.unload_packet(packet.serialize(data, status)), number)
+
+    state = simulation.new_game(seed=1)
+    with state.game_lock:
+        base = state.world()
+        state.ball.update(players=state.players)
+        state.players[0].y += 5
+        world = state.world()
+
+    def delta():
+        data = packet.encode_delta(2, 0.5, 1, base, world)
+        packet.decode_delta(data, base)
+
+    cases["codec/delta"] = loop(delta, number)
+    return cases
+
+
+def physics_cases(number: int) -> dict:
+    state = simulation.new_game(seed=1)
+    ball = state.ball
+    players = state.players
+
+    def ball_update():
+        # a new match every time the ball scores would measure reset() too, so put the ball back in the middle.
+        ball.update(players=players)
+        if ball.side != gt.Side.NONE:
+            ball.x, ball.y, ball.side = gt.WIDTH / 2, gt.HEIGHT / 2, gt.Side.NONE
+
+    # a ball right in front of the left paddle, moving into it.
+    hit_ball = gt.Game_State.Ball(x=40.0, y=gt.HOME_POSITIONS[1][1] + 50, xFac=-1, yFac=1)
+    step = gt.BALL_SPEED * gt.DEFAULT_DT
+
+    return {
+        "physics/ball_update": loop(ball_update, number),
+        "physics/hit_player": loop(lambda: hit_ball.hitPlayer(players, -step, step), number),
+    }
+
+
+def fan_out_case(clients: int, broadcasts: int):
+    '''
+    Returns a case that broadcasts one SNAPSHOT to clients clients of a room broadcasts times, through their send
+    queues and writer threads, and waits until every client received every frame.
+    '''
+    def case():
+        r = gs.room(0)
+        readers = []
+        pairs = []
+        data = packet.encode(packet.Status.SNAPSHOT, 1, 0.5, *simulation.new_game(seed=1).world())
+        expected = len(framing.frame(data)) * broadcasts
+
+        for i in range(clients):
+            server_end, client_end = socket.socketpair()
+            pairs.append((server_end, client_end))
+            c = gs.client(f"bench-{i}", server_end, "127.0.0.1", i)
+            c.room = r
+            c.ready_up()
+            r.add_client(c)
+            c.start_writer()
+            t = threading.Thread(target=drain, args=(client_end, expected), daemon=True)
+            t.start()
+            readers.append(t)
+
+        start = time.perf_counter()
+        sent = 0
+
+        while sent < broadcasts:
+            # stay below the send queue limit, a real tick broadcasts once per tick.
+            batch = min(broadcasts - sent, gs.sq.MAX_QUEUED_FRAMES // 2)
+            for _ in range(batch):
+                r.update_clients(data)
+            sent += batch
+            while any(c.queue_depth() for c in list(r.clients)):
+                time.sleep(0)
+
+        for t in readers:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        for c in list(r.clients):
+            # close without leaving the room, so the teardown does not print for every client.
+            c.queue.close()
+            c.conn.close()
+        for server_end, client_end in pairs:
+            client_end.close()
+
+        return broadcasts, elapsed
+
+    return case
+
+
+def drain(conn: socket.socket, expected: int) -> None:
+    received = 0
+    buffer = bytearray(65536)
+
+    while received < expected:
+        n = conn.recv_into(buffer)
+        if not n:
+            return
+        received += n
+
+
+def framing_case(messages: int):
+    '''
+    Returns a case that receives messages SNAPSHOT frames with client.receive, sent 16 per sendall like under load.
+    '''
+    frame = framing.frame(packet.encode(packet.Status.SNAPSHOT, 1, 0.5, *simulation.new_game(seed=1).world()))
+
+    def send(conn: socket.socket) -> None:
+        sent = 0
+        while sent < messages:
+            n = min(16, messages - sent)
+            conn.sendall(frame * n)
+            sent += n
+
+    def case():
+        a, b = socket.socketpair()
+        c = gs.client("bench", b, "127.0.0.1", 0)
+        t = threading.Thread(target=send, args=(a, ), daemon=True)
+
+        start = time.perf_counter()
+        t.start()
+        for _ in range(messages):
+            c.receive()
+        elapsed = time.perf_counter() - start
+
+        t.join()
+        a.close()
+        b.close()
+        return messages, elapsed
+
+    return case
+
+
+def calibration_case(number: int):
+    '''
+    Returns a case of interpreter work that does not use the repository, to measure how fast the machine is right now.
+    '''
+    return loop(lambda: sum([i * i for i in range(32)]), number)
+
+
+def all_cases(quick: bool) -> dict:
+    scale = 10 if quick else 1
+    cases = {}
+    cases.update(codec_cases(20_000 // scale))
+    cases.update(physics_cases(20_000 // scale))
+    for clients in FAN_OUT_SIZES:
+        cases[f"broadcast/{clients}_clients"] = fan_out_case(clients, 1_000 // scale)
+    cases["framing/receive"] = framing_case(50_000 // scale)
+    cases[CALIBRATION] = calibration_case(20_000 // scale)
+    return cases
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_change: float = MIN_CHANGE) -> list:
+    '''
+    Prints every case next to its baseline and returns the names of the cases that regressed past threshold
+    and by more than min_change nanoseconds, after scaling the baseline by the CALIBRATION case.
+    Cases missing from either side are reported but never fail the run.
+    '''
+    regressions = []
+    speed = 1.0
+
+    if CALIBRATION in results and CALIBRATION in baseline:
+        speed = results[CALIBRATION] / baseline[CALIBRATION]
+        print(f"The machine runs at {1 / speed:.0%} of its speed when the baseline was recorded, the baseline is scaled by {speed:.2f}.")
+
+    for name, ns in results.items():
+        old = baseline.get(name)
+
+        if old is None:
+            print(f"{name:>28}: {ns:12,.0f} ns/op   (not in baseline)")
+            continue
+
+        if name == CALIBRATION:
+            continue
+
+        old *= speed
+        change = ns / old - 1
+        regressed = change > threshold and ns - old > min_change
+        print(f"{name:>28}: {ns:12,.0f} ns/op   baseline {old:12,.0f}   {change:+7.1%}{'   REGRESSION' if regressed else ''}")
+
+        if regressed:
+            regressions.append(name)
+
+    for name in baseline:
+        if name not in results:
+            print(f"{name:>28}: in the baseline but not measured")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path benchmarks with a regression check against a stored baseline.")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per case, the best one counts")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown, 0.25 is 25%% slower than the baseline")
+    parser.add_argument("--min-change", type=float, default=MIN_CHANGE, help="slowdowns of fewer nanoseconds per operation never fail the run")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON to compare with")
+    parser.add_argument("--output", default=RESULTS_PATH, help="where to write the results JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline instead of comparing")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the operations per case, for a fast check")
+    parser.add_argument("--filter", default="", help="only run the cases whose name contains this")
+    args = parser.parse_args()
+
+    # the calibration case always runs, the comparison needs it.
+    cases = {name: case for name, case in all_cases(args.quick).items() if args.filter in name or name == CALIBRATION}
+    results = measure(cases, args.repeat)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "results": results,
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        for name, ns in results.items():
+            print(f"{name:>28}: {ns:12,.0f} ns/op")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        for name, ns in results.items():
+            print(f"{name:>28}: {ns:12,.0f} ns/op")
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one.")
+        return
+
+    with open(args.baseline, "r") as file:
+        recorded = json.load(file)
+
+    if any(recorded.get(field) != report[field] for field in ("python", "machine", "system")):
+        print(f"The baseline was recorded with Python {recorded.get('python')} on {recorded.get('system')} {recorded.get('machine')}, "
+              f"the timings may not compare. Record a new one with --save-baseline.")
+
+    regressions = compare(results, recorded["results"], args.threshold, args.min_change)
+
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%} and {args.min_change:,.0f} ns: {', '.join(regressions)}")
+        sys.exit(1)
+
+    print(f"No regressions past {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,7 @@ class striker:
         - posy: y position of the striker
         - width: width of the striker
         - height: height of the striker
-        - speed: speed of the striker
+        - speed: speed of the striker in pixels per second
         - color: color of the striker
         - pRect: pygame.Rect object for the striker
         - pDraw: pygame.draw.rect object for the striker
@@ -14,8 +14,8 @@ class striker:
         Methods:
         Printing the striker object will return the position and color of the striker.
         - display: display the striker.
-        - updateVert: update the vertical position.
-        - updateHori: update the horizontal position.
+        - updateVert: update the vertical position by dt seconds of movement.
+        - updateHori: update the horizontal position by dt seconds of movement.
         - updatePos: update the position of the striker using server data.
         - displayScore: display the text score.
         - getRect: return the pygame.Rect object of the striker.
@@ -46,28 +46,28 @@ class striker:
             pygame.draw.rect(pong_setup.screen, (255, 255, 0), self.pRect, width=3)
 
 
-    def updateVert(self, yFac: float) -> None:
+    def updateVert(self, yFac: float, dt: float) -> None:
         ''' Update the vertical position of the striker
             # if yFac == -1 ==> The object is moving upwards
             # if yFac == 1 ==> The object is moving downwards
             # if yFac == 0 ==> The object is not moving
         
         '''
-        self.posy = self.posy + self.speed*yFac
+        self.posy = self.posy + self.speed*yFac*dt
 
         if self.posy <= 0:
             self.posy = 0
         elif self.posy + self.height >= pong_setup.HEIGHT:
             self.posy = pong_setup.HEIGHT-self.height
     
-    def updateHori(self, xFac: float) -> None:
+    def updateHori(self, xFac: float, dt: float) -> None:
         ''' Update the horizontal position of the striker
             # if xFac == -1 ==> The object is moving left
             # if xFac == 1 ==> The object is moving right
             # if xFac == 0 ==> The object is not moving
         '''
         
-        self.posx = self.posx + self.speed*xFac
+        self.posx = self.posx + self.speed*xFac*dt
 
         if self.posx <= 0:
             self.posx = 0
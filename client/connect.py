@@ -2,13 +2,180 @@ import socket
 import json
 import os
 import threading
+import time
+from collections import deque
 import sys, os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import shared.packet as packet
+import shared.framing as framing
+import shared.timing as timing
 from typing import Optional
 
 RECV_SIZE = 1024
 TIMEOUT = 10
+WINNERS = {'u': "upper", 'l': "lower"} # the side sent in an END packet, see game_track.Side.
+WORLD_HISTORY_SIZE = 32
+ACK_INTERVAL = 8 # ticks between ACKs of DELTAs, a full SNAPSHOT is always acknowledged. Must stay well below WORLD_HISTORY_SIZE.
+SNAPSHOT_BUFFER_SIZE = 32
+INTERPOLATION_DELAY = 0.1 # seconds the rendered world is behind the server's tick, 2 ticks at 20 Hz plus the trip here.
+EXTRAPOLATION_LIMIT = 0.05 # seconds past the newest snapshot the world is extrapolated for, 0 turns it off.
+MIN_VELOCITY_INTERVAL = 0.01 # seconds between the snapshots a velocity is measured over.
+POSITIONS = "positions"
+COMMANDS = "commands"
+RECONCILE_RATE = 0.2 # fraction of the distance to the server's position an idle paddle moves each frame in COMMANDS mode.
+SNAP_DISTANCE = 50 # pixels, a paddle further than this from the server's position jumps there.
+POSITION_FIELDS = 10 # ball and paddle positions at the front of a world.
+SCORE_FIELDS = slice(10, 12) # upper and lower score.
+SEQ_FIELDS = 12 # the input seq of slots 1 to 4 follow the scores.
+
+class snapshot_buffer:
+    '''
+    Keeps the last SNAPSHOT_BUFFER_SIZE worlds with the time the server ticked them, converted to our clock, so
+    rendering can run at any frame rate and show the world as it was delay seconds ago, interpolated between the
+    two snapshots around that time. Stamping with the server's tick time instead of the time a world arrived keeps
+    the worlds evenly spaced however the network bunched them, as long as the trip here is shorter than the delay.
+    Before the clock offset is known the worlds are stamped with the time they were received.
+    It requires:
+        - delay, seconds the rendered world is behind the server's tick
+        - extrapolation_limit, seconds past the newest snapshot positions keep moving at their last velocity
+          when no newer snapshot has arrived. 0 holds them at the newest snapshot.
+
+    Methods:
+        .add(world, received) stores a world, received defaults to now. A world is never stamped earlier than
+            the one before it.
+        .sample(now) returns the world to render at now, or None if no world has been received.
+        .clear() drops every world.
+    '''
+
+    def __init__(self, delay: float = INTERPOLATION_DELAY, extrapolation_limit: float = EXTRAPOLATION_LIMIT, size: int = SNAPSHOT_BUFFER_SIZE):
+        self.delay = delay
+        self.extrapolation_limit = extrapolation_limit
+        self.snapshots: deque[tuple[float, tuple]] = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def add(self, world: tuple, received: Optional[float] = None) -> None:
+        if received is None:
+            received = time.monotonic()
+
+        with self.lock:
+            # the stamps switch from arrival to tick times once the clock is synced, keep them in order.
+            if self.snapshots and received < self.snapshots[-1][0]:
+                received = self.snapshots[-1][0]
+            self.snapshots.append((received, world))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.snapshots.clear()
+
+    def sample(self, now: Optional[float] = None) -> Optional[tuple]:
+        '''
+        Returns the world at now - delay. Positions are interpolated between the snapshots before and after that
+        time and the scores are taken from the one before. A goal resets the ball, so a pair of snapshots with
+        different scores is not interpolated.
+        '''
+        if now is None:
+            now = time.monotonic()
+
+        render_time = now - self.delay
+
+        with self.lock:
+            if not self.snapshots:
+                return None
+
+            newest_time, newest = self.snapshots[-1]
+
+            if render_time >= newest_time:
+                if self.extrapolation_limit <= 0:
+                    return newest
+
+                # keep moving at the velocity since an earlier snapshot, for at most extrapolation_limit.
+                # Snapshots that arrived together in one burst are too close in time to give a velocity.
+                for before_time, before in reversed(self.snapshots):
+                    if newest_time - before_time >= MIN_VELOCITY_INTERVAL:
+                        break
+                else:
+                    return newest
+
+                render_time = min(render_time, newest_time + self.extrapolation_limit)
+                return _blend(before, newest, (render_time - before_time) / (newest_time - before_time))
+
+            older_time, older = self.snapshots[0]
+
+            if render_time <= older_time:
+                return older
+
+            for newer_time, newer in self.snapshots:
+                if newer_time >= render_time:
+                    break
+                older_time, older = newer_time, newer
+
+        return _blend(older, newer, (render_time - older_time) / (newer_time - older_time))
+
+
+class input_history:
+    '''
+    Client side prediction of our own paddle. Every input moves the paddle locally right away and is sent to the
+    server with a seq number. The worlds from the server carry the seq of the last input the server applied,
+    so the inputs after it are replayed on top of the server's position. It contains:
+        - next_seq: seq of the next input
+        - pending: (seq, move, dt) of every input the server has not applied yet, dt is the frame time it was held for
+        - authoritative: (seq, x, y) from the newest world, until reconcile() uses it
+
+    Methods:
+        .record(move, dt) numbers an input and keeps it until the server acknowledges it. Returns its seq.
+        .acknowledge(seq, x, y) stores our paddle position from a world, called by the receiver thread.
+        .reconcile() returns (x, y, moves): the server's position and the (move, dt) inputs to replay on it,
+            or None if no new world arrived since the last call.
+    '''
+
+    def __init__(self):
+        self.next_seq = 1
+        self.pending: deque[tuple[int, int, float]] = deque()
+        self.authoritative: Optional[tuple[int, float, float]] = None
+        self.lock = threading.Lock()
+
+    def record(self, move: int, dt: float) -> int:
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            self.pending.append((seq, move, dt))
+            return seq
+
+    def acknowledge(self, seq: int, x: float, y: float) -> None:
+        # seq 0 means the server has not applied any of our inputs, so the position is not ours yet.
+        if seq == 0:
+            return
+
+        with self.lock:
+            self.authoritative = (seq, x, y)
+
+    def reconcile(self) -> Optional[tuple[float, float, list]]:
+        with self.lock:
+            if self.authoritative is None:
+                return None
+
+            seq, x, y = self.authoritative
+            self.authoritative = None
+
+            while self.pending and self.pending[0][0] <= seq:
+                self.pending.popleft()
+
+            return x, y, [(move, dt) for _, move, dt in self.pending]
+
+
+def _blend(a: tuple, b: tuple, fraction: float) -> tuple:
+    '''
+    Returns the positions of a moved fraction of the way to b, past b if fraction is above 1, with the rest of a.
+    Returns b if the scores differ.
+    '''
+    if a[SCORE_FIELDS] != b[SCORE_FIELDS]:
+        return b
+
+    return tuple(p + (q - p) * fraction for p, q in zip(a[:POSITION_FIELDS], b[:POSITION_FIELDS])) + a[POSITION_FIELDS:]
+
 
 class client_connection:
     '''
@@ -18,39 +185,61 @@ class client_connection:
         - Client IP
         - Client Port
         - player_slot
-        - player_list, a dict with player slots and their IDs
+        - player_list, a dict keyed by player slot (1 to 4) with each slot's striker and UUID
         - player_list_lock, mutex lock for player_list
         - scoreboard, a dict with upper_score and lower_score
         - scoreboard_lock, mutex lock for scoreboard
+        - worlds, world_ticks, the worlds of the last WORLD_HISTORY_SIZE ticks received and their ticks, ring buffers
+          indexed by tick % WORLD_HISTORY_SIZE, used as delta bases
+        - acked_tick, the last tick acknowledged to the server, the base of the DELTAs it sends until the next ACK
+        - snapshots, a snapshot_buffer of the received worlds that rendering samples from
+        - inputs, the input_history that predicts our own paddle
+        - input_mode, POSITIONS sends the paddle position after every input with MOVE,
+          COMMANDS sends only key changes with INPUT and the server moves the paddle
+        - send_lock, mutex lock so packets sent from the game loop and the receiver thread do not interleave
+        - winner, the winning side sent by the server in the END packet, None until then
+        - clock, a timing.rtt_estimator with the round trip time to the server and the offset of the server's clock
 
     Methods:
         Printing the object itself will display the IP:PORT and ID.
         .send(data) will encode and send the data from the parameter to the server in the socket object.
+        .send_values(STATUS, *values) will pack and send a packet without building a dictionary.
+        .send_move(move, dt, x, y) will send our paddle position after an input and record the input for prediction.
+        .send_input(move) will send a key press or release and record it for prediction.
         .receive() will decode and return the data to the caller.
         .close() will close the client connection.
         .start_receiving(recv_handler) will start a thread to listen for incoming data and call the provided handler.
         .set_id(new_id) will set the ID of the client connection.
         .get_id() will return the ID of the client connection.
         .set_player_slot(slot) will set the player slot for this client.
+        .receive_world(data) will read a SNAPSHOT or DELTA, acknowledge it if an ACK is due, add it to snapshots and
+            return the world.
+        .acknowledge_world(record) will send an ACK for a SNAPSHOT, or for a DELTA ACK_INTERVAL ticks after the last ACK.
+            Returns True if it sent one.
+        .answer_ping(record) will answer a PING from the server, and send our own PING every timing.PING_INTERVAL.
+        .send_ping() will send a PING to the server.
+        .receive_pong(record) will measure the round trip and the server's clock offset from a PONG.
         .update_scoreboard(upper_score, lower_score) will update the scoreboard.
+        .set_winner(side) will set the winner from the side of an END packet.
+        .get_winner() will return the winner, from the END packet or else the scoreboard.
         .get_active() will return the number of active clients.
         .send_player_list() will send the player list to all clients.
         .send_scoreboard() will send the scoreboard to all clients.
     '''
 
 
-    def __init__(self, socket, ip, port):
+    def __init__(self, socket, ip, port, snapshots: Optional[snapshot_buffer] = None, input_mode: str = COMMANDS):
         self.id = None
         self.socket = socket
         self.recv_size = RECV_SIZE
         self.ip = ip
         self.port = port
         self.player_slot = None
-        self.player_list: dict[str, dict[str, object]] = {
-        '1': {'player': None, 'uuid': None},
-        '2': {'player': None, 'uuid': None},
-        '3': {'player': None, 'uuid': None},
-        '4': {'player': None, 'uuid': None},
+        self.player_list: dict[int, dict[str, object]] = {
+        1: {'player': None, 'uuid': None},
+        2: {'player': None, 'uuid': None},
+        3: {'player': None, 'uuid': None},
+        4: {'player': None, 'uuid': None},
         }
 
         self.scoreboard = {
@@ -60,6 +249,20 @@ class client_connection:
 
         self.player_list_lock = threading.Lock()
         self.scoreboard_lock = threading.Lock()
+        self.buffer = framing.frame_buffer()
+        self.send_buffer = bytearray(framing.HEADER.size + packet.MAX_SIZE)
+        self.send_view = memoryview(self.send_buffer)
+        self.send_lock = threading.Lock()
+        self.worlds: list[Optional[tuple]] = [None] * WORLD_HISTORY_SIZE
+        self.world_ticks = [0] * WORLD_HISTORY_SIZE
+        self.acked_tick = 0
+        self.winner: Optional[str] = None
+        self.snapshots = snapshots if snapshots is not None else snapshot_buffer()
+        self.inputs = input_history()
+        self.input_mode = input_mode
+        self.clock = timing.rtt_estimator()
+        self.ping_seq = 0
+        self.last_ping = 0.0
 
 
 
@@ -69,26 +272,56 @@ class client_connection:
     def send(self, data: dict, STATUS: packet.Status) -> None:
         '''.send() will sendall encoded data to the server. The data passed must be a dictionary.
         The STATUS parameter is used to specify the type of packet being sent.
-        Each message will be ended with a newline character.
+        Each message will be sent as a length prefixed frame.
+        '''
+        self.send_values(STATUS, *packet.values_of(data, STATUS))
+
+    def send_values(self, STATUS: packet.Status, *values) -> None:
+        '''.send_values() packs the field values of a packet, in packet.FORMATS order, into the reusable send buffer
+        with its frame header and sends it. String fields must already be bytes.
+        '''
+        with self.send_lock:
+            size = packet.encode_into(self.send_buffer, framing.HEADER.size, STATUS, *values)
+            framing.HEADER.pack_into(self.send_buffer, 0, size)
+            self.socket.sendall(self.send_view[:framing.HEADER.size + size])
+
+    def send_move(self, move: int, dt: float, x: float, y: float) -> None:
+        '''
+        Sends a MOVE with the position of our paddle after an input, move is the direction of the input
+        and dt the frame time it was held for.
+        '''
+        seq = self.inputs.record(move, dt)
+        self.send_values(packet.Status.MOVE, self.player_slot, seq, x, y)
+
+    def send_input(self, move: int) -> None:
+        '''
+        Sends an INPUT when the direction our paddle is held in changes. The server keeps moving the paddle in that
+        direction every tick until the next INPUT.
         '''
-        packet_data = packet.serialize(data, STATUS)
-        self.socket.sendall(packet_data + b'\n')  
+        # the server moves the paddle, so the input is only kept to tell when the server has it, not replayed.
+        seq = self.inputs.record(move, 0.0)
+        self.send_values(packet.Status.INPUT, seq, move)
+
+    def receive(self):
+        ''' .recieve() will return the payload of the next frame from the server.
+        Every frame of a recv is kept in the receive buffer, so recv is only called when no complete frame is buffered.
+        The payload is a memoryview into the buffer and is only valid until the next call to .receive().
+        '''
+        data = self.buffer.next_frame()
+
+        if data is not None:
+            return data
 
-    def receive(self) -> bytes:
-        ''' .recieve() will call recv and return the data received. Each message is ended with a newline char'''
         self.socket.settimeout(TIMEOUT)
-        buff = b''
 
         try:
             while True:
-                d = self.socket.recv(self.recv_size)
-
-                if not d:
+                if not self.buffer.recv_into(self.socket):
                     raise ConnectionError("Connection closed.")
-                buff += d
-                if b'\n' in buff:
-                    full_data, buff = buff.split(b'\n', 1)
-                    return full_data
+
+                data = self.buffer.next_frame()
+                if data is not None:
+                    return data
                 
         except socket.timeout:
             raise ConnectionError("Socket timed out.")
@@ -126,6 +359,68 @@ class client_connection:
         self.player_slot = slot
         print(f"Player slot set to: {self.player_slot}")
 
+    def receive_world(self, data) -> Optional[tuple]:
+        '''
+        Reads a SNAPSHOT or DELTA packet, stores the world it describes and acknowledges its tick to the server
+        when an ACK is due, see acknowledge_world().
+        The world is also added to the snapshot buffer for rendering, and our paddle in it to the input history.
+        Returns the world, or None if it is a DELTA against a tick that is no longer stored.
+        '''
+        record = packet.decode(data)
+
+        if record.status == packet.Status.SNAPSHOT:
+            world = tuple(record)[2:]
+        else:
+            base = record.base
+            if base <= 0 or self.world_ticks[base % WORLD_HISTORY_SIZE] != base:
+                return None
+            world = packet.decode_delta(data, self.worlds[base % WORLD_HISTORY_SIZE])
+
+        # a fixed ring, so ticks the server skipped do not leave old worlds behind.
+        self.world_ticks[record.tick % WORLD_HISTORY_SIZE] = record.tick
+        self.worlds[record.tick % WORLD_HISTORY_SIZE] = world
+        self.snapshots.add(world, self.clock.to_local(record.server_time) if self.clock.synced() else None)
+
+        if self.player_slot is not None:
+            slot = self.player_slot
+            self.inputs.acknowledge(world[SEQ_FIELDS + slot - 1], world[slot * 2], world[slot * 2 + 1])
+
+        self.acknowledge_world(record)
+        return world
+
+    def acknowledge_world(self, record) -> bool:
+        '''
+        Acknowledging every tick would send an ACK upstream at the full tick rate even while idle. The server
+        keeps sending DELTAs against the last tick acknowledged, so only every ACK_INTERVAL ticks is acknowledged.
+        The worlds up to that far back are kept to decode them. A full SNAPSHOT means the server no longer has
+        our base, so it is acknowledged right away to get DELTAs again.
+        '''
+        if record.status != packet.Status.SNAPSHOT and record.tick - self.acked_tick < ACK_INTERVAL:
+            return False
+
+        self.acked_tick = record.tick
+        self.send_values(packet.Status.ACK, record.tick)
+        return True
+
+    def answer_ping(self, record) -> None:
+        '''
+        Answers a PING from the server with a PONG so the server can measure our round trip. The server PINGs every
+        timing.PING_INTERVAL, so this also sends our own PING when one is due instead of running a timer.
+        '''
+        now = time.monotonic()
+        self.send_values(packet.Status.PONG, record.seq, record.time, now)
+
+        if now - self.last_ping >= timing.PING_INTERVAL:
+            self.send_ping()
+
+    def send_ping(self) -> None:
+        self.ping_seq += 1
+        self.last_ping = time.monotonic()
+        self.send_values(packet.Status.PING, self.ping_seq, self.last_ping)
+
+    def receive_pong(self, record) -> None:
+        self.clock.sample(record.echo, time.monotonic(), record.time)
+
     def update_scoreboard(self, upper_score: int,  lower_score: int) -> None:
         '''
         Update the scoreboard.
@@ -135,11 +430,20 @@ class client_connection:
                 self.scoreboard["upper_score"] = upper_score
             if lower_score is not None:
                 self.scoreboard["lower_score"] = lower_score
+    def set_winner(self, side: str) -> None:
+        '''
+        Set the winner from the side sent in the END packet.
+        '''
+        with self.scoreboard_lock:
+            self.winner = WINNERS.get(side)
+
     def get_winner(self) -> str:
         '''
-        Get the winner based on the scoreboard.
+        Get the winner sent by the server, or based on the scoreboard if there is none.
         '''
         with self.scoreboard_lock:
+            if self.winner is not None:
+                return self.winner
             if self.scoreboard["upper_score"] > self.scoreboard["lower_score"]:
                 return "upper"
             elif self.scoreboard["lower_score"] > self.scoreboard["upper_score"]:
@@ -170,12 +474,16 @@ def init_connection() -> client_connection:
     config = load_config()
     ip = config["server_ip"]
     port = config["server_port"]
+    input_mode = config.get("input_mode", COMMANDS)
 
     s = None
 
     if not ip or not port:
         raise ValueError("Missing IP and PORT in config.json")
 
+    if input_mode not in (POSITIONS, COMMANDS):
+        raise ValueError(f"Unknown input_mode {input_mode} in config.json")
+
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
@@ -186,5 +494,9 @@ def init_connection() -> client_connection:
             s.close()
         raise ConnectionError(f"Failed to connect to {ip}:{port}. Is the server running or blocked by firewall?")
     
-    connection = client_connection(s, ip, port)
+    snapshots = snapshot_buffer(
+        config.get("interpolation_delay", INTERPOLATION_DELAY),
+        config.get("extrapolation_limit", EXTRAPOLATION_LIMIT)
+    )
+    connection = client_connection(s, ip, port, snapshots, input_mode)
     return connection
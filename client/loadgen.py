@@ -0,0 +1,423 @@
+'''
+Headless load generator. Connects scripted bots to a server, four to a match, and plays them like real clients:
+each bot holds its paddle in a random direction for a while, sends INPUT or MOVE packets the same way
+client/main.py does and acknowledges SNAPSHOTs and DELTAs the same way too. It does not import pygame, so thousands of bots
+can run from one terminal. The paddles are moved with the server's own game_track code.
+
+Every bot shares one selector thread and every socket is non-blocking, so the generator itself stays light and
+a server that stops reading cannot stall the measurements of the other bots. What a socket does not take right away
+waits in the bot's outbound queue and is sent when the socket is writable again. It reports:
+    - join latency: from connect() until the server assigned the bot a player slot
+    - tick-to-receive latency: from the server running a tick to the bot receiving it, using the server_time of
+      every SNAPSHOT and DELTA and the server's clock offset each bot measures with PINGs. Ticks received before
+      a bot's first PONG are not counted.
+    - round trip: from a bot sending a PING to receiving its PONG
+    - tick gaps: time between two worlds received by the same bot, long gaps mean the server missed ticks
+    - packets and bytes per second in each direction
+    - disconnects: connections the server closed or that failed, including bots whose outbound queue grew past
+      MAX_OUTBOUND because the server stopped reading, and connects that were refused
+
+Run it from the client folder against a running server:
+    python loadgen.py --bots 400 --ramp 100 --duration 30
+'''
+
+import argparse
+import errno
+import os
+import random
+import selectors
+import socket
+import sys
+import time
+from array import array
+from typing import Optional
+import connect
+from shared import packet, framing
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'server')))
+import game_track as gt
+
+FPS = 60 # frames per second each bot plays at, the same as the client.
+HOLD_TIME = (0.2, 1.0) # seconds a bot holds its paddle in one direction before picking a new one.
+REPORT_INTERVAL = 5 # seconds between progress lines.
+PERCENTILES = (50, 95, 99)
+SENT_SIZES = {s: framing.HEADER.size + packet.STRUCTS[s].size for s in
+              (packet.Status.ACK, packet.Status.INPUT, packet.Status.MOVE, packet.Status.PING, packet.Status.PONG)}
+MAX_OUTBOUND = 64 * 1024 # bytes a bot can have waiting to be sent before it is dropped.
+
+# the side of the field each slot's paddle is on, taken from a new game so it matches the server.
+PADDLE_POSITIONS = {player.slot: player.position for player in gt.Game_State().players}
+
+
+def percentiles(samples, points=PERCENTILES) -> dict:
+    '''
+    Returns the given percentiles and the maximum of samples, all None if there are no samples.
+    '''
+    if not samples:
+        return {**{f"p{p}": None for p in points}, "max": None}
+
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    result = {f"p{p}": ordered[min(last, round(p / 100 * last))] for p in points}
+    result["max"] = ordered[last]
+    return result
+
+
+def format_ms(stats: dict) -> str:
+    return " ".join(f"{name} {'-' if value is None else f'{value * 1000:.1f}ms'}" for name, value in stats.items())
+
+
+class load_stats:
+    '''
+    The measurements of a load test. It contains:
+        - join_latency, tick_latency, tick_gaps, round_trips: samples in seconds
+        - packets_in, bytes_in, packets_out, bytes_out: totals since the start
+        - joined: bots that got a player slot
+        - disconnects: bots whose connection was closed or failed after connecting
+        - refused: bots that could not connect
+
+    Methods:
+        .rates(since) returns packets and bytes per second in each direction since an earlier copy of the totals.
+        .totals() returns the totals, for .rates().
+        .summary(seconds) returns the report printed at the end of a run.
+    '''
+
+    def __init__(self):
+        self.join_latency = array("d")
+        self.tick_latency = array("d")
+        self.tick_gaps = array("d")
+        self.round_trips = array("d")
+        self.packets_in = 0
+        self.bytes_in = 0
+        self.packets_out = 0
+        self.bytes_out = 0
+        self.joined = 0
+        self.disconnects = 0
+        self.refused = 0
+
+    def totals(self) -> tuple:
+        return (time.perf_counter(), self.packets_in, self.bytes_in, self.packets_out, self.bytes_out)
+
+    def rates(self, since: tuple) -> tuple:
+        now = self.totals()
+        seconds = (now[0] - since[0]) or 1e-9
+        return tuple((a - b) / seconds for a, b in zip(now[1:], since[1:]))
+
+    def summary(self, seconds: float) -> str:
+        seconds = seconds or 1e-9
+        return "\n".join((
+            f"joined {self.joined}, disconnects {self.disconnects}, refused {self.refused}",
+            f"join latency: {format_ms(percentiles(self.join_latency))}",
+            f"tick-to-receive latency: {format_ms(percentiles(self.tick_latency))}",
+            f"tick gaps: {format_ms(percentiles(self.tick_gaps))}",
+            f"round trip: {format_ms(percentiles(self.round_trips))}",
+            f"received {self.packets_in / seconds:,.0f} packets/s {self.bytes_in / seconds:,.0f} bytes/s, "
+            f"sent {self.packets_out / seconds:,.0f} packets/s {self.bytes_out / seconds:,.0f} bytes/s",
+        ))
+
+
+class bot_connection(connect.client_connection):
+    '''
+    A connect.client_connection for a non-blocking socket. It contains:
+        - outbound: the frames the socket has not taken yet
+
+    Methods:
+        .send_values(STATUS, *values) queues a packet and sends as much of the queue as the socket takes.
+        .flush() sends as much of the queue as the socket takes, returns True once it is empty.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outbound = bytearray()
+
+    def send_values(self, STATUS: packet.Status, *values) -> None:
+        # every bot runs on the selector thread, so the send lock is not needed.
+        size = packet.encode_into(self.send_buffer, framing.HEADER.size, STATUS, *values)
+        framing.HEADER.pack_into(self.send_buffer, 0, size)
+        self.outbound += self.send_view[:framing.HEADER.size + size]
+
+        if len(self.outbound) > MAX_OUTBOUND:
+            raise OSError(errno.ENOBUFS, "the server is not reading")
+
+        self.flush()
+
+    def flush(self) -> bool:
+        if self.outbound:
+            try:
+                sent = self.socket.send(self.outbound)
+            except BlockingIOError:
+                return False
+            # a partial send leaves the rest of the frame at the front of the queue.
+            del self.outbound[:sent]
+
+        return not self.outbound
+
+
+class bot:
+    '''
+    One scripted player. It requires:
+        - conn, a bot_connection with a connected socket
+        - input_mode, connect.COMMANDS or connect.POSITIONS
+        - rng, the random.Random it picks its directions with
+
+    It contains:
+        - started: when connect() was called
+        - joined: when the server assigned a player slot, None before that
+        - paddle: a game_track Player, where the bot has its paddle in POSITIONS mode
+        - direction: the direction the paddle is held in, -1, 0 or 1 along its axis
+        - change_at: when the bot picks a new direction
+        - last_world: when the bot last received a SNAPSHOT or DELTA
+        - connected: False until the non-blocking connect finished
+        - uuid_received: False until the UUID the server sends first has been read
+        - writing: True while the selector also waits for the socket to be writable to flush conn.outbound
+
+    Methods:
+        .handle(data, now, stats) reads one frame from the server.
+        .play(now, dt, stats) moves the paddle for one frame and sends the input.
+    '''
+
+    def __init__(self, conn: bot_connection, input_mode: str, rng: random.Random, started: float):
+        self.conn = conn
+        self.input_mode = input_mode
+        self.rng = rng
+        self.started = started
+        self.joined: Optional[float] = None
+        self.paddle: Optional[gt.Game_State.Player] = None
+        self.direction = 0
+        self.change_at = 0.0
+        self.last_world: Optional[float] = None
+        self.connected = False
+        self.uuid_received = False
+        self.writing = False
+
+    def handle(self, data, now: float, stats: load_stats) -> None:
+        conn = self.conn
+
+        if not self.uuid_received:
+            # the first frame is the UUID as text, not a packet.
+            conn.id = bytes(data).decode()
+            self.uuid_received = True
+            return
+
+        record = packet.decode(data)
+        status = record.status
+
+        if status in (packet.Status.SNAPSHOT, packet.Status.DELTA):
+            if conn.clock.synced():
+                # server_time is on the server's time.monotonic(), the same clock the offset was measured with.
+                stats.tick_latency.append(time.monotonic() - conn.clock.to_local(record.server_time))
+
+            if self.last_world is not None:
+                stats.tick_gaps.append(now - self.last_world)
+            self.last_world = now
+
+            if conn.acknowledge_world(record):
+                stats.packets_out += 1
+                stats.bytes_out += SENT_SIZES[packet.Status.ACK]
+
+        elif status == packet.Status.PING:
+            pings = conn.ping_seq
+            conn.answer_ping(record)
+            sent_pings = conn.ping_seq - pings
+            stats.packets_out += 1 + sent_pings
+            stats.bytes_out += SENT_SIZES[packet.Status.PONG] + sent_pings * SENT_SIZES[packet.Status.PING]
+
+        elif status == packet.Status.PONG:
+            conn.receive_pong(record)
+            stats.round_trips.append(conn.clock.rtt)
+
+        elif status == packet.Status.PLAYER_NEW_SLOT and self.joined is None:
+            conn.player_slot = record.slot
+            x, y = gt.HOME_POSITIONS[record.slot]
+            self.paddle = gt.Game_State.Player(conn.id, x=x, y=y, position=PADDLE_POSITIONS[record.slot], slot=record.slot)
+            self.joined = now
+            stats.joined += 1
+            stats.join_latency.append(now - self.started)
+
+    def play(self, now: float, dt: float, stats: load_stats) -> None:
+        conn = self.conn
+
+        if self.joined is None:
+            return
+
+        if now >= self.change_at:
+            direction = self.rng.choice((-1, 0, 1))
+            self.change_at = now + self.rng.uniform(*HOLD_TIME)
+
+            if self.input_mode == connect.COMMANDS and direction != self.direction:
+                conn.send_input(direction)
+                stats.packets_out += 1
+                stats.bytes_out += SENT_SIZES[packet.Status.INPUT]
+
+            self.direction = direction
+
+        if self.input_mode != connect.POSITIONS or self.direction == 0:
+            return
+
+        if self.paddle.move(self.direction, dt):
+            conn.send_move(self.direction, dt, self.paddle.x, self.paddle.y)
+            stats.packets_out += 1
+            stats.bytes_out += SENT_SIZES[packet.Status.MOVE]
+
+
+def open_bot(address: tuple, input_mode: str, seed: int) -> bot:
+    '''
+    Starts a non-blocking connect to address, a resolved (ip, port), and returns the bot. The socket is writable
+    once the connect finished.
+    '''
+    started = time.perf_counter()
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setblocking(False)
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    error = s.connect_ex(address)
+
+    if error not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+        s.close()
+        raise OSError(error, os.strerror(error))
+
+    conn = bot_connection(s, address[0], address[1], input_mode=input_mode)
+    return bot(conn, input_mode, random.Random(seed), started)
+
+
+def run(ip: str, port: int, bots: int, ramp: float, duration: float, input_mode: str, seed: Optional[int] = None) -> load_stats:
+    '''
+    Connects bots bots at ramp connections per second, plays them until duration seconds after the last one
+    connected and returns the load_stats. Progress is printed every REPORT_INTERVAL seconds.
+    '''
+    stats = load_stats()
+    # resolve once, a non-blocking connect cannot wait for a name lookup.
+    address = socket.getaddrinfo(ip, port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+    selector = selectors.DefaultSelector()
+    rng = random.Random(seed)
+
+    start = time.perf_counter()
+    end = start + bots / ramp + duration
+    next_frame = start
+    next_report = start + REPORT_INTERVAL
+    last_totals = stats.totals()
+    opened = 0
+    frame_time = 1 / FPS
+
+    def drop(b: bot) -> None:
+        selector.unregister(b.conn.socket)
+        b.conn.socket.close()
+        stats.disconnects += 1
+
+    def watch(b: bot) -> None:
+        # only wait for the socket to be writable while there is something queued, it is writable almost always.
+        writing = bool(b.conn.outbound)
+        if writing != b.writing:
+            selector.modify(b.conn.socket, selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0), b)
+            b.writing = writing
+
+    while True:
+        now = time.perf_counter()
+
+        if now >= end:
+            break
+
+        # connect the bots that are due on the ramp.
+        while opened < bots and start + opened / ramp <= now:
+            try:
+                b = open_bot(address, input_mode, rng.getrandbits(32))
+                selector.register(b.conn.socket, selectors.EVENT_WRITE, b)
+            except OSError as e:
+                stats.refused += 1
+                if stats.refused == 1:
+                    print(f"Could not connect: {e}")
+            opened += 1
+
+        for key, events in selector.select(max(0.0, min(next_frame, next_report) - now)):
+            b = key.data
+            buffer = b.conn.buffer
+
+            if not b.connected:
+                error = b.conn.socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                selector.unregister(b.conn.socket)
+
+                if error:
+                    b.conn.socket.close()
+                    stats.refused += 1
+                    if stats.refused == 1:
+                        print(f"Could not connect: {os.strerror(error)}")
+                else:
+                    b.connected = True
+                    selector.register(b.conn.socket, selectors.EVENT_READ, b)
+                continue
+
+            try:
+                if events & selectors.EVENT_WRITE:
+                    b.conn.flush()
+
+                if not events & selectors.EVENT_READ:
+                    watch(b)
+                    continue
+
+                received = buffer.recv_into(b.conn.socket)
+
+                if not received:
+                    drop(b)
+                    continue
+
+                stats.bytes_in += received
+                now = time.perf_counter()
+
+                for data in buffer.frames():
+                    stats.packets_in += 1
+                    b.handle(data, now, stats)
+
+                watch(b)
+
+            except (OSError, ValueError):
+                drop(b)
+
+        now = time.perf_counter()
+
+        if now >= next_frame:
+            for key in list(selector.get_map().values()):
+                try:
+                    key.data.play(now, frame_time, stats)
+                    watch(key.data)
+                except OSError:
+                    drop(key.data)
+            next_frame += frame_time
+            if next_frame < now:
+                # the generator fell behind, skip the frames it missed.
+                next_frame = now + frame_time
+
+        if now >= next_report:
+            packets_in, bytes_in, packets_out, bytes_out = stats.rates(last_totals)
+            last_totals = stats.totals()
+            print(f"{now - start:6.1f}s: {len(selector.get_map())} connected, {stats.joined} joined, "
+                  f"{stats.disconnects} disconnects, in {packets_in:,.0f} packets/s {bytes_in:,.0f} bytes/s, "
+                  f"out {packets_out:,.0f} packets/s {bytes_out:,.0f} bytes/s")
+            next_report += REPORT_INTERVAL
+
+    for key in list(selector.get_map().values()):
+        key.data.conn.socket.close()
+    selector.close()
+
+    return stats
+
+
+def main():
+    config = connect.load_config()
+
+    parser = argparse.ArgumentParser(description="Plays many headless bots against a server and reports latency and throughput.")
+    parser.add_argument("--ip", default=config["server_ip"], help="server address, from config.json by default")
+    parser.add_argument("--port", type=int, default=config["server_port"], help="server port, from config.json by default")
+    parser.add_argument("--bots", type=int, default=100, help="bots to connect, four play in each match")
+    parser.add_argument("--ramp", type=float, default=50, help="connections opened per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to play after the last bot connected")
+    parser.add_argument("--input-mode", choices=(connect.COMMANDS, connect.POSITIONS), default=config.get("input_mode", connect.COMMANDS),
+                        help="send INPUT commands or MOVE positions")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the bots' inputs")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = run(args.ip, args.port, args.bots, args.ramp, args.duration, args.input_mode, args.seed)
+    print(stats.summary(time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,29 @@ ended = False
 end_lock = threading.Lock()
 winner = ""
 
+def apply_world(conn: connect.client_connection, world: tuple) -> None:
+    '''
+    Applies a world, in packet.WORLD_FIELDS order, to the ball, the other players' strikers and the scoreboard.
+    It is called every frame with the world sampled from the snapshot buffer. Our own striker is predicted
+    locally, see move_striker().
+    '''
+    ball_x, ball_y, p1_x, p1_y, p2_x, p2_y, p3_x, p3_y, p4_x, p4_y, upper_score, lower_score = world[:12]
+
+    Ball.posx = ball_x
+    Ball.posy = ball_y
+
+    with conn.player_list_lock:
+        for s, (x, y) in ((1, (p1_x, p1_y)), (2, (p2_x, p2_y)), (3, (p3_x, p3_y)), (4, (p4_x, p4_y))):
+            p = conn.player_list[s]['player']
+            if p is None or s == conn.player_slot:
+                continue
+            p = cast(striker, p)
+            p.posx = x
+            p.posy = y
+            p.updatePos()
+
+    conn.update_scoreboard(upper_score, lower_score)
+
 def recv_handler(conn: connect.client_connection) -> None:
     '''
     This thread handler would take in a client_connection to handle incoming packets from the server in a separate thread.
@@ -34,36 +57,37 @@ def recv_handler(conn: connect.client_connection) -> None:
             if not data:
                 break
 
-            if len(data) < 8:
-                continue
-
             # Unload the packet data
-            unloaded_data = packet.unload_packet(data)
-            status = packet.Status(unloaded_data["status"])
+            record = packet.decode(data)
+            status = record.status
 
             # Match packet status type to handled action
             match status:
 
                 #ball position update
                 case packet.Status.BALL_POS:
-                    x = unloaded_data["x"]
-                    y = unloaded_data["y"]
+                    x = record.x
+                    y = record.y
                     if isinstance(x, (int, float)) and isinstance(y, (int, float)):
                         Ball.posx = float(x)
                         Ball.posy = float(y)
 
+                #whole world update, sent once per server tick as a full snapshot or a delta.
+                #it goes into the snapshot buffer and the game loop renders from there.
+                case packet.Status.SNAPSHOT | packet.Status.DELTA:
+                    conn.receive_world(data)
+
                 #striker movement update
                 case packet.Status.MOVE:
-                    uuid = unloaded_data["uuid"]
-                    x = unloaded_data["x"]
-                    y = unloaded_data["y"]
+                    x = record.x
+                    y = record.y
+
+                    # our own striker is moved locally
+                    if record.slot not in conn.player_list or record.slot == conn.player_slot:
+                        continue
 
-                    p = None
                     with conn.player_list_lock:
-                        for s, d in conn.player_list.items():
-                            if d['uuid'] == uuid:
-                                p = d['player']
-                                break
+                        p = conn.player_list[record.slot]['player']
 
                     if p is not None:
                         p = cast(striker, p)
@@ -73,26 +97,34 @@ def recv_handler(conn: connect.client_connection) -> None:
                             p.updatePos()
                 #player slots/count update
                 case packet.Status.PLAYER_LIST:
-                    p1 = unloaded_data["p1"]
-                    p2 = unloaded_data["p2"]
-                    p3 = unloaded_data["p3"]
-                    p4 = unloaded_data["p4"]
+                    p1 = record.p1
+                    p2 = record.p2
+                    p3 = record.p3
+                    p4 = record.p4
                     
                     with conn.player_list_lock:
-                        conn.player_list["1"]["uuid"] = p1
-                        conn.player_list["2"]["uuid"] = p2
-                        conn.player_list["3"]["uuid"] = p3
-                        conn.player_list["4"]["uuid"] = p4
+                        conn.player_list[1]["uuid"] = p1
+                        conn.player_list[2]["uuid"] = p2
+                        conn.player_list[3]["uuid"] = p3
+                        conn.player_list[4]["uuid"] = p4
                 #update scoreboard
                 case packet.Status.SCOREBOARD:
-                    upper_score = unloaded_data["upper_score"]
-                    lower_score = unloaded_data["lower_score"]
+                    upper_score = record.upper_score
+                    lower_score = record.lower_score
                     
                     if isinstance(upper_score, int) and isinstance(lower_score, int):
                         conn.update_scoreboard(upper_score, lower_score)
 
+                #round trip and clock measurement, see shared/timing.py.
+                case packet.Status.PING:
+                    conn.answer_ping(record)
+
+                case packet.Status.PONG:
+                    conn.receive_pong(record)
+
                 case packet.Status.END:
-                    
+                    conn.set_winner(record.winner)
+
                     with end_lock:
                         ended = True
 
@@ -126,6 +158,30 @@ def recv_handler(conn: connect.client_connection) -> None:
 
     conn.close()
 
+def move_striker(player: striker, move: int, dt: float) -> None:
+    '''
+    Applies one frame of input, held for dt seconds, to a striker. Vertical strikers move up and down and
+    horizontal ones left and right.
+    '''
+    if is_vertical:
+        player.updateVert(move, dt)
+    else:
+        player.updateHori(move, dt)
+
+def settle_striker(player: striker, target: tuple) -> None:
+    '''
+    Moves a striker part of the way to where the server has it, so small differences between the frames we
+    predicted and the ticks the server ran disappear without a jump. Large differences jump right away.
+    '''
+    dx = target[0] - player.posx
+    dy = target[1] - player.posy
+
+    if abs(dx) > connect.SNAP_DISTANCE or abs(dy) > connect.SNAP_DISTANCE or (abs(dx) < 0.5 and abs(dy) < 0.5):
+        player.posx, player.posy = target
+    else:
+        player.posx += dx * connect.RECONCILE_RATE
+        player.posy += dy * connect.RECONCILE_RATE
+
 def pong(my_player: striker):
     '''
     Main game loop that handles input, updates player state, and renders game frames.
@@ -133,6 +189,9 @@ def pong(my_player: striker):
     global ended, winner
     running = True
     move = 0
+    dt = 1 / pong_setup.FPS # seconds the last frame took.
+    held = 0 # the direction the server was last told about
+    target = None # our striker's position on the server once it has every input
     #event handling
     while running:
         pong_setup.screen.fill(pong_setup.BLACK)
@@ -172,14 +231,41 @@ def pong(my_player: striker):
                 if event.type == pygame.KEYUP:
                     if event.key == pygame.K_RIGHT or event.key == pygame.K_LEFT:
                         move = 0
-        #update ball and player position
-        if is_vertical:
-            my_player.updateVert(move)
+        correction = c.inputs.reconcile()
+
+        if c.input_mode == connect.COMMANDS:
+            #only key changes are sent, the server moves our striker every tick
+            if move != held:
+                c.send_input(move)
+                held = move
+                target = None
+
+            #once the server has every input, ease towards its position while the striker is not moving
+            if correction is not None and not correction[2]:
+                target = correction[:2]
+            if target is not None and move == 0:
+                settle_striker(my_player, target)
+
+            move_striker(my_player, move, dt)
         else:
-            my_player.updateHori(move)
-        #send player's position and ball's position to the server
-        data = {'uuid': c.get_id(), 'x': my_player.posx, 'y': my_player.posy} 
-        c.send(data, packet.Status.MOVE)
+            #correct our striker to the newest position from the server, with the inputs it has not applied yet replayed on top
+            if correction is not None:
+                my_player.posx, my_player.posy, replay = correction
+                for m, frame_dt in replay:
+                    move_striker(my_player, m, frame_dt)
+
+            #move our striker right away and send the input to the server if it moved
+            before = (my_player.posx, my_player.posy)
+            move_striker(my_player, move, dt)
+            if (my_player.posx, my_player.posy) != before:
+                c.send_move(move, dt, my_player.posx, my_player.posy)
+
+        my_player.updatePos()
+
+        #move the ball and the other players to the world interpolated from the snapshot buffer
+        world = c.snapshots.sample()
+        if world is not None:
+            apply_world(c, world)
         
         # draw all connected players
         with c.player_list_lock:
@@ -188,7 +274,7 @@ def pong(my_player: striker):
                     p = cast(striker, i['player'])
                     p.display()
 
-                    if i['uuid'] == c.get_id():
+                    if s == c.player_slot:
                         p.display(is_current_player=True)
         # draw the ball
         Ball.display()
@@ -198,164 +284,166 @@ def pong(my_player: striker):
             pong_setup.displayText("Score:", c.scoreboard['lower_score'], pong_setup.WIDTH - 150, pong_setup.HEIGHT - 100, pong_setup.RED)
 
         pygame.display.update()
-        pong_setup.clock.tick(pong_setup.FPS)
+        # tick() returns the milliseconds since the last frame, the frame rate is not always reached.
+        dt = min(pong_setup.clock.tick(pong_setup.FPS) / 1000, pong_setup.MAX_FRAME_TIME)
 
 # Main Menu Handling
-try:
-    c = connect.init_connection()
-    print(c)
+if __name__ == "__main__":
+    try:
+        c = connect.init_connection()
+        print(c)
 
-    pygame.init()
+        pygame.init()
 
-    # Get unique player ID from server
-    id = c.receive().decode()
-    c.set_id(id)
-    print(f"Connected with ID: {id}")
+        # Get unique player ID from server
+        id = bytes(c.receive()).decode()
+        c.set_id(id)
+        print(f"Connected with ID: {id}")
 
-    # Get assigned player slot from server and assign player to position striker
-    while c.player_slot is None:
-        msg = c.receive()
+        # Get assigned player slot from server and assign player to position striker
+        while c.player_slot is None:
+            msg = c.receive()
 
-        if not msg:
-            raise ConnectionError("No slot received.")
+            if not msg:
+                raise ConnectionError("No slot received.")
 
-        if len(msg) < 1:
-            continue
-        try:
-            current_slot = packet.unload_packet(msg)
-        except ValueError as e:
-            print(f"{e}")
-            continue
+            if len(msg) < 1:
+                continue
+            try:
+                current_slot = packet.unload_packet(msg)
+            except ValueError as e:
+                print(f"{e}")
+                continue
 
-        if not isinstance(current_slot, dict):
-            continue
+            if not isinstance(current_slot, dict):
+                continue
 
-        if not isinstance(current_slot["slot"], int):
-            continue
+            if not isinstance(current_slot["slot"], int):
+                continue
 
-        if current_slot.get("slot") is None:
-            continue
+            if current_slot.get("slot") is None:
+                continue
         
         
-        c.set_player_slot(current_slot["slot"])
+            c.set_player_slot(current_slot["slot"])
 
-        if c.player_slot in [1, 2]:
-            is_vertical = True
-        else:
-            is_vertical = False
+            if c.player_slot in [1, 2]:
+                is_vertical = True
+            else:
+                is_vertical = False
 
-    # vertical strikers
-    player1 = striker(20, (pong_setup.HEIGHT / 2) - 50, 10, 100, 10, pong_setup.GREEN)
-    player2 = striker(pong_setup.WIDTH - 30, (pong_setup.HEIGHT / 2) - 50, 10, 100, 10, pong_setup.RED)
+        # vertical strikers
+        player1 = striker(20, (pong_setup.HEIGHT / 2) - 50, 10, 100, pong_setup.STRIKER_SPEED, pong_setup.GREEN)
+        player2 = striker(pong_setup.WIDTH - 30, (pong_setup.HEIGHT / 2) - 50, 10, 100, pong_setup.STRIKER_SPEED, pong_setup.RED)
     
-    # horizontal strikers
-    player3 = striker((pong_setup.WIDTH/2)-50, 20, 100, 10, 10, pong_setup.GREEN)
-    player4 = striker((pong_setup.WIDTH/2)-50, pong_setup.HEIGHT-30, 100, 10, 10, pong_setup.RED)
+        # horizontal strikers
+        player3 = striker((pong_setup.WIDTH/2)-50, 20, 100, 10, pong_setup.STRIKER_SPEED, pong_setup.GREEN)
+        player4 = striker((pong_setup.WIDTH/2)-50, pong_setup.HEIGHT-30, 100, 10, pong_setup.STRIKER_SPEED, pong_setup.RED)
     
-    with c.player_list_lock:
-        c.player_list["1"]["player"] = player1
-        c.player_list["2"]["player"] = player2
-        c.player_list["3"]["player"] = player3
-        c.player_list["4"]["player"] = player4
+        with c.player_list_lock:
+            c.player_list[1]["player"] = player1
+            c.player_list[2]["player"] = player2
+            c.player_list[3]["player"] = player3
+            c.player_list[4]["player"] = player4
 
 
-        my_player = c.player_list[str(c.player_slot)]["player"]
+            my_player = c.player_list[c.player_slot]["player"]
     
-    my_player = cast(striker, my_player)
+        my_player = cast(striker, my_player)
 
-    # intialize the ball
-    Ball = ball(pong_setup.WIDTH/2, pong_setup.HEIGHT/2, 7, pong_setup.WHITE)
+        # intialize the ball
+        Ball = ball(pong_setup.WIDTH/2, pong_setup.HEIGHT/2, 7, pong_setup.WHITE)
     
-    #initialize the thread
-    c.start_recieving(recv_handler)
-    # wait for player slot to be assigned
-    while c.player_slot is None:
-        time.sleep(IDLE_TIME)
+        #initialize the thread
+        c.start_recieving(recv_handler)
+        # wait for player slot to be assigned
+        while c.player_slot is None:
+            time.sleep(IDLE_TIME)
 
-    pygame.display.set_caption("Menu")
+        pygame.display.set_caption("Menu")
 
-    #font for menu
-    menuFont = pygame.font.Font("freesansbold.ttf", 100)
-    menuText = menuFont.render("PONG ROYALE", True, pong_setup.WHITE)
-    menuRect = menuText.get_rect(center=(450, 100))
+        #font for menu
+        menuFont = pygame.font.Font("freesansbold.ttf", 100)
+        menuText = menuFont.render("PONG ROYALE", True, pong_setup.WHITE)
+        menuRect = menuText.get_rect(center=(450, 100))
 
-    buttonFont = pygame.font.Font("freesansbold.ttf", 30)
-    exitButton = Button(None, 450, 400, "EXIT", buttonFont, pong_setup.WHITE, pong_setup.GREEN)
+        buttonFont = pygame.font.Font("freesansbold.ttf", 30)
+        exitButton = Button(None, 450, 400, "EXIT", buttonFont, pong_setup.WHITE, pong_setup.GREEN)
 
-    waitFont = pygame.font.Font("freesansbold.ttf", 30)
-    waitText = waitFont.render("Waiting for other players", True, pong_setup.WHITE)
-    waitRect = waitText.get_rect(center=(450, 300))
+        waitFont = pygame.font.Font("freesansbold.ttf", 30)
+        waitText = waitFont.render("Waiting for other players", True, pong_setup.WHITE)
+        waitRect = waitText.get_rect(center=(450, 300))
     
-    started = False
-    ready_to_play = False
+        started = False
+        ready_to_play = False
 
-    while True:
-        mousePos = pygame.mouse.get_pos()
-        pong_setup.screen.fill(pong_setup.BLACK)
+        while True:
+            mousePos = pygame.mouse.get_pos()
+            pong_setup.screen.fill(pong_setup.BLACK)
 
-        for button in [exitButton]:
-            button.changeColour(mousePos[0], mousePos[1])
-            button.update(pong_setup.screen)
+            for button in [exitButton]:
+                button.changeColour(mousePos[0], mousePos[1])
+                button.update(pong_setup.screen)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                        
-                if exitButton.checkForInput(mousePos[0], mousePos[1]):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
                     pygame.quit()
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                        
+                    if exitButton.checkForInput(mousePos[0], mousePos[1]):
+                        pygame.quit()
 
-        #count number of player who are ready to join the game
-        with c.player_list_lock:
-            active_count = sum(1 for p in c.player_list.values() if p["uuid"])
-
-        #if game has ended, show which team won the game
+            #count number of player who are ready to join the game
+            with c.player_list_lock:
+                active_count = sum(1 for p in c.player_list.values() if p["uuid"])
 
-        with end_lock:
-            end_copy = ended
+            #if game has ended, show which team won the game
 
-        if end_copy:
             with end_lock:
+                end_copy = ended
 
-                if "Server Disconnected" in winner:
-                    endText = waitFont.render(f"Disconnected!\nRelaunch the client.", True, pong_setup.RED)
-                    pygame.display.set_caption("Disconnected")
-                else:
-                    winner = c.get_winner()
-                    endText = waitFont.render(f"{winner} wins!", True, pong_setup.WHITE)
-                    pygame.display.set_caption(f"{winner} wins!")
-            endRect = endText.get_rect(center=(450, 250))
-            pong_setup.screen.blit(endText,endRect)
-
-        #if player has exited the game, close the game screen and disconnect the server
-        elif started:
-            pygame.quit()
-            exit()
-        #show main menu of the game
-        else:
-            pong_setup.screen.blit(menuText, menuRect)
-            pong_setup.screen.blit(waitText,waitRect)
-            # Display active player count
-            playerCountText = waitFont.render(f"Players connected: {active_count}/4", True, pong_setup.WHITE)
-            playerCountRect = playerCountText.get_rect(center=(450, 340))
-            pong_setup.screen.blit(playerCountText, playerCountRect)
+            if end_copy:
+                with end_lock:
+
+                    if "Server Disconnected" in winner:
+                        endText = waitFont.render(f"Disconnected!\nRelaunch the client.", True, pong_setup.RED)
+                        pygame.display.set_caption("Disconnected")
+                    else:
+                        winner = c.get_winner()
+                        endText = waitFont.render(f"{winner} wins!", True, pong_setup.WHITE)
+                        pygame.display.set_caption(f"{winner} wins!")
+                endRect = endText.get_rect(center=(450, 250))
+                pong_setup.screen.blit(endText,endRect)
+
+            #if player has exited the game, close the game screen and disconnect the server
+            elif started:
+                pygame.quit()
+                exit()
+            #show main menu of the game
+            else:
+                pong_setup.screen.blit(menuText, menuRect)
+                pong_setup.screen.blit(waitText,waitRect)
+                # Display active player count
+                playerCountText = waitFont.render(f"Players connected: {active_count}/4", True, pong_setup.WHITE)
+                playerCountRect = playerCountText.get_rect(center=(450, 340))
+                pong_setup.screen.blit(playerCountText, playerCountRect)
 
-        #if there are 4 players, start the game
-        if active_count == 4 and started != True:
-            ready_to_play = True
-            started = True
-            pygame.display.set_caption("Pong Royale")
+            #if there are 4 players, start the game
+            if active_count == 4 and started != True:
+                ready_to_play = True
+                started = True
+                pygame.display.set_caption("Pong Royale")
 
-        if ready_to_play:
-            pong(my_player)
-            ready_to_play = False
+            if ready_to_play:
+                pong(my_player)
+                ready_to_play = False
 
 
 
-        pygame.display.update()
+            pygame.display.update()
 
-except Exception as e:
-    print(f"Client error: {e}")
-    exit(1)
+    except Exception as e:
+        print(f"Client error: {e}")
+        exit(1)
 
 
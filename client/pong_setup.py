@@ -19,7 +19,9 @@ screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Pong")
 # Used to adjust the frame rate
 clock = pygame.time.Clock()
-FPS = 30
+FPS = 60
+STRIKER_SPEED = 300 # pixels per second, strikers move by this times the measured frame time.
+MAX_FRAME_TIME = 0.1 # seconds, a stalled frame does not jump the striker across the screen.
 
 def displayText(text:str, score:int, x:float, y:float, color:tuple[int, int, int]) -> None:
     t = font20.render(text+ " " + str(score), True, color)
@@ -0,0 +1,214 @@
+import asyncio
+import time
+import uuid
+from typing import Optional
+import os, sys
+import game_server as gs
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import shared.framing as framing
+
+
+class async_client(gs.client):
+    '''
+    Client class for the asyncio server. It has the same interface as game_server.client so rooms can treat
+    both the same way, but it wraps an asyncio stream instead of a blocking socket. It requires:
+        - ID
+        - StreamReader
+        - StreamWriter
+        - Client IP
+        - Client Port
+        - idle_timeout, seconds the client can send nothing before .receive() gives up on it, None waits forever.
+
+    Methods:
+        .send(data, kind) queues the data for the client's writer task without blocking the event loop.
+        .send_frame(frame, kind) queues data that is already framed, for broadcasts.
+        .start_writer() starts the writer task.
+        .write_loop() is the writer task, it writes the queued data to the stream.
+        .start_watchdog() starts the timer that closes the client if nothing arrived from it for idle_timeout seconds.
+        .receive() is a coroutine that returns the next message from the client.
+        .close() will close the stream and remove itself from its room's client list.
+    '''
+
+    def __init__(self, new_uuid, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, ip, port, idle_timeout=None):
+        super().__init__(new_uuid, writer, ip, port, idle_timeout)
+        self.reader = reader
+        self.writer = writer
+        self.wakeup = asyncio.Event()
+        self.last_received = time.monotonic()
+        self.watchdog: Optional[asyncio.TimerHandle] = None
+
+    def send_frame(self, frame: bytes, kind=None) -> None:
+        '''.send_frame(frame) queues a frame made by framing.frame() for the writer task and wakes it up.
+            .send(data) frames the data and calls this. Raises ConnectionError if the client has fallen too far behind.
+        '''
+
+        if self.writer.is_closing():
+            raise ConnectionError("Connection closed.")
+
+        self.queue.put(frame, kind)
+        self.wakeup.set()
+
+    def start_writer(self) -> None:
+        asyncio.create_task(self.write_loop())
+
+    async def write_loop(self) -> None:
+        '''
+        Writes the queued frames to the stream and waits for the stream to drain. While it waits, newer frames
+        replace the ones still queued, so a slow client gets fewer, newer packets instead of a growing buffer.
+        Everything queued since the last write is handed to the transport in one writelines call.
+        '''
+        try:
+            while not self.queue.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+
+                frames = self.queue.take_nowait()
+                self.writer.writelines(frames)
+                self.count_sent(frames)
+
+                await self.writer.drain()
+
+        except (ConnectionError, OSError) as e:
+            if not self.queue.closed:
+                print(f"Error sending data to client {self.id}: {e}")
+                self.close()
+
+    def start_watchdog(self) -> None:
+        '''
+        Checks for an idle client with one timer instead of a timeout on every read, asyncio.wait_for() costs
+        more than the read itself. Receiving only stores the time, and the timer is moved to the new deadline
+        when it fires, so it runs about once every idle_timeout seconds per client.
+        '''
+        if self.idle_timeout:
+            self.last_received = time.monotonic()
+            self.watchdog = asyncio.get_running_loop().call_later(self.idle_timeout, self.check_idle)
+
+    def check_idle(self) -> None:
+        if self.queue.closed:
+            return
+
+        idle = time.monotonic() - self.last_received
+
+        if idle < self.idle_timeout:
+            self.watchdog = asyncio.get_running_loop().call_later(self.idle_timeout - idle, self.check_idle)
+            return
+
+        # closing the stream ends the receive loop, which leaves the room and frees the player slot.
+        print(f"Client {self.id}: nothing received for {idle:.1f}s, connection timed out.")
+        self.close()
+
+    async def receive(self) -> bytes:
+        '''
+        .receive() will wait for the next frame from the client and return its payload.
+        '''
+        try:
+            header = await self.reader.readexactly(framing.HEADER.size)
+            size, = framing.HEADER.unpack(header)
+            data = await self.reader.readexactly(size)
+            self.last_received = time.monotonic()
+            self.count_received(framing.HEADER.size + size)
+            return data
+        except asyncio.IncompleteReadError:
+            raise ConnectionError("Connection closed.")
+
+    def close(self) -> None:
+        '''.close() will close the stream and remove itself from its room's client list.'''
+
+        if self.room is not None:
+            self.room.remove_client(self)
+
+        self.ready = False
+
+        if self.queue.closed:
+            return
+
+        self.queue.close()
+        self.wakeup.set()
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+        self.writer.close()
+
+        print(f"Client disconnected: {self.ip}:{self.port} ID: {self.id}")
+
+
+async def handle_client(conn: gs.server_connection, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    '''
+    Coroutine that runs for each client connection. It routes the client into a room and applies every packet it sends.
+    '''
+
+    client_addr = writer.get_extra_info("peername")
+    c = async_client(uuid.uuid4(), reader, writer, client_addr[0], client_addr[1], conn.idle_timeout)
+
+    try:
+        room = conn.assign_room(c)
+    except ConnectionError as e:
+        print(f"Rejected Client {c}: {e}")
+        writer.close()
+        return
+
+    print(f"New Client: {c} in room {room.id}")
+    print(f"There is now {conn.get_active()} active connections.")
+    c.start_writer()
+    c.start_watchdog()
+
+    if not room.join(c):
+        return
+
+    try:
+        while True:
+            data = await c.receive()
+            if not data:
+                # the client has disconnected.
+                break
+
+            room.handle_packet(c, data)
+
+    except Exception as e:
+        print(f"Client Error: {e}")
+
+    # handle client disconnection
+    finally:
+        room.leave(c)
+
+
+async def ball_updater(conn: gs.server_connection):
+    '''
+    Ticks every room on the event loop. Same as main.ball_updater_thread without a thread.
+    '''
+
+    scheduler = conn.scheduler
+
+    while True:
+        await asyncio.sleep(scheduler.delay())
+
+        ticks = scheduler.due()
+        if ticks == 0:
+            continue
+
+        for _ in range(ticks):
+            running = conn.tick_rooms()
+
+        # If every room is paused or no clients are connected, wait for a while before checking again.
+        if not running:
+            await asyncio.sleep(gs.IDLE_TIME)
+            scheduler.reset()
+
+
+async def serve(conn: gs.server_connection):
+    '''
+    Runs accept, every client's receive loop, the ball ticker and the broadcasts on one event loop.
+    Uses the listening socket opened by game_server.init_host(), so it speaks the same protocol as the threaded server.
+    '''
+
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_client(conn, reader, writer),
+        sock=conn.socket
+    )
+
+    ball_task = asyncio.create_task(ball_updater(conn))
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        ball_task.cancel()
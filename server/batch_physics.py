@@ -0,0 +1,391 @@
+'''
+Batched game physics. Keeps the ball and paddles of many matches in NumPy arrays, one array per field
+(struct of arrays), and steps wall bounces, paddle hits and scoring for every match in one vectorized call.
+The rules are the same as game_track.Game_State.Ball.update, only the direction a ball takes after a goal
+comes from the batch's own random generator instead of the random module.
+
+NumPy is optional, the rest of the server does not need it. Run the benchmark from the server directory:
+    python -m batch_physics --matches 4096 --ticks 1000
+'''
+
+import argparse
+import time
+from typing import Optional
+import game_track as gt
+
+try:
+    import numpy as np
+except ImportError as e:
+    raise ImportError("batch_physics needs NumPy, install it with pip install numpy.") from e
+
+SIDE_NONE = 0
+SIDE_UPPER = 1
+SIDE_LOWER = 2
+SIDES = (gt.Side.NONE, gt.Side.UPPER, gt.Side.LOWER)
+SIDE_CODES = {side: code for code, side in enumerate(SIDES)}
+
+# column of each paddle position in the paddle arrays, the same order as the slots of a Game_State: column = slot - 1.
+LEFT, RIGHT, TOP, BOTTOM = range(gt.MAX_PLAYERS)
+NO_PLAYER = -1
+
+# per column: the size of the paddle, the axis it sends the ball back on, the direction the ball moves
+# along that axis when heading for the goal behind it and the side it takes the ball for.
+COLUMNS = np.arange(gt.MAX_PLAYERS)
+PADDLE_SIZES = (
+    np.array([gt.PADDLE_WIDTH, gt.PADDLE_WIDTH, gt.PADDLE_LENGTH, gt.PADDLE_LENGTH], dtype=float),
+    np.array([gt.PADDLE_LENGTH, gt.PADDLE_LENGTH, gt.PADDLE_WIDTH, gt.PADDLE_WIDTH], dtype=float),
+)
+PADDLE_AXIS = np.array([gt.X_AXIS, gt.X_AXIS, gt.Y_AXIS, gt.Y_AXIS])
+TOWARDS_GOAL = np.array([-1.0, 1.0, -1.0, 1.0])
+PADDLE_SIDES = np.array([SIDE_UPPER, SIDE_LOWER, SIDE_UPPER, SIDE_LOWER], dtype=np.int8)
+
+
+def _slab(p, d, low, high) -> tuple:
+    '''
+    The same as game_track._slab for (matches, 4) paddle edges. Moves that never are between low and high
+    get an empty (inf, -inf) range.
+    '''
+    p = p[:, None]
+    d = d[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1 = (low - p) / d
+        t2 = (high - p) / d
+
+    enter = np.minimum(t1, t2)
+    exit = np.maximum(t1, t2)
+
+    still = d == 0
+    between = (low <= p) & (p <= high)
+    enter = np.where(still, np.where(between, -np.inf, np.inf), enter)
+    exit = np.where(still, np.where(between, np.inf, -np.inf), exit)
+    return enter, exit
+
+
+class batch_world:
+    '''
+    The ball and paddle state of a batch of matches. It contains one array per field, indexed by match:
+        - x, y, x_fac, y_fac, speed: the ball position, direction and speed
+        - side: SIDE_NONE, SIDE_UPPER or SIDE_LOWER, the side that last touched the ball
+        - last_touched: the column of the paddle that last touched the ball, or NO_PLAYER
+        - upper_score, lower_score: the scoreboard
+        - px, py: (matches, 4) arrays with the top left corner of each paddle, in LEFT, RIGHT, TOP, BOTTOM order
+        - active: (matches, 4) array, True where the slot has a player
+    and rng, the numpy Generator used to pick the ball direction after a goal.
+
+    Methods:
+        .step(dt, mask) advances every match, or the matches where mask is True, by one tick.
+        .run(ticks, dt) steps every match ticks times.
+        .move_paddles(directions, dt) moves every paddle along its axis at PADDLE_SPEED.
+        .from_states(states) builds a batch from Game_State objects.
+        .load(i, state) and .store(i, state) copy one match from and to a Game_State.
+        .write_back(states) stores every match back into its Game_State.
+    '''
+
+    def __init__(self, matches: int, seed: Optional[int] = None):
+        self.matches = matches
+        self.rng = np.random.default_rng(seed)
+
+        self.x = np.full(matches, gt.WIDTH / 2)
+        self.y = np.full(matches, gt.HEIGHT / 2)
+        self.x_fac = np.ones(matches)
+        self.y_fac = np.ones(matches)
+        self.speed = np.full(matches, gt.BALL_SPEED)
+        self.side = np.zeros(matches, dtype=np.int8)
+        self.last_touched = np.full(matches, NO_PLAYER, dtype=np.int8)
+        self.upper_score = np.zeros(matches, dtype=np.int64)
+        self.lower_score = np.zeros(matches, dtype=np.int64)
+
+        home = [gt.HOME_POSITIONS[slot] for slot in gt.SLOTS]
+        self.px = np.tile(np.array([x for x, _ in home]), (matches, 1))
+        self.py = np.tile(np.array([y for _, y in home]), (matches, 1))
+        self.active = np.ones((matches, gt.MAX_PLAYERS), dtype=bool)
+
+    def __len__(self) -> int:
+        return self.matches
+
+    def __str__(self):
+        return f"Batch of {self.matches} matches, {int(self.upper_score.sum() + self.lower_score.sum())} goals scored"
+
+    @classmethod
+    def from_states(cls, states: list, seed: Optional[int] = None) -> "batch_world":
+        batch = cls(len(states), seed)
+        for i, state in enumerate(states):
+            batch.load(i, state)
+        return batch
+
+    def load(self, i: int, state: gt.Game_State) -> None:
+        '''
+        Copies the ball, paddles and scoreboard of a Game_State into match i.
+        '''
+        ball = state.ball
+        scoreboard = ball.scoreboard_ref if ball.scoreboard_ref is not None else state.scoreboard
+
+        self.x[i] = ball.x
+        self.y[i] = ball.y
+        self.x_fac[i] = ball.xFac
+        self.y_fac[i] = ball.yFac
+        self.speed[i] = ball.speed
+        self.side[i] = SIDE_CODES[ball.side]
+        self.last_touched[i] = NO_PLAYER if ball.last_touched_player is None else ball.last_touched_player - 1
+        self.upper_score[i] = scoreboard["upper_score"]
+        self.lower_score[i] = scoreboard["lower_score"]
+
+        for column, player in enumerate(state.players):
+            self.px[i, column] = player.x
+            self.py[i, column] = player.y
+            self.active[i, column] = player.id is not None
+
+    def store(self, i: int, state: gt.Game_State) -> None:
+        '''
+        Copies match i back into a Game_State. The scoreboard dict is updated in place, so the ball keeps its reference.
+        '''
+        ball = state.ball
+        scoreboard = ball.scoreboard_ref if ball.scoreboard_ref is not None else state.scoreboard
+
+        ball.x = float(self.x[i])
+        ball.y = float(self.y[i])
+        ball.xFac = int(self.x_fac[i])
+        ball.yFac = int(self.y_fac[i])
+        ball.side = SIDES[self.side[i]]
+        ball.last_touched_player = int(self.last_touched[i]) + 1 if self.last_touched[i] != NO_PLAYER else None
+        scoreboard["upper_score"] = int(self.upper_score[i])
+        scoreboard["lower_score"] = int(self.lower_score[i])
+
+        for column, player in enumerate(state.players):
+            player.x = float(self.px[i, column])
+            player.y = float(self.py[i, column])
+
+    def write_back(self, states: list) -> None:
+        for i, state in enumerate(states):
+            self.store(i, state)
+
+    def move_paddles(self, directions, dt: float = gt.DEFAULT_DT) -> None:
+        '''
+        Moves every paddle by a (matches, 4) array of -1, 0 or 1 at PADDLE_SPEED and keeps it inside the game area.
+        LEFT and RIGHT paddles move vertically, TOP and BOTTOM paddles move horizontally.
+        '''
+        step = np.asarray(directions) * (gt.PADDLE_SPEED * dt)
+
+        self.py[:, LEFT:RIGHT + 1] = np.clip(self.py[:, LEFT:RIGHT + 1] + step[:, LEFT:RIGHT + 1], 0.0, gt.HEIGHT - gt.PADDLE_LENGTH)
+        self.px[:, TOP:BOTTOM + 1] = np.clip(self.px[:, TOP:BOTTOM + 1] + step[:, TOP:BOTTOM + 1], 0.0, gt.WIDTH - gt.PADDLE_LENGTH)
+
+    def step(self, dt: float = gt.DEFAULT_DT, mask=None) -> None:
+        '''
+        Advances the matches where mask is True, or every match if mask is None, by dt seconds.
+        Like Ball.update, every ball is swept along its path and reflects off the walls and paddles it reaches,
+        at their exact time of impact, up to MAX_BOUNCES times per tick.
+        '''
+        if mask is None:
+            mask = np.ones(self.matches, dtype=bool)
+
+        x, y = self.x, self.y
+        width, height = float(gt.WIDTH), float(gt.HEIGHT)
+
+        outside = mask & ((x < 0) | (x > width) | (y < 0) | (y > height))
+        if outside.any():
+            self.hit_walls(outside)
+
+        sweeping = mask & ~outside
+        step = self.speed * dt
+        remaining = np.ones(self.matches)
+        last_paddle = np.full(self.matches, NO_PLAYER, dtype=np.int8)
+        left, top, right, bottom = self.paddle_boxes()
+
+        for _ in range(gt.MAX_BOUNCES):
+            if not sweeping.any():
+                return
+
+            dx = self.x_fac * step * remaining
+            dy = self.y_fac * step * remaining
+
+            t_wall, wall_x, wall_y = self.wall_impacts(dx, dy)
+            t_paddle, column, axis = self.paddle_impacts(dx, dy, left, top, right, bottom, sweeping, last_paddle)
+
+            # paddles first, the same as Ball.update.
+            bounced = sweeping & (t_paddle <= t_wall) & (t_paddle != np.inf)
+            if bounced.any():
+                t = t_paddle[bounced]
+                x[bounced] += dx[bounced] * t
+                y[bounced] += dy[bounced] * t
+
+                hit_column = column[bounced]
+                flip_x = axis[bounced] == gt.X_AXIS
+                self.x_fac[bounced] = np.where(flip_x, -self.x_fac[bounced], self.x_fac[bounced])
+                self.y_fac[bounced] = np.where(flip_x, self.y_fac[bounced], -self.y_fac[bounced])
+                self.side[bounced] = PADDLE_SIDES[hit_column]
+                self.last_touched[bounced] = hit_column
+                last_paddle[bounced] = hit_column
+                remaining[bounced] *= 1 - t
+
+            walled = sweeping & ~bounced
+            done = walled & (t_wall > 1)
+            x[done] += dx[done]
+            y[done] += dy[done]
+
+            walled &= ~done
+            if walled.any():
+                t = t_wall[walled]
+                on_x = wall_x[walled]
+                on_y = wall_y[walled]
+
+                # stop exactly on the edge, the same as Ball.update.
+                x[walled] = np.where(on_x, np.where(dx[walled] < 0, 0.0, width), x[walled] + dx[walled] * t)
+                y[walled] = np.where(on_y, np.where(dy[walled] < 0, 0.0, height), y[walled] + dy[walled] * t)
+
+                scoring = walled & (self.side != SIDE_NONE)
+                if scoring.any():
+                    self.score(scoring)
+
+                bouncing = walled & ~scoring
+                self.x_fac[bouncing & wall_x] *= -1
+                self.y_fac[bouncing & wall_y] *= -1
+                last_paddle[bouncing] = NO_PLAYER
+                remaining[bouncing] *= 1 - t_wall[bouncing]
+
+                done |= scoring
+
+            sweeping &= ~done
+
+    def paddle_boxes(self) -> tuple:
+        '''
+        Returns the left, top, right and bottom edges of every paddle as (matches, 4) arrays.
+        '''
+        return self.px, self.py, self.px + PADDLE_SIZES[0], self.py + PADDLE_SIZES[1]
+
+    def wall_impacts(self, dx, dy) -> tuple:
+        '''
+        The same as Ball.wallImpact for every match: the fraction of the move before reaching an edge,
+        and masks of the matches that reach a left or right edge and a top or bottom edge.
+        '''
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_x = np.where(dx < 0, -self.x / dx, np.where(dx > 0, (gt.WIDTH - self.x) / dx, np.inf))
+            t_y = np.where(dy < 0, -self.y / dy, np.where(dy > 0, (gt.HEIGHT - self.y) / dy, np.inf))
+
+        t = np.minimum(t_x, t_y)
+        finite = t != np.inf
+        return t, finite & (t_x == t), finite & (t_y == t)
+
+    def paddle_impacts(self, dx, dy, left, top, right, bottom, sweeping, last_paddle) -> tuple:
+        '''
+        The same as Ball.hitPlayer for every match. Returns the fraction of the move before the first paddle hit
+        (inf if none), the column of that paddle and the axis to reflect.
+        '''
+        t_hit = np.full(self.matches, np.inf)
+        column = np.zeros(self.matches, dtype=np.int8)
+        axis = np.zeros(self.matches, dtype=np.int64)
+
+        # most balls are nowhere near a paddle, only sweep the matches whose move overlaps one.
+        x, y = self.x, self.y
+        end_x = x + dx
+        end_y = y + dy
+        min_x, max_x = np.minimum(x, end_x)[:, None], np.maximum(x, end_x)[:, None]
+        min_y, max_y = np.minimum(y, end_y)[:, None], np.maximum(y, end_y)[:, None]
+
+        near = (self.active & sweeping[:, None] & (COLUMNS != last_paddle[:, None])
+                & (max_x >= left) & (min_x <= right) & (max_y >= top) & (min_y <= bottom))
+        rows = np.flatnonzero(near.any(axis=1))
+
+        if rows.size == 0:
+            return t_hit, column, axis
+
+        x_enter, x_exit = _slab(x[rows], dx[rows], left[rows], right[rows])
+        y_enter, y_exit = _slab(y[rows], dy[rows], top[rows], bottom[rows])
+
+        t_enter = np.maximum(x_enter, y_enter)
+        t_exit = np.minimum(x_exit, y_exit)
+        enter_axis = np.where(x_enter >= y_enter, gt.X_AXIS, gt.Y_AXIS)
+
+        moving = np.where(PADDLE_AXIS == gt.X_AXIS, self.x_fac[rows, None], self.y_fac[rows, None])
+        towards_goal = moving == TOWARDS_GOAL
+
+        candidate = near[rows] & (t_enter <= t_exit) & (t_exit > 0) & (t_enter <= 1)
+
+        # a ball starting inside a paddle is sent back only if it is heading for the goal,
+        # and a paddle cannot be entered from behind.
+        inside = t_enter < 0
+        candidate &= np.where(inside, towards_goal, (enter_axis != PADDLE_AXIS) | towards_goal)
+        t = np.where(inside, 0.0, t_enter)
+        enter_axis = np.where(inside, PADDLE_AXIS, enter_axis)
+
+        t = np.where(candidate, t, np.inf)
+        first = np.argmin(t, axis=1)
+        picked = np.arange(rows.size)
+
+        t_hit[rows] = t[picked, first]
+        column[rows] = first
+        axis[rows] = enter_axis[picked, first]
+        return t_hit, column, axis
+
+    def score(self, scoring) -> None:
+        '''
+        The same as Ball.score followed by Ball.reset for the matches in the scoring mask.
+        A side that hits its own walls gives the point away.
+        '''
+        x, y = self.x, self.y
+        hit_top = y <= 0
+        hit_bottom = y >= gt.HEIGHT
+        hit_left = x <= 0
+        hit_right = x >= gt.WIDTH
+
+        upper_point = scoring & (
+            ((self.side == SIDE_UPPER) & ~(hit_top | hit_left)) |
+            ((self.side == SIDE_LOWER) & (hit_bottom | hit_right))
+        )
+        self.upper_score += upper_point
+        self.lower_score += scoring & ~upper_point
+
+        goals = np.flatnonzero(scoring)
+        x[goals] = gt.WIDTH / 2
+        y[goals] = gt.HEIGHT / 2
+        self.side[goals] = SIDE_NONE
+        self.x_fac[goals] = self.rng.choice((-1.0, 1.0), goals.size)
+        self.y_fac[goals] = self.rng.choice((-1.0, 1.0), goals.size)
+
+    def hit_walls(self, mask) -> None:
+        '''
+        The same as Ball.hitWall for the matches in mask, used for balls that start a tick outside the game area.
+        '''
+        x, y = self.x, self.y
+        out_y = (y <= 0) | (y >= gt.HEIGHT)
+        out_x = (x <= 0) | (x >= gt.WIDTH)
+        out = mask & (out_x | out_y)
+
+        scoring = out & (self.side != SIDE_NONE)
+        bouncing = out & ~scoring
+
+        if scoring.any():
+            self.score(scoring)
+
+        self.y_fac[bouncing & out_y] *= -1
+        self.x_fac[bouncing & out_x] *= -1
+
+    def run(self, ticks: int, dt: float = gt.DEFAULT_DT) -> None:
+        for _ in range(ticks):
+            self.step(dt)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steps many matches at once and reports match ticks per second.")
+    parser.add_argument("--matches", type=int, default=4096, help="matches in the batch")
+    parser.add_argument("--ticks", type=int, default=1000, help="ticks to step every match")
+    parser.add_argument("--dt", type=float, default=gt.DEFAULT_DT, help="game seconds per tick")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the ball directions")
+    args = parser.parse_args()
+
+    batch = batch_world(args.matches, args.seed)
+    batch.x_fac[:] = batch.rng.choice((-1.0, 1.0), args.matches)
+    batch.y_fac[:] = batch.rng.choice((-1.0, 1.0), args.matches)
+
+    start = time.perf_counter()
+    batch.run(args.ticks, args.dt)
+    seconds = time.perf_counter() - start
+
+    match_ticks = args.matches * args.ticks
+    goals = int(batch.upper_score.sum() + batch.lower_score.sum())
+    print(f"{args.matches} matches x {args.ticks} ticks in {seconds:.3f}s: "
+          f"{match_ticks / seconds:,.0f} match ticks/s, {goals} goals, {goals / seconds:,.1f} goals/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,26 @@ import json
 import os, sys
 import uuid
 import threading
+import time
+from typing import Optional
 import game_track as gt
+import tick_scheduler as ts
+import send_queue as sq
+import metrics
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import shared.packet as packet
+import shared.framing as framing
+import shared.timing as timing
 
 RECV_SIZE = 1024
 SOCKET_TIMEOUT = 1
-
-clients = [] # SHARED RESOURCE - MUST BE UNLOCKED AND LOCKED WHEN USING!
-client_lock = threading.Lock()
+MAX_ROOMS = 256
+TARGET_SCORE = 10
+TICK_RATE = 1 / gt.DEFAULT_DT
+IDLE_TIME = 1
+IDLE_TIMEOUT = 10 # seconds a client can send nothing before it is disconnected, 0 never disconnects it.
+KEYFRAME_INTERVAL = 100 # every this many ticks every client gets a full SNAPSHOT instead of a DELTA.
+KEEPALIVE_INTERVAL = 2 # seconds a room can send nothing before it resends the player list, well below the client's TIMEOUT.
 
 class client:
     '''
@@ -21,68 +32,153 @@ class client:
         - Client IP
         - Client Port
         - ready bool, used to check if the client is ready to play. Usually set true after the initial connection.
+        - room, the room object this client was routed into. Set by server_connection.assign_room().
+        - acked_tick, the last tick the client acknowledged, used as the base of its deltas.
+        - slot, the 1 byte player slot assigned at join time. Packets refer to the player by this slot instead of its UUID.
+        - queue, the send_queue of frames waiting to be written by the client's writer thread.
+        - writer_thread, the thread started by .start_writer(), None before it is started.
+        - bytes_in, packets_in, bytes_out, packets_out, what the client sent and was sent, frame headers included.
+        - rtt, a timing.rtt_estimator with the smoothed round trip time and jitter from the PINGs the room sends.
+        - idle_timeout, seconds the client can send nothing before .receive() gives up on it, None waits forever.
+          A live client answers the room's PING every timing.PING_INTERVAL, so silence means the connection is dead.
 
     Methods:
         Printing the object itself will display the IP:PORT and ID.
-        .send(data) will send encoded data to the server.
+        .send(data, kind) will queue encoded data to be sent to the client.
+        .send_frame(frame, kind) will queue data that is already framed, so one frame can be shared by every client.
+        .start_writer() will start the thread that writes the queued data to the socket.
         .recieve() will recieve data from the client.
-        .close() will close the client connection and remove itself from the clients list.
+        .queue_depth() will return the number of frames waiting to be sent.
+        .count_received(frame_size) and .count_sent(frames) add to the client's and the server's traffic metrics.
+        .close() will close the client connection, stop its writer thread and remove itself from its room's client list.
         .get_id() will return the ID of the client connection.
         .ready_up() will set the client as ready.
         .is_ready() will return the ready status of the client.
 
     '''
 
-    def __init__(self, new_uuid, conn, ip, port) :
+    def __init__(self, new_uuid, conn, ip, port, idle_timeout: Optional[float] = None) :
         self.id = new_uuid
         self.conn = conn
         self.ip = ip
         self.port = port
         self.ready = False
+        self.room = None
+        self.id_bytes = str(new_uuid).encode() # encoded once for the packets that carry the UUID.
+        self.acked_tick = 0
+        self.slot = None
+        self.buffer = framing.frame_buffer()
+        self.queue = sq.send_queue()
+        self.writer_thread = None
+        self.bytes_in = 0
+        self.packets_in = 0
+        self.bytes_out = 0
+        self.packets_out = 0
+        self.rtt = timing.rtt_estimator()
+        self.idle_timeout = idle_timeout or None
 
     def __str__(self) -> str:
         return f"Client connected: {self.ip}:{self.port} ID: {self.id}"
     
-    def send(self, data: bytes) -> None:
-        '''.send(data) either encode a string or get a byte object and send it to the server.
-            It will be ended with a newline character. Unlike the client, this does not serialize the data for you.
+    def send(self, data: bytes, kind=None) -> None:
+        '''.send(data) either encode a string or get a byte object and queue it for the client.
+            It will be sent as a length prefixed frame. Unlike the client, this does not serialize the data for you.
             You must serialize the data before sending it.
+            kind is one of the send_queue kinds for packets where only the newest one matters, see send_queue.put().
+            Raises ConnectionError if the client has fallen too far behind.
         '''
-        
-        if isinstance(data, str):
-            data = data.encode()
-        data = bytes(data)
-        self.conn.sendall(data + b'\n')
 
+        self.send_frame(framing.frame(data), kind)
+
+    def send_frame(self, frame: bytes, kind=None) -> None:
+        '''.send_frame(frame) queues a frame made by framing.frame(). The frame is not copied, broadcasts frame
+            the packet once and queue the same bytes object for every client.
+        '''
+
+        self.queue.put(frame, kind)
+
+    def start_writer(self) -> None:
+        self.writer_thread = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer_thread.start()
+
+    def write_loop(self) -> None:
+        '''
+        Writes the queued frames to the socket. Only this thread blocks when the client does not read fast enough,
+        the tick keeps queueing and newer frames replace the ones that are still waiting.
+        Everything queued since the last write goes out in one sendmsg call.
+        '''
+        try:
+            while True:
+                frames = self.queue.take()
+
+                if not frames:
+                    # the client was closed.
+                    return
+
+                framing.send_frames(self.conn, frames)
+                self.count_sent(frames)
+
+        except OSError as e:
+            if not self.queue.closed:
+                print(f"Error sending data to client {self.id}: {e}")
+                self.close()
+
+    def queue_depth(self) -> int:
+        return self.queue.depth()
+
+    def count_received(self, frame_size: int) -> None:
+        self.packets_in += 1
+        self.bytes_in += frame_size
+        metrics.PACKETS_IN.value += 1
+        metrics.BYTES_IN.value += frame_size
+
+    def count_sent(self, frames: list) -> None:
+        size = sum(map(len, frames))
+        self.packets_out += len(frames)
+        self.bytes_out += size
+        metrics.PACKETS_OUT.value += len(frames)
+        metrics.BYTES_OUT.value += size
     
     
-    def receive(self) -> bytes:
+    def receive(self):
         '''
-        .receive() will decode and return the data to the caller.
-        Returns a dictionary with the status and the data.
+        .receive() will return the payload of the next frame from the client.
+        Every frame of a recv is kept in the client's receive buffer, so this only calls recv when no complete frame is buffered.
+        The payload is a memoryview into the buffer and is only valid until the next call to .receive().
+        Raises ConnectionError if nothing arrived for idle_timeout seconds, the timeout is set on the socket by
+        server_connection.accept_clients().
         '''
-        buff = b''
         while True:
-            d = self.conn.recv(RECV_SIZE)
-            
-            if not d:
-                raise ConnectionError("Connection closed.")
-            buff += d
-            
-            if b'\n' in buff:
-                full_data, buff = buff.split(b'\n', 1)
-                return full_data
-            
-            if len(buff) >= RECV_SIZE:
-                return buff        
+            data = self.buffer.next_frame()
+
+            if data is not None:
+                self.count_received(framing.HEADER.size + len(data))
+                return data
+
+            try:
+                if not self.buffer.recv_into(self.conn):
+                    raise ConnectionError("Connection closed.")
+            except socket.timeout:
+                raise ConnectionError(f"Nothing received for {self.idle_timeout}s, connection timed out.")
     
     def close(self) -> None:
-        '''.close() will close the client connection and remove itself from the clients list.'''
+        '''.close() will close the client connection and remove itself from its room's client list.'''
 
-        with client_lock:
-            clients.remove(self)
-            self.ready = False
-            self.conn.close()
+        if self.room is not None:
+            self.room.remove_client(self)
+
+        self.ready = False
+
+        if self.queue.closed:
+            return
+
+        self.queue.close()
+        try:
+            # wakes the writer thread if it is blocked in a send, close() alone does not.
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
 
         print(f"Client disconnected: {self.ip}:{self.port} ID: {self.id}")
 
@@ -90,94 +186,90 @@ class client:
         return self.id
     
     def ready_up(self) -> None:
-        with client_lock:
-            self.ready = True
+        self.ready = True
         
     
     def is_ready(self) -> bool:
         return self.ready
 
 
-class server_connection:
+class room:
     '''
-    This class requires:
-        - A socket when opened.
-        - IP
-        - Port
-        - client reference list
-        - client lock for the client list.
-        - game_state object to keep track of the game state as defined in game_track.py.
+    A room hosts a single four player match. Every room owns its own client list, client lock and game_state,
+    so many matches can run in one server process. This class requires:
+        - room ID
     
     Methods:
-        Printing the object itself will display the IP:PORT and active connections.
-        .get_active(), returns active connections
-        .accept_clients(client_handler), starts accepting new clients and have each one run client_handler()
-        .update_clients(data), sends data to all clients.
-        .send_player_list(), sends the player list to all clients.
-        .send_scoreboard(), sends the scoreboard to all clients.
-        .close(), closes the socket of the server, disconnecting all clients.
+        Printing the object itself will display the room ID and active connections.
+        .get_active(), returns the number of clients in this room.
+        .is_open(), returns True if a new client can be routed into this room.
+        .add_client(client), adds a client to this room.
+        .remove_client(client), removes a client from this room.
+        .update_clients(data, kind), frames data once and queues it for all clients in this room.
+        .send_player_list(), sends the player list to all clients in this room.
+        .send_scoreboard(), sends the scoreboard to all clients in this room.
+        .send_changes(), sends the player list and the scoreboard if they changed since they were last sent,
+            and the player list again if nothing was sent for KEEPALIVE_INTERVAL.
+        .send_snapshot(), sends the ball, paddles and score to all clients in this room as one packet,
+            a DELTA against the last tick each client acknowledged or a full SNAPSHOT.
+        .ping_clients(now), sends one PING to all clients in this room, their PONGs update each client's rtt.
+        .join(client), runs the initial handshake and adds the client to the game. Returns False if it failed.
+        .handle_packet(client, data), applies a packet received from a client.
+        .leave(client), closes the client and frees its player slot.
+        .tick(dt), advances the match by dt seconds and broadcasts it. Returns True if the match is running or a paddle is held or moved.
+    '''
 
+    def __init__(self, room_id: int):
+        self.id = room_id
+        self.clients = [] # SHARED RESOURCE - MUST BE UNLOCKED AND LOCKED WHEN USING!
+        self.clients_lock = metrics.timed_lock("clients_lock")
+        self.game_state = gt.Game_State(game_lock = metrics.timed_lock("game_lock"))
+        self.tick_count = 0 # number of the last SNAPSHOT or DELTA sent.
+        self.moved = False # set when a paddle moved since the last SNAPSHOT.
+        self.tick_time = 0.0 # time.monotonic() at the start of the last tick, the server_time of its SNAPSHOT or DELTA.
+        self.ping_seq = 0
+        self.last_ping = 0.0
+        self.history = gt.snapshot_history()
+        self.sent_roster_version = 0 # Game_State.roster_version of the last player list sent.
+        self.sent_score_version = 0 # scoreboard version of the last scoreboard sent.
+        self.last_broadcast = time.monotonic() # when anything was last queued for every client.
+        self.changes_lock = threading.Lock()
 
-    '''
-    def __init__(self, socket, ip, port):
-        self.socket = socket
-        self.recv_size = RECV_SIZE
-        self.ip = ip
-        self.port = port
-        self.clients = clients
-        self.clients_lock = client_lock
-        self.game_state = gt.Game_State()
-        
+    def __str__(self):
+        return f"Room {self.id} with {self.get_active()} active connections."
 
     def get_active(self) -> int:
-        '''Gets a the number of active clients.'''
+        '''Gets the number of active clients in this room.'''
 
-        clients_len = 0
+        with self.clients_lock:
+            return len(self.clients)
 
-        with client_lock:
-            clients_len = len(clients)
-            
-        return clients_len
-    
-    
-    
-    def __str__(self):
-        return f"Listening at: {self.ip}:{self.port}, with {self.get_active()} active connections."
-    
-    
-    def accept_clients(self, client_handler ) -> None:
-        ''' .accept_clients() must recieve a handler which contains a server_connection object and a client object.'''
-        while True:
-            if not self.socket:
-                raise ConnectionError("Socket is not initialized.")
-            
-            try: 
-                self.socket.settimeout(SOCKET_TIMEOUT)
-                client_c, client_addr = self.socket.accept()
-            except socket.timeout:
-                continue
-            except socket.error as e:
-                print(f"Socket Accept Error: {e}")
-                raise ConnectionError(f"Failed to accept: {self.ip}:{self.port}.")
-            client_id = uuid.uuid4()
-            c = client(client_id,client_c, client_addr[0], client_addr[1])
-            with client_lock:
-                self.clients.append(c)
-            
-            print(f"New Client: {c}")
-            t = threading.Thread(target=client_handler, args=(c, self, ), daemon=True)
-            t.start()
-            print(f"There is now {self.get_active()} active connections.")
- 
-    
-    def update_clients(self, data=None) -> None:
-        '''.update_clients(data) will send data to all clients.'''
+    def is_open(self) -> bool:
+        '''A room is open when it has a free player slot and its match has not ended.'''
+
+        return self.get_active() < gt.MAX_PLAYERS and not self.game_state.is_ended()
+
+    def add_client(self, new_client: client) -> None:
+        with self.clients_lock:
+            self.clients.append(new_client)
+            new_client.room = self
+
+    def remove_client(self, old_client: client) -> None:
+        with self.clients_lock:
+            if old_client in self.clients:
+                self.clients.remove(old_client)
+
+    def update_clients(self, data=None, kind=None) -> None:
+        '''.update_clients(data) will frame data once and queue it for all clients in this room. Clients that have fallen behind are closed.'''
         if not data:
             raise ValueError(f"No data to send to clients.")
         if not self.clients:
             raise Exception ("No clients connected to send data to.")
         
 
+        frame = framing.frame(data)
+        self.last_broadcast = time.monotonic()
+
         with self.clients_lock:
             list_copy = list(self.clients) 
 
@@ -185,50 +277,582 @@ class server_connection:
 
             if aClient.is_ready():
                 try:
-                    aClient.send(data)
+                    aClient.send_frame(frame, kind)
                 except socket.error as e:
                     print(f"Error sending data to client {aClient.id}: {e}")
                     aClient.close()
 
     def send_player_list(self)-> None:
         ''' sends the player list to all clients. '''
-        player_list = self.game_state.get_player_list()
-        data = packet.serialize({
-            "p1": player_list["p1"].id or "",
-            "p2": player_list["p2"].id or "",
-            "p3": player_list["p3"].id or "",
-            "p4": player_list["p4"].id or ""
-        }, packet.Status.PLAYER_LIST)
+        p1, p2, p3, p4 = self.game_state.get_player_list()
+        data = packet.encode(packet.Status.PLAYER_LIST, *((p or "").encode() for p in (p1, p2, p3, p4)))
 
         try: 
-            self.update_clients(data)
+            self.update_clients(data, sq.PLAYER_LIST)
         except Exception as e:
             print(f"Error sending player list: {e}")
             return
         
-    def send_scoreboard(self) -> None:
+    def scoreboard_packet(self) -> bytes:
         '''
-        Sends the scoreboard to all clients.
+        Returns the scoreboard as a SCOREBOARD packet.
         '''
 
         curr_scoreboard = self.game_state.get_scoreboard()
 
         if not curr_scoreboard:
             raise ValueError("GAME_STATE ERROR: No scoreboard to send.")
-        
 
-        data = packet.serialize({
-            "upper_score": curr_scoreboard["upper_score"],
-            "lower_score": curr_scoreboard["lower_score"]
-        }, packet.Status.SCOREBOARD)
+        return packet.encode(packet.Status.SCOREBOARD, curr_scoreboard["upper_score"], curr_scoreboard["lower_score"])
+
+    def send_scoreboard(self) -> None:
+        '''
+        Sends the scoreboard to all clients.
+        '''
 
         try:
-            self.update_clients(data)
+            self.update_clients(self.scoreboard_packet(), sq.SCOREBOARD)
            
         except Exception as e:
             print(f"Error sending scoreboard: {e}")
             return
+
+    def send_changes(self) -> None:
+        '''
+        Sends the player list and the scoreboard to all clients, each only if its version in the game state changed
+        since it was last sent. Safe to call as often as needed, nothing is sent when nothing changed, except the
+        player list once every KEEPALIVE_INTERVAL when the room sent nothing else.
+        '''
+
+        # the lock keeps two threads from sending the same change, or an older list after a newer one.
+        with self.changes_lock:
+            state = self.game_state.snapshot
+            roster_changed = state.roster_version != self.sent_roster_version
+            score_changed = state.score_version != self.sent_score_version
+            self.sent_roster_version = state.roster_version
+            self.sent_score_version = state.score_version
+
+            if self.get_active() == 0:
+                # nobody to tell, a client that joins later gets both in join().
+                return
+
+            # a waiting lobby has nothing to send, and its clients would time out without hearing from the server.
+            if time.monotonic() - self.last_broadcast >= KEEPALIVE_INTERVAL:
+                roster_changed = True
+
+            if roster_changed:
+                self.send_player_list()
+
+            if score_changed:
+                self.send_scoreboard()
+
+    def send_snapshot(self) -> None:
+        '''
+        Sends the ball, every paddle and the score to all clients in this room. Each client gets a DELTA with only
+        the fields that changed since the last tick it acknowledged, or a full SNAPSHOT when that tick is no longer
+        in the history or on every KEYFRAME_INTERVAL tick. Nothing is sent if the world did not change.
+        Sends the world of the last published snapshot, so it does not take game_lock. Only called by tick().
+        '''
+
+        world = self.game_state.snapshot.world
+
+        if world == self.history.latest():
+            return
+
+        self.tick_count += 1
+        tick = self.tick_count
+        server_time = self.tick_time
+        self.history.add(tick, world)
+
+        keyframe = tick % KEYFRAME_INTERVAL == 0
+        full = None
+        deltas = {} # clients that acknowledged the same tick share the same framed delta.
+        self.last_broadcast = time.monotonic()
+
+        with self.clients_lock:
+            list_copy = list(self.clients)
+
+        for aClient in list_copy:
+            if not aClient.is_ready():
+                continue
+
+            base = aClient.acked_tick
+            base_world = None if keyframe else self.history.get(base)
+
+            if base_world is None:
+                if full is None:
+                    full = framing.frame(packet.encode(packet.Status.SNAPSHOT, tick, server_time, *world))
+                frame = full
+            else:
+                frame = deltas.get(base)
+                if frame is None:
+                    frame = deltas[base] = framing.frame(packet.encode_delta(tick, server_time, base, base_world, world))
+
+            try:
+                aClient.send_frame(frame, sq.WORLD)
+            except socket.error as e:
+                print(f"Error sending data to client {aClient.id}: {e}")
+                aClient.close()
+
+    def ping_clients(self, now: float) -> None:
+        '''
+        Sends a PING stamped with now to all clients in this room. The PING waits in each client's send queue like
+        every other packet, so the round trip includes the time the client's writer fell behind.
+        '''
+        self.ping_seq += 1
+        self.last_ping = now
+        frame = framing.frame(packet.encode(packet.Status.PING, self.ping_seq, now))
+
+        with self.clients_lock:
+            list_copy = list(self.clients)
+
+        for aClient in list_copy:
+            if not aClient.is_ready():
+                continue
+
+            try:
+                aClient.send_frame(frame)
+            except socket.error as e:
+                print(f"Error sending data to client {aClient.id}: {e}")
+                aClient.close()
+
+    def join(self, new_client: client) -> bool:
+        '''
+        Runs the initial handshake for a client routed into this room: sends its UUID, adds it to the game state,
+        sends its player slot and the player list. Returns False and closes the client if it could not join.
+        '''
+
+        #send UUID at initial connection between client and server.
+        print(f"Sending UUID: {new_client.id}")
+        try:
+            new_client.send(str(new_client.id).encode())
+        except Exception as e:
+            print(f"Error sending UUID to client: {e}")
+            new_client.close()
+            return False
+        
+        #add new player to the game state and send the new player slot to all clients.
+
+        try:
+            player_slot = self.game_state.add_player(str(new_client.id))
+        except ValueError as e:
+            print(f"Error adding player: {e}")
+            new_client.close()
+            return False
+
+        if player_slot is None:
+            print(f"Failed to add player {str(new_client.id)} to game state.")
+            new_client.close()
+            return False
+        
+        print(f"Player {str(new_client.id)} added to slot {player_slot} in room {self.id}.")
+
+        new_client.slot = player_slot
+        new_send = packet.encode(packet.Status.PLAYER_NEW_SLOT, new_client.id_bytes, new_client.slot)
+
+        try:
+            new_client.send(new_send)
+            print(f"Sent new player slot to all clients: {new_client.id} in slot {player_slot}.")
+        except Exception as e:
+            print(f"Error Sending New player: {e}")
+
+        #Ready up the client and send the player list.
+        new_client.ready_up()
+
+        if self.game_state.is_ended():
+            # If this is the first client and the game has ended, reset the game state.
+            self.game_state.reset_game()
+            self.game_state.unpause()
+            print("Game state reset for a new player.")
+
+        # the new player changed the roster, so everyone gets the player list. Only the new client needs the score.
+        self.send_changes()
+
+        try:
+            new_client.send(self.scoreboard_packet(), sq.SCOREBOARD)
+        except Exception as e:
+            print(f"Error sending scoreboard to new player: {e}")
+
+        return True
+
+    def handle_packet(self, sender: client, data: bytes) -> None:
+        '''
+        Applies one packet received from a client to the game state. Paddle moves are not sent back right away,
+        they are part of the next SNAPSHOT along with the seq of the last move applied.
+        '''
+
+        record = packet.decode(data)
         
+        #testing whether the packet was unloaded correctly
+        #print(f"Unloaded Data: {record}")
+
+        status = record.status
+        to_send = None
+
+        # Handle the different packet statuses
+            
+        match status:
+            case packet.Status.MOVE:
+                # the slot is taken from the connection, a client can only move its own player.
+                with self.game_state.game_lock:
+                    player = self.game_state.player(sender.slot)
+                    if player.apply_input(record.seq, record.x, record.y):
+                        self.moved = True
+
+            case packet.Status.INPUT:
+                # the paddle is moved every tick, the seq is sent back in the next SNAPSHOT.
+                with self.game_state.game_lock:
+                    player = self.game_state.player(sender.slot)
+                    if player.apply_command(record.seq, record.direction):
+                        self.moved = True
+            
+            case packet.Status.ACK:
+                if record.tick > sender.acked_tick:
+                    sender.acked_tick = record.tick
+
+            case packet.Status.PING:
+                # answered right away, the client measures its round trip and our clock offset with it.
+                sender.send(packet.encode(packet.Status.PONG, record.seq, record.time, time.monotonic()))
+
+            case packet.Status.PONG:
+                sender.rtt.sample(record.echo, time.monotonic())
+
+            case packet.Status.PAUSE:
+                self.game_state.pause()
+                to_send = packet.encode(packet.Status.PAUSE)
+
+        # now send the updated data to all clients.
+        if to_send:
+            try:
+                self.update_clients(to_send)
+            except Exception as e:
+                print(f"Error updating clients: {e}")
+
+    def leave(self, old_client: client) -> None:
+        '''
+        Closes a client, frees its player slot and tells the remaining clients.
+        '''
+
+        old_client.close()
+        self.game_state.remove_player(str(old_client.id))
+        # the next tick resets the score if the match can no longer go on, and sends it then.
+        self.send_changes()
+        print(f"Room {self.id} now has {self.get_active()} active connections.")
+
+    def tick(self, dt: float = gt.DEFAULT_DT) -> bool:
+        '''
+        Runs one update of this room's match: pauses or unpauses depending on the number of players,
+        moves the ball and sends one SNAPSHOT, and ends the game when a side reaches TARGET_SCORE.
+        The game state is changed under one hold of game_lock and published once, everything after that reads the snapshot.
+        Returns True if the match is running or a paddle is held in a direction or moved since the last tick, and wants
+        to be ticked again at the tick rate.
+        '''
+        game_state = self.game_state
+        active_players = self.get_active()
+        ended = False
+        self.tick_time = now = time.monotonic()
+
+        if now - self.last_ping >= timing.PING_INTERVAL and active_players > 0:
+            self.ping_clients(now)
+
+        with game_state.game_lock:
+            # Less than 4 players - pause game and reset scoreboard
+            if active_players < gt.MAX_PLAYERS and active_players > 0:
+                if not game_state.ended:
+                    # Reset scoreboard if not 0-0
+                    if (game_state.scoreboard["upper_score"] != 0 or 
+                        game_state.scoreboard["lower_score"] != 0):
+                        print(f"Room {self.id}: resetting scoreboard due to insufficient players ({active_players}/4)")
+                        game_state.scoreboard["upper_score"] = 0
+                        game_state.scoreboard["lower_score"] = 0
+                        game_state.ball.reset()
+                    # Pause the game (but don't mark as ended)     
+                    game_state.paused = True
+
+            # All 4 player present unpause if currently paused (but not ended)            
+            elif active_players == gt.MAX_PLAYERS:
+                if game_state.paused and not game_state.ended:
+                    game_state.paused = False
+
+            # No players pause but don't reset scoreboard yet
+            elif active_players == 0:
+                game_state.paused = True
+
+            paused = game_state.paused
+            # the ball is not moving while paused, but paddles still are while players wait.
+            held = game_state.move_paddles(dt)
+
+            if not paused:
+                curr_scoreboard = game_state.ball.scoreboard_ref
+
+                if not curr_scoreboard:
+                    raise ValueError("Scoreboard not found in game state.")
+
+                before = (curr_scoreboard["upper_score"], curr_scoreboard["lower_score"])
+                game_state.ball.update(players = game_state.players, dt = dt)
+                upper_score = curr_scoreboard["upper_score"]
+                lower_score = curr_scoreboard["lower_score"]
+
+                if lower_score == TARGET_SCORE or upper_score == TARGET_SCORE:
+                    game_state.ended = True
+                    game_state.paused = True
+                    ended = True
+                    # the ball's side is reset after every goal, so the winner is the side with the higher score.
+                    winner = gt.Side.UPPER if upper_score > lower_score else gt.Side.LOWER
+
+            # moves that arrive after this are sent by the next tick.
+            moved = self.moved
+            self.moved = False
+            game_state.publish()
+
+        if paused:
+            moved = (moved or held) and active_players > 0
+            if moved:
+                self.send_snapshot()
+            # the score may have been reset above.
+            self.send_changes()
+            # keep ticking at the tick rate while a paddle is held or moved by MOVE packets, so the other players in
+            # the lobby see it move at the tick rate instead of once per IDLE_TIME.
+            return moved
+
+        self.send_snapshot()
+
+        if (upper_score, lower_score) != before:
+            print(f"Room {self.id}: score is now {upper_score} upper, {lower_score} lower.")
+            self.send_changes()
+                
+        if ended:
+            print(f"Room {self.id}: game has ended.")
+            to_end = packet.encode(packet.Status.END, winner.value.encode())
+            try:
+                self.update_clients(to_end)
+            except Exception as e:
+                print(f"Error sending END packet: {e}")
+
+        return not game_state.is_paused()
+
+
+class server_connection:
+    '''
+    This class requires:
+        - A socket when opened.
+        - IP
+        - Port
+        - max_rooms, the number of rooms this server will host at once.
+        - tick_rate and tick_policy for the scheduler, a tick_scheduler object that paces tick_rooms().
+        - idle_timeout, seconds a client can send nothing before it is disconnected and its slot freed, 0 never.
+        - rooms, a dict of room objects keyed by room ID, and rooms_lock for it.
+    
+    Methods:
+        Printing the object itself will display the IP:PORT, rooms and active connections.
+        .get_active(), returns active connections across all rooms
+        .get_rooms(), returns a list copy of the hosted rooms
+        .assign_room(client), routes a client into an open room, creating a new room when all are full
+        .prune_rooms(), removes rooms with no clients left
+        .tick_rooms(), ticks every room once, returns True if any room is running a match
+        .get_load(), returns the rooms, clients, open seats, time spent ticking and the deepest send queue
+        .get_queue_depths(), returns the number of frames waiting to be sent to each client, keyed by client ID
+        .collect_metrics(), returns the metrics read from the rooms and clients when the metrics are reported
+        .start_metrics(port, interval), serves the metrics on port if it is not 0 and logs them every interval seconds
+        .accept_clients(client_handler), starts accepting new clients and have each one run client_handler()
+        .close(), closes the socket of the server, disconnecting all clients.
+
+
+    '''
+    def __init__(self, socket, ip, port, max_rooms=MAX_ROOMS, tick_rate=TICK_RATE, tick_policy=ts.CATCH_UP, idle_timeout=IDLE_TIMEOUT):
+        self.socket = socket
+        self.recv_size = RECV_SIZE
+        self.ip = ip
+        self.port = port
+        self.max_rooms = max_rooms
+        self.rooms: dict[int, room] = {} # SHARED RESOURCE - MUST BE UNLOCKED AND LOCKED WHEN USING!
+        self.rooms_lock = threading.Lock()
+        self.next_room_id = 1
+        self.tick_seconds = 0.0 # total time spent in tick_rooms(), used to report load.
+        self.scheduler = ts.tick_scheduler(tick_rate, tick_policy)
+        self.idle_timeout = idle_timeout
+        
+
+    def get_active(self) -> int:
+        '''Gets a the number of active clients across every room.'''
+
+        return sum(r.get_active() for r in self.get_rooms())
+    
+    def get_rooms(self) -> list:
+        '''Returns a copy of the list of rooms so it can be iterated without holding rooms_lock.'''
+
+        with self.rooms_lock:
+            return list(self.rooms.values())
+    
+    def __str__(self):
+        return f"Listening at: {self.ip}:{self.port}, with {len(self.rooms)} rooms and {self.get_active()} active connections."
+    
+    def assign_room(self, new_client: client) -> room:
+        '''
+        Routes a client into the first open room, or opens a new room if every room is full.
+        Raises ConnectionError if the server already hosts max_rooms rooms.
+        '''
+
+        with self.rooms_lock:
+            for r in self.rooms.values():
+                if r.is_open():
+                    r.add_client(new_client)
+                    return r
+
+            if len(self.rooms) >= self.max_rooms:
+                raise ConnectionError(f"Maximum number of rooms {self.max_rooms} reached.")
+
+            r = room(self.next_room_id)
+            self.next_room_id += 1
+            self.rooms[r.id] = r
+            r.add_client(new_client)
+            print(f"Opened room {r.id}.")
+            return r
+
+    def prune_rooms(self) -> None:
+        '''Removes every room that has no clients left.'''
+
+        with self.rooms_lock:
+            for room_id, r in list(self.rooms.items()):
+                if r.get_active() == 0:
+                    del self.rooms[room_id]
+                    print(f"Closed room {room_id}.")
+    
+    def tick_rooms(self) -> bool:
+        '''
+        Ticks every room once by the scheduler's dt and prunes the empty ones. Returns True if any room is running a match.
+        '''
+        start = time.perf_counter()
+        running = False
+
+        for r in self.get_rooms():
+            try:
+                if r.tick(self.scheduler.dt):
+                    running = True
+            except Exception as e:
+                print(f"Room {r.id} Exception: {e}")
+
+        self.prune_rooms()
+        seconds = time.perf_counter() - start
+        self.tick_seconds += seconds
+        metrics.TICK_SECONDS.observe(seconds)
+        return running
+
+    def get_load(self) -> dict:
+        '''
+        Returns the load of this server: rooms, clients, free seats in open rooms and the total seconds spent ticking.
+        '''
+        rooms = self.get_rooms()
+        open_seats = 0
+        clients = 0
+
+        for r in rooms:
+            active = r.get_active()
+            clients += active
+            if r.is_open():
+                open_seats += gt.MAX_PLAYERS - active
+
+        return {
+            "rooms": len(rooms),
+            "clients": clients,
+            "open_seats": open_seats,
+            "tick_seconds": self.tick_seconds,
+            "max_queue_depth": max(self.get_queue_depths().values(), default=0)
+        }
+
+    def get_queue_depths(self) -> dict:
+        depths = {}
+
+        for r in self.get_rooms():
+            with r.clients_lock:
+                for c in r.clients:
+                    depths[str(c.id)] = c.queue_depth()
+
+        return depths
+
+    def collect_metrics(self) -> list:
+        '''
+        Returns the metrics that are read from the rooms and clients instead of recorded, in the format of a
+        metrics.registry collector. Per client series are labelled with the client ID and its room.
+        '''
+        rooms = self.get_rooms()
+        clients = []
+
+        for r in rooms:
+            with r.clients_lock:
+                clients.extend((r.id, c) for c in r.clients)
+
+        def per_client(attribute):
+            return [({"room": room_id, "client": c.id}, getattr(c, attribute)) for room_id, c in clients]
+
+        return [
+            ("pong_tick_overruns_total", metrics.COUNTER, "Ticks that were late by at least a whole period.", [({}, self.scheduler.overruns)]),
+            ("pong_rooms", metrics.GAUGE, "Rooms hosted.", [({}, len(rooms))]),
+            ("pong_clients", metrics.GAUGE, "Clients connected.", [({}, len(clients))]),
+            ("pong_send_queue_depth", metrics.GAUGE, "Frames waiting to be sent to the client.",
+             [({"room": room_id, "client": c.id}, c.queue_depth()) for room_id, c in clients]),
+            ("pong_client_received_bytes_total", metrics.COUNTER, "Bytes received from the client.", per_client("bytes_in")),
+            ("pong_client_received_packets_total", metrics.COUNTER, "Packets received from the client.", per_client("packets_in")),
+            ("pong_client_sent_bytes_total", metrics.COUNTER, "Bytes sent to the client.", per_client("bytes_out")),
+            ("pong_client_sent_packets_total", metrics.COUNTER, "Packets sent to the client.", per_client("packets_out")),
+            ("pong_client_rtt_seconds", metrics.GAUGE, "Smoothed round trip time to the client.",
+             [({"room": room_id, "client": c.id}, c.rtt.srtt) for room_id, c in clients if c.rtt.srtt is not None]),
+            ("pong_client_rtt_jitter_seconds", metrics.GAUGE, "Smoothed deviation of the round trip time to the client.",
+             [({"room": room_id, "client": c.id}, c.rtt.jitter) for room_id, c in clients if c.rtt.srtt is not None]),
+        ]
+
+    def start_metrics(self, port: int = 0, interval: float = metrics.METRICS_INTERVAL) -> None:
+        '''
+        Adds this server's metrics to metrics.REGISTRY, serves them on 127.0.0.1:port unless port is 0 and prints
+        a metrics line every interval seconds unless interval is 0.
+        '''
+        metrics.REGISTRY.add_collector(self.collect_metrics)
+
+        if port:
+            try:
+                metrics.serve_http(port)
+            except OSError as e:
+                print(f"Could not serve metrics on port {port}: {e}")
+
+        if interval:
+            def summary() -> dict:
+                load = self.get_load()
+                load["overruns"] = self.scheduler.overruns
+                return load
+
+            metrics.metrics_logger(summary, interval).start()
+    
+    def accept_clients(self, client_handler ) -> None:
+        ''' .accept_clients() must recieve a handler which contains a client object and the room object it was routed into.'''
+        while True:
+            if not self.socket:
+                raise ConnectionError("Socket is not initialized.")
+            
+            try: 
+                self.socket.settimeout(SOCKET_TIMEOUT)
+                client_c, client_addr = self.socket.accept()
+            except socket.timeout:
+                continue
+            except socket.error as e:
+                print(f"Socket Accept Error: {e}")
+                raise ConnectionError(f"Failed to accept: {self.ip}:{self.port}.")
+            client_id = uuid.uuid4()
+            # the timeout also applies to the writer thread, a client that has not read for idle_timeout is just as dead.
+            client_c.settimeout(self.idle_timeout or None)
+            c = client(client_id,client_c, client_addr[0], client_addr[1], self.idle_timeout)
+
+            try:
+                r = self.assign_room(c)
+            except ConnectionError as e:
+                print(f"Rejected Client {c}: {e}")
+                client_c.close()
+                continue
+            
+            print(f"New Client: {c} in room {r.id}")
+            c.start_writer()
+            t = threading.Thread(target=client_handler, args=(c, r, ), daemon=True)
+            t.start()
+            print(f"There is now {self.get_active()} active connections.")
 
     def close(self):
         self.socket.close()
@@ -256,6 +880,10 @@ def init_host() -> server_connection:
     config = load_config()
     ip = config["host_ip"]
     port = config["host_port"]
+    max_rooms = config.get("max_rooms", MAX_ROOMS)
+    tick_rate = config.get("tick_rate", TICK_RATE)
+    tick_policy = config.get("tick_policy", ts.CATCH_UP)
+    idle_timeout = config.get("idle_timeout", IDLE_TIMEOUT)
 
     s = None
 
@@ -275,6 +903,6 @@ def init_host() -> server_connection:
             s.close()
         raise ConnectionError(f"Failed to host on {ip}:{port}.")
     
-    connection = server_connection(s, ip, port)
+    connection = server_connection(s, ip, port, max_rooms, tick_rate, tick_policy, idle_timeout)
     return connection
 
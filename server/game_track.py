@@ -1,9 +1,31 @@
+from collections import namedtuple
 from enum import Enum
+import math
 import threading
 from typing import Optional
 import random
 
 MAX_PLAYERS = 4
+HISTORY_SIZE = 32 # ticks. Clients acknowledge every few ticks (connect.ACK_INTERVAL), their base has to still be here.
+DEFAULT_DT = 0.03 # seconds per tick the ball speed was tuned for.
+BALL_SPEED = 5 / DEFAULT_DT # pixels per second on each axis.
+WIDTH, HEIGHT = 900, 600
+PADDLE_WIDTH = 10 # the short side of every paddle.
+PADDLE_LENGTH = 100 # the long side of every paddle.
+PADDLE_SPEED = 300 # pixels per second, the client strikers move 10 pixels per frame at 30 FPS.
+
+SLOTS = (1, 2, 3, 4) # player slots, the same numbers as the slot byte of the packets.
+
+# top left corner of each slot's paddle at the start of a match, the same as the client strikers.
+HOME_POSITIONS = {
+    1: (20.0, (HEIGHT - PADDLE_LENGTH) / 2),
+    2: (WIDTH - 30.0, (HEIGHT - PADDLE_LENGTH) / 2),
+    3: ((WIDTH - PADDLE_LENGTH) / 2, 20.0),
+    4: ((WIDTH - PADDLE_LENGTH) / 2, HEIGHT - 30.0),
+}
+
+MAX_BOUNCES = 8 # walls and paddles the ball can bounce off in one tick.
+X_AXIS, Y_AXIS = 0, 1
 
 class Side(Enum):
     '''
@@ -23,21 +45,116 @@ class Position(Enum):
     BOTTOM = 'B'
 
 
+# the axis each paddle sends the ball back on, and the direction along it the ball moves when heading for the goal behind the paddle.
+PADDLE_AXES = {
+    Position.LEFT: (X_AXIS, -1),
+    Position.RIGHT: (X_AXIS, 1),
+    Position.TOP: (Y_AXIS, -1),
+    Position.BOTTOM: (Y_AXIS, 1),
+}
+
+def _slab(p: float, d: float, low: float, high: float):
+    '''
+    Returns the fractions (enter, exit) of a move from p by d during which it is between low and high, along one axis.
+    Returns None if a move along the axis never is.
+    '''
+    if d == 0:
+        if low <= p <= high:
+            return -math.inf, math.inf
+        return None
+
+    t1 = (low - p) / d
+    t2 = (high - p) / d
+    return (t1, t2) if t1 < t2 else (t2, t1)
+
+
+class scoreboard(dict):
+    '''
+    The score of the upper and lower sides. A dict, so the ball and everything else keep reading and writing
+    scoreboard["upper_score"] as before, that also counts its changes. It contains:
+        - version: increases every time a score is set to a different value
+
+    The room compares the version with the last one it sent, so SCOREBOARD packets are only sent when the score changed.
+    '''
+
+    def __init__(self, upper_score: int = 0, lower_score: int = 0):
+        super().__init__(upper_score=upper_score, lower_score=lower_score)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        if self.get(key) != value:
+            super().__setitem__(key, value)
+            self.version += 1
+
+
+class snapshot_history:
+    '''
+    Keeps the worlds (see Game_State.world()) of the last HISTORY_SIZE ticks sent, so a tick a client acknowledged
+    can be used as the base of a delta. It contains:
+        - size: the number of ticks kept
+        - ticks, worlds: ring buffers indexed by tick % size
+        - latest_tick: the last tick added
+
+    Methods:
+        - add(tick, world) stores the world sent on a tick.
+        - get(tick) returns the world of a tick, or None if it is no longer kept.
+        - latest() returns the last world added, or None.
+    '''
+
+    def __init__(self, size: int = HISTORY_SIZE):
+        self.size = size
+        self.ticks = [0] * size
+        self.worlds: list[Optional[tuple]] = [None] * size
+        self.latest_tick = 0
+
+    def add(self, tick: int, world: tuple) -> None:
+        self.ticks[tick % self.size] = tick
+        self.worlds[tick % self.size] = world
+        self.latest_tick = tick
+
+    def get(self, tick: int) -> Optional[tuple]:
+        if tick <= 0 or self.ticks[tick % self.size] != tick:
+            return None
+        return self.worlds[tick % self.size]
+
+    def latest(self) -> Optional[tuple]:
+        return self.get(self.latest_tick)
+
+
+class state_snapshot(namedtuple("state_snapshot", ("version", "world", "paused", "ended", "roster", "roster_version",
+                                                  "upper_score", "lower_score", "score_version"))):
+    '''
+    An immutable copy of a Game_State, published by Game_State.publish(). Readers use the latest one without
+    taking game_lock, and it never changes under them. It contains:
+        - version: increases with every publish
+        - world: the world() tuple at the time of the publish
+        - paused, ended: the state of the match
+        - roster: the player ID in slots 1 to 4, None for an empty slot
+        - roster_version: Game_State.roster_version
+        - upper_score, lower_score and score_version: the scoreboard and its version
+    '''
+    __slots__ = ()
+
 
 class Game_State:
     '''
     The Game State object contains the following:
         - ball: Ball object
-        - players: dict of Player objects with keys as player IDs
-        - game_lock: threading lock for game state
+        - players: list of the Player in each slot, slot 1 first. Empty slots have a Player with no ID.
+        - slot_of: dict of player ID to slot, for the players in the game
+        - game_lock: lock for game state, a threading.Lock unless the caller passes another lock, such as a timed one
         - paused: boolean indicating if the game is paused
         - ended: boolean to see if the game has ended
-        - scoreboard: dict that contains the current score of upper and lower sides
+        - scoreboard: scoreboard dict that contains the current score of upper and lower sides
+        - roster_version: increases every time a player joins or leaves
+        - snapshot: the last state_snapshot published, read it without the lock
     Methods:
         - add_player() to add a player to the game state
         - remove_player() to remove a player from the game state
-        - get_player_list() to get a list of players with empty slots too
-        - get_scoreboard() to get the current scoreboard
+        - player(slot) to get the Player in a slot
+        - find_player(id) to get the Player with an ID, or None
+        - get_player_list() to get the player ID of every slot, None for empty slots
+        - get_scoreboard() to get a copy of the current scoreboard
         - update_scoreboard() to update the scoreboard
         - pause() to pause the game
         - unpause() to unpause the game
@@ -45,6 +162,13 @@ class Game_State:
         - is_paused() to check if the game is paused
         - is_ended() to check if the game has ended
         - reset_game() to reset the game state
+        - world() to get the ball, paddles and score as one tuple
+        - move_paddles(dt) to move the paddles held in a direction by INPUT packets
+        - publish() to replace snapshot with the current state
+
+    Everything that changes the game takes game_lock and publishes a new snapshot before releasing it, except
+    paddle inputs, which are published by the next tick. is_paused(), is_ended(), get_player_list() and
+    get_scoreboard() read the snapshot, so they never wait for the lock.
     '''
     class Ball:
         '''
@@ -58,21 +182,27 @@ class Game_State:
             - paddle_width: width of the paddle
             - paddle_height: height of the paddle
             - scoreboard_ref: reference to the scoreboard
-            - last_touched_player: the player who last touched the ball
+            - last_touched_player: the slot of the player who last touched the ball
+            - speed: pixels per second the ball moves on each axis
 
         Methods:
             - printing the object will return the position and side.
             - update(x, y, side): updates the ball position and side.
             - reset(): resets the ball to the center with a random direction.
             - score(side, x, y): updates the scoreboard based on the side and position of the ball.
-            - update(players): updates the ball position and checks for collisions.
-            - hitWall(): checks if the ball hits a wall
-            - hitPlayer(players): checks if the ball has hit any player's paddle
+            - update(players, dt): moves the ball by dt seconds, bouncing off walls and paddles on the way.
+            - wallImpact(dx, dy): returns when a move reaches an edge
+            - hitWall(): scores or bounces the ball if it is on an edge
+            - paddleBox(player): returns the edges of a player's paddle
+            - hitPlayer(players, dx, dy, skip): returns the first paddle a move hits and when
             - get_side(): returns the side of the ball
-            
+
+        Balls and players use __slots__, a room keeps no per-instance dicts for them.
         '''
+        __slots__ = ("x", "y", "xFac", "yFac", "side", "WIDTH", "HEIGHT", "paddle_width", "paddle_height",
+                     "scoreboard_ref", "last_touched_player", "speed")
 
-        def __init__ (self, x = 450, y = 300, xFac = 1, yFac = 1, WIDTH = 900, HEIGHT = 600, paddle_width = 10, paddle_height = 100, scoreboard_ref = None):
+        def __init__ (self, x = WIDTH / 2, y = HEIGHT / 2, xFac = 1, yFac = 1, WIDTH = WIDTH, HEIGHT = HEIGHT, paddle_width = PADDLE_WIDTH, paddle_height = PADDLE_LENGTH, scoreboard_ref = None):
             self.x = x
             self.y = y
             self.xFac = xFac
@@ -84,6 +214,7 @@ class Game_State:
             self.paddle_height = paddle_height
             self.scoreboard_ref = scoreboard_ref
             self.last_touched_player = None
+            self.speed = BALL_SPEED
 
         def __str__(self):
             return f"Ball at position ({self.x}, {self.y}, {self.side})"
@@ -101,9 +232,9 @@ class Game_State:
             self.yFac = random.choice([-1, 1])
 
         def score(self, side: Side, x: float, y: float):
-
-            #print(f"Scoring for side: {side}")
-
+            '''
+            Gives a point to a side. It does not print, rooms log the score changes of their match.
+            '''
             curr_scoreboard = self.scoreboard_ref
             
             if curr_scoreboard is None:
@@ -113,7 +244,7 @@ class Game_State:
             hit_bottom = y >= self.HEIGHT
             hit_left = x <= 0
             hit_right = x >= self.WIDTH
-            print(side)
+
             if side == Side.UPPER:
                 if hit_top or hit_left:
                     # own goal upper hits top or left side
@@ -128,23 +259,91 @@ class Game_State:
                     
                 else:
                     curr_scoreboard["lower_score"] += 1
-            
-            print(f"Scoreboard updated: {curr_scoreboard}")
-            
         
-        def update(self, players = None):
+        def update(self, players = None, dt: float = DEFAULT_DT):
+            '''
+            Moves the ball by dt seconds along its path. Walls and paddles on the path are hit at their exact
+            time of impact and the ball reflects there for the rest of the tick, so it cannot pass through them
+            however fast it moves or however long the tick is.
+            '''
+            if self.y < 0 or self.y > self.HEIGHT or self.x < 0 or self.x > self.WIDTH:
+                # already outside the game area, nothing to sweep against.
+                self.hitWall()
+                return
+
+            step = self.speed * dt
+            remaining = 1.0 # fraction of the tick left to move.
+            last_paddle = None
+
+            for _ in range(MAX_BOUNCES):
+                dx = self.xFac * step * remaining
+                dy = self.yFac * step * remaining
+
+                t_wall, wall_x, wall_y = self.wallImpact(dx, dy)
+                impact = self.hitPlayer(players, dx, dy, last_paddle) if players else None
+
+                if impact is not None and impact[0] <= t_wall:
+                    t, axis, player = impact
+                    self.x += dx * t
+                    self.y += dy * t
+
+                    if axis == X_AXIS:
+                        self.xFac *= -1
+                    else:
+                        self.yFac *= -1
+
+                    self.side = player.side
+                    self.last_touched_player = player.slot
+                    last_paddle = player.slot
+                    remaining *= 1 - t
+                    continue
+
+                if t_wall > 1:
+                    self.x += dx
+                    self.y += dy
+                    return
+
+                # stop exactly on the edge, score() decides by which edge was hit.
+                self.x = (0.0 if dx < 0 else self.WIDTH) if wall_x else self.x + dx * t_wall
+                self.y = (0.0 if dy < 0 else self.HEIGHT) if wall_y else self.y + dy * t_wall
+
+                if self.side in [Side.UPPER, Side.LOWER]:
+                    self.score(self.side, self.x, self.y)
+                    self.reset()
+                    return
+
+                if wall_x:
+                    self.xFac *= -1
+                if wall_y:
+                    self.yFac *= -1
+
+                last_paddle = None
+                remaining *= 1 - t_wall
+
+        def wallImpact(self, dx: float, dy: float) -> tuple:
             '''
-            Updates the ball position and side.
+            Returns the fraction of the move (dx, dy) after which the ball reaches an edge, inf if it does not,
+            and whether that is a left or right edge and whether it is a top or bottom edge. Both are True in a corner.
             '''
-            self.x += self.xFac * 5
-            self.y += self.yFac * 5
-            self.hitWall()
-            if players:
-                self.hitPlayer(players)
-             
+            t_x = t_y = math.inf
+
+            if dx < 0:
+                t_x = -self.x / dx
+            elif dx > 0:
+                t_x = (self.WIDTH - self.x) / dx
+
+            if dy < 0:
+                t_y = -self.y / dy
+            elif dy > 0:
+                t_y = (self.HEIGHT - self.y) / dy
+
+            t = min(t_x, t_y)
+            return t, t != math.inf and t_x == t, t != math.inf and t_y == t
+
         def hitWall(self):
             '''
-            Checks if the ball hits any edge and resets the ball if it does and gives a point to a side.
+            Checks if the ball is on or past any edge. If a side has touched the ball it gives a point and resets the
+            ball, otherwise the ball bounces back. update() uses it for a ball that is already outside the game area.
             '''
 
             if self.y <= 0 or self.y >= self.HEIGHT or self.x <= 0 or self.x >= self.WIDTH:
@@ -156,57 +355,71 @@ class Game_State:
                         self.yFac *= -1
                     if self.x <= 0 or self.x >= self.WIDTH:
                         self.xFac *= -1
-        
-        def hitPlayer(self, players: dict):
+
+        def paddleBox(self, player) -> tuple:
             '''
-            checks if the ball has hit any player's paddle.
-            If it has, it will return the player ID of the player who hit the ball.
+            Returns the left, top, right and bottom edges of a player's paddle.
             '''
-            for player_slot, player in players.items():
-                if player.id is None:  # Skip empty slots
+            if player.position in (Position.LEFT, Position.RIGHT):
+                return player.x, player.y, player.x + self.paddle_width, player.y + self.paddle_height
+            return player.x, player.y, player.x + self.paddle_height, player.y + self.paddle_width
+
+        def hitPlayer(self, players: list, dx: float, dy: float, skip: Optional[int] = None):
+            '''
+            Sweeps the move (dx, dy) against every player's paddle except the one in slot skip, the one the ball just bounced off.
+            Returns (t, axis, player) of the first paddle hit, where t is the fraction of the move before the
+            hit and axis is the axis to reflect, or None if no paddle is hit.
+
+            A paddle is solid from the front and at its ends but not from behind, so a ball behind a paddle
+            still goes into the goal. A paddle moved onto the ball sends it back if it is moving towards the goal.
+            '''
+            first = None
+            x, y = self.x, self.y
+            min_x, max_x = (x + dx, x) if dx < 0 else (x, x + dx)
+            min_y, max_y = (y + dy, y) if dy < 0 else (y, y + dy)
+
+            for player in players:
+                if player.id is None or player.slot == skip:  # Skip empty slots
                     continue
-                    
-                match player.position:
-                    case Position.LEFT:
-                        if (self.x <= player.x + self.paddle_width and
-                            self.x >= player.x and
-                            player.y <= self.y <= player.y + self.paddle_height and
-                            self.xFac < 0):  
-                            self.xFac *= -1
-                            self.side = Side.UPPER
-                            self.last_touched_player = player_slot
-                            return player.id
-                    
-                    case Position.RIGHT:
-                        if (self.x + 5 >= player.x and
-                            self.x <= player.x + self.paddle_width and
-                            player.y <= self.y <= player.y + self.paddle_height and
-                            self.xFac > 0):  
-                            self.xFac *= -1
-                            self.side = Side.LOWER
-                            self.last_touched_player = player_slot
-                            return player.id
-
-                    case Position.TOP:
-                        if (self.y <= player.y + self.paddle_width and
-                            self.y >= player.y and
-                            player.x <= self.x <= player.x + self.paddle_height and
-                            self.yFac < 0):  
-                            self.yFac *= -1
-                            self.side = Side.UPPER 
-                            self.last_touched_player = player_slot
-                            return player.id
-
-                    case Position.BOTTOM:
-                        if (self.y + 5 >= player.y and
-                            self.y <= player.y + self.paddle_width and
-                            player.x <= self.x <= player.x + self.paddle_height and
-                            self.yFac > 0):  
-                            self.yFac *= -1
-                            self.side = Side.LOWER  
-                            self.last_touched_player = player_slot
-                            return player.id
-            return None
+
+                left, top, right, bottom = self.paddleBox(player)
+
+                # most paddles are nowhere near the move, skip them before sweeping.
+                if max_x < left or min_x > right or max_y < top or min_y > bottom:
+                    continue
+
+                x_range = _slab(self.x, dx, left, right)
+                y_range = _slab(self.y, dy, top, bottom)
+
+                if x_range is None or y_range is None:
+                    continue
+
+                t_enter = max(x_range[0], y_range[0])
+                t_exit = min(x_range[1], y_range[1])
+
+                if t_enter > t_exit or t_exit <= 0 or t_enter > 1:
+                    continue
+
+                paddle_axis, towards_goal = PADDLE_AXES[player.position]
+                moving = self.xFac if paddle_axis == X_AXIS else self.yFac
+
+                if t_enter < 0:
+                    # the ball starts inside the paddle.
+                    if moving != towards_goal:
+                        continue
+                    t, axis = 0.0, paddle_axis
+                else:
+                    t = t_enter
+                    axis = X_AXIS if x_range[0] >= y_range[0] else Y_AXIS
+
+                    if axis == paddle_axis and moving != towards_goal:
+                        # entering from behind.
+                        continue
+
+                if first is None or t < first[0]:
+                    first = (t, axis, player)
+
+            return first
 
         def get_side(self):
             return self.side
@@ -215,22 +428,32 @@ class Game_State:
         '''
         The Player object contains the following:
             - uuid: unique identifier for the player
+            - slot: the slot of the player, 1 to 4
             - side: side of the player (LEFT, RIGHT, NONE)
             - x: x pos
             - y: y pos
             - position: position of the player (LEFT, RIGHT, TOP, BOTTOM)
+            - input_seq: seq of the last MOVE or INPUT applied, sent back to the client in every SNAPSHOT
+            - direction: the direction the paddle is held in by INPUT packets, -1, 0 or 1 along its axis
         Methods:
             - printing the object will return the position and side.
             - update(x, y): updates the player position.
+            - apply_input(seq, x, y): applies a MOVE from the client if it is newer than the last one.
+            - apply_command(seq, direction): applies an INPUT from the client if it is newer than the last one.
+            - move(direction, dt): moves the paddle along its axis for dt seconds at PADDLE_SPEED.
         '''
+        __slots__ = ("id", "slot", "side", "x", "y", "position", "input_seq", "direction")
 
-        def __init__(self, uuid: Optional[str], side=Side.NONE, x=0.0, y=0.0, position=None):
+        def __init__(self, uuid: Optional[str], side=Side.NONE, x=0.0, y=0.0, position=None, slot=0):
 
             self.id: Optional[str] = uuid
+            self.slot = slot
             self.side = side
             self.x = x
             self.y = y
             self.position = position
+            self.input_seq = 0
+            self.direction = 0
 
         def __str__(self):
             return f"Player {self.id} at ({self.x}, {self.y}), side: {self.side}, position: {self.position}"
@@ -243,86 +466,202 @@ class Game_State:
             self.x = x
             self.y = y
 
+        def apply_input(self, seq: int, x: float, y: float) -> bool:
+            '''
+            Moves the paddle to where the client put it with input seq. Inputs older than the last one applied are
+            dropped. The paddle only moves along its own axis and stays inside the game area.
+            Returns True if the input was applied.
+            '''
+            if seq <= self.input_seq:
+                return False
+
+            self.input_seq = seq
+
+            if self.position in (Position.LEFT, Position.RIGHT):
+                self.y = min(max(y, 0.0), HEIGHT - PADDLE_LENGTH)
+            else:
+                self.x = min(max(x, 0.0), WIDTH - PADDLE_LENGTH)
+
+            return True
+
+        def apply_command(self, seq: int, direction: int) -> bool:
+            '''
+            Holds the paddle in direction from now on, the paddle is moved by the server every tick.
+            Commands older than the last input applied are dropped. Returns True if the command was applied.
+            '''
+            if seq <= self.input_seq:
+                return False
+
+            self.input_seq = seq
+            self.direction = max(-1, min(1, direction))
+            return True
+
+        def move(self, direction: int, dt: float) -> bool:
+            '''
+            Moves the paddle along its axis at PADDLE_SPEED for dt seconds and keeps it inside the game area,
+            the same as a Striker on the client. Up and left are -1. Returns True if the paddle moved.
+            '''
+            if direction == 0:
+                return False
+
+            step = direction * PADDLE_SPEED * dt
+
+            if self.position in (Position.LEFT, Position.RIGHT):
+                y = min(max(self.y + step, 0.0), HEIGHT - PADDLE_LENGTH)
+                moved = y != self.y
+                self.y = y
+            else:
+                x = min(max(self.x + step, 0.0), WIDTH - PADDLE_LENGTH)
+                moved = x != self.x
+                self.x = x
+
+            return moved
+
     
-    def __init__(self):
-        self.players = {
-            "p1": self.Player(uuid=None, side=Side.UPPER, position=Position.LEFT),
-            "p2": self.Player(uuid=None, side=Side.LOWER, position=Position.RIGHT),
-            "p3": self.Player(uuid=None, side=Side.UPPER, position=Position.TOP),
-            "p4": self.Player(uuid=None, side=Side.LOWER, position=Position.BOTTOM)
-        }
-        self.game_lock = threading.Lock()
+    def __init__(self, game_lock=None):
+        self.players = [
+            self.Player(uuid=None, side=Side.UPPER, position=Position.LEFT, slot=1),
+            self.Player(uuid=None, side=Side.LOWER, position=Position.RIGHT, slot=2),
+            self.Player(uuid=None, side=Side.UPPER, position=Position.TOP, slot=3),
+            self.Player(uuid=None, side=Side.LOWER, position=Position.BOTTOM, slot=4)
+        ]
+        self.slot_of: dict[str, int] = {}
+        self.game_lock = game_lock if game_lock is not None else threading.Lock()
         self.paused = False
         self.ended = False
-        self.scoreboard = {
-            "upper_score": 0,
-            "lower_score": 0
-        }
+        self.roster_version = 0
+        self.scoreboard = scoreboard()
         self.ball = self.Ball(scoreboard_ref=self.scoreboard)
+        self.snapshot: Optional[state_snapshot] = None
+        self.publish()
 
     def __str__(self):
         return f"({self.ball.x}, {self.ball.y}, paused: {self.paused}), players: {self.players}"
     
-    def add_player(self, new_id:str, x=0.0, y=0.0,):
+    def add_player(self, new_id:str, x=None, y=None) -> Optional[int]:
         '''
-        Adds a player to the game state.
+        Adds a player to the game state and returns its slot. The paddle starts at the home position of its slot unless x and y are given.
         '''
 
         with self.game_lock:
-            count = 0
-            for player in self.players.values():
-                if player.id == new_id:
-                    raise ValueError(f"Player {new_id} already exists.")
-                if player.id is not None:
-                    count += 1
+            if new_id in self.slot_of:
+                raise ValueError(f"Player {new_id} already exists.")
             
-            if count >= MAX_PLAYERS:
+            if len(self.slot_of) >= MAX_PLAYERS:
                 raise ValueError(f"Maximum number of players {MAX_PLAYERS} reached.")
-        
-            
 
-            for key, slot in self.players.items():
-                if slot.id is None:
-                    slot.id = new_id
-                    slot.x = x
-                    slot.y = y
-                    return key
+            for player in self.players:
+                if player.id is None:
+                    home_x, home_y = HOME_POSITIONS[player.slot]
+                    player.id = new_id
+                    player.x = home_x if x is None else x
+                    player.y = home_y if y is None else y
+                    player.input_seq = 0
+                    player.direction = 0
+                    self.slot_of[new_id] = player.slot
+                    self.roster_version += 1
+                    self.publish()
+                    return player.slot
         
         return None
     
-    def remove_player(self, remove_id: str) -> Optional[str]:
+    def remove_player(self, remove_id: str) -> Optional[int]:
         '''
-        Removes a player from the game state.
+        Removes a player from the game state and returns the slot it was in.
         '''
 
         with self.game_lock:
-                for player in self.players.values():
-                    if player.id == remove_id:
+            slot = self.slot_of.pop(remove_id, None)
 
-                        player.id = None
-                        player.x = 0.0
-                        player.y = 0.0
-                        
-                        print(f"Player {remove_id} removed from game state.")
-                        return
+            if slot is None:
+                return None
 
-        return None
+            player = self.players[slot - 1]
+            player.id = None
+            player.x = 0.0
+            player.y = 0.0
+            player.input_seq = 0
+            player.direction = 0
+            self.roster_version += 1
+            self.publish()
+
+        print(f"Player {remove_id} removed from game state.")
+        return slot
+
+    def player(self, slot: int):
+        '''
+        Returns the Player in a slot, 1 to 4.
+        '''
+        return self.players[slot - 1]
+
+    def find_player(self, player_id: str):
+        '''
+        Returns the Player with an ID, or None if it is not in the game.
+        '''
+        slot = self.slot_of.get(player_id)
+        return None if slot is None else self.players[slot - 1]
     
-    def get_player_list(self):
+    def move_paddles(self, dt: float) -> bool:
         '''
-        Returns a list of players with empty slots too.
+        Moves every paddle held in a direction by dt seconds. Returns True if any paddle moved.
+        Must be called while holding game_lock.
         '''
+        moved = False
 
-        with self.game_lock:
-            return self.players
+        for player in self.players:
+            if player.id is not None and player.move(player.direction, dt):
+                moved = True
 
+        return moved
 
-    def get_scoreboard(self):
+    def world(self) -> tuple:
         '''
-        Returns the scoreboard.
+        Returns the ball position, the position of the players in slots 1 to 4, the upper and lower score
+        and the input seq of each slot, in the order of a SNAPSHOT packet. Must be called while holding game_lock.
         '''
-        with self.game_lock:
-            return self.scoreboard
+        p1, p2, p3, p4 = self.players
+
+        return (
+            self.ball.x, self.ball.y,
+            p1.x, p1.y, p2.x, p2.y, p3.x, p3.y, p4.x, p4.y,
+            self.scoreboard["upper_score"], self.scoreboard["lower_score"],
+            p1.input_seq, p2.input_seq, p3.input_seq, p4.input_seq
+        )
+
+    def publish(self) -> None:
+        '''
+        Replaces snapshot with a new state_snapshot of the current state. The new snapshot is swapped in with one
+        assignment, so a reader gets either the old or the new one, never a mix. Must be called while holding game_lock.
+        '''
+        previous = self.snapshot
+        players = self.players
+
+        if previous is not None and previous.roster_version == self.roster_version:
+            roster = previous.roster
+        else:
+            roster = (players[0].id, players[1].id, players[2].id, players[3].id)
+
+        self.snapshot = state_snapshot(
+            0 if previous is None else previous.version + 1,
+            self.world(), self.paused, self.ended,
+            roster, self.roster_version,
+            self.scoreboard["upper_score"], self.scoreboard["lower_score"], self.scoreboard.version
+        )
+
+    def get_player_list(self) -> tuple:
+        '''
+        Returns the player ID in every slot, slot 1 first, None for empty slots.
+        '''
+
+        return self.snapshot.roster
+
+
+    def get_scoreboard(self) -> dict:
+        '''
+        Returns a copy of the scoreboard.
+        '''
+        state = self.snapshot
+        return {"upper_score": state.upper_score, "lower_score": state.lower_score}
         
     def update_scoreboard(self, upper_score: int, lower_score: int):
         '''
@@ -332,6 +671,7 @@ class Game_State:
         with self.game_lock:
             self.scoreboard["upper_score"] = upper_score
             self.scoreboard["lower_score"] = lower_score
+            self.publish()
     
 
 
@@ -339,23 +679,24 @@ class Game_State:
     def pause(self):
         with self.game_lock:
             self.paused = True
+            self.publish()
         
     def unpause(self):
         with self.game_lock:
             self.paused = False
+            self.publish()
     
     def end(self):
         with self.game_lock:
             self.ended = True
             self.paused = True
+            self.publish()
 
     def is_paused(self):
-        with self.game_lock:
-            return self.paused
+        return self.snapshot.paused
         
     def is_ended(self):
-        with self.game_lock:
-            return self.ended
+        return self.snapshot.ended
         
    
 
@@ -365,16 +706,16 @@ class Game_State:
         Resets the game.
         '''
         with self.game_lock:
-            self.scoreboard = {
-                "upper_score": 0,
-                "lower_score": 0
-            }
+            # reset in place so the version keeps counting and the room sees the change.
+            self.scoreboard["upper_score"] = 0
+            self.scoreboard["lower_score"] = 0
             self.paused = False
             self.ended = False
             self.ball = self.Ball(scoreboard_ref=self.scoreboard)
             self.ball.reset()
 
             self.ball.scoreboard_ref = self.scoreboard
+            self.publish()
     
 
 
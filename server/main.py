@@ -1,16 +1,13 @@
 import game_server as gs
+import async_server
+import supervisor
+import asyncio
 import signal
 import sys, os
-import game_track as gt
 import time
+import metrics
 import threading
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from shared import packet
-
-BALL_UPDATE_INTERVAL = 0.03
-IDLE_TIME = 1
-PLAYER_LIST_UPDATE_INTERVAL = 2
-TARGET_SCORE = 10
 
 server_socket = None
 
@@ -24,61 +21,15 @@ def handle_sigint(sig, frame):
 
 
 
-def handle_client(client: gs.client, conn: gs.server_connection):
+def handle_client(client: gs.client, room: gs.room):
     '''
-    Function that each thread will run to handle a client connection. It will send an update to all clients.
-    Requires: a client class and a server_connection class.
+    Function that each thread will run to handle a client connection. It will send an update to all clients in its room.
+    Requires: a client class and the room class the client was routed into.
 
     '''
 
-    #send UUID at initial connection between client and server.
-    print(f"Sending UUID: {client.id}")
-    try:
-        client.send(str(client.id).encode())
-    except Exception as e:
-        print(f"Error sending UUID to client: {e}")
-        client.close()
-        return
-    
-    #add new player to the game state and send the new player slot to all clients.
-
-    try:
-        player_slot = conn.game_state.add_player(str(client.id))
-    except ValueError as e:
-        print(f"Error adding player: {e}")
-        client.close()
-        return
-
-
-
-    if player_slot is None:
-        print(f"Failed to add player {str(client.id)} to game state.")
-        client.close()
+    if not room.join(client):
         return
-    
-    print(f"Player {str(client.id)} added to slot {player_slot}.")
-
-
-    new_send = packet.serialize({"uuid": str(client.id), "slot": int(player_slot[1:])}, packet.Status.PLAYER_NEW_SLOT)
-
-    try:
-        client.send(new_send)
-        print(f"Sent new player slot to all clients: {client.id} in slot {player_slot}.")
-    except Exception as e:
-        print(f"Error Sending New player: {e}")
-
-
-    
-    #Ready up the client and send the player list.
-    client.ready_up()
-    conn.send_player_list()
-
-    if conn.game_state.is_ended():
-        # If this is the first client and the game has ended, reset the game state.
-        conn.game_state.reset_game()
-        conn.game_state.unpause()
-        print("Game state reset for a new player.")
-
 
     #start the client receiving thread.
     try:
@@ -88,159 +39,51 @@ def handle_client(client: gs.client, conn: gs.server_connection):
                 # the client has disconnected.
                 break
 
-            unloaded_data = packet.unload_packet(data)
-            
-            #testing whether the packet was unloaded correctly
-            #print(f"Unloaded Data: {unloaded_data}")
-
-            status = packet.Status(unloaded_data["status"])
-            to_send = None
-
-            # Handle the different packet statuses
-                
-            match status:
-                case packet.Status.MOVE:
-                    with conn.game_state.game_lock:
-                        for player in conn.game_state.players.values():
-                            if player.id == str(client.id):
-                                # Update the player's position
-                                player.update(unloaded_data["x"], unloaded_data["y"])
-                                to_send = packet.serialize({"uuid": str(client.id), "x": player.x, "y": player.y}, packet.Status.MOVE)
-                
-                case packet.Status.PAUSE:
-                    conn.game_state.pause()
-                    to_send = packet.serialize({}, packet.Status.PAUSE)
-
-
-         # now send the updated data to all clients and the scoreboard.
-            try:
-                conn.update_clients(to_send)
-                conn.send_scoreboard()
-            except Exception as e:
-                print(f"Error updating clients: {e}")
-
+            room.handle_packet(client, data)
         
     except Exception as e:
         print(f"Client Error: {e}")
 
     # handle client disconnection
     finally:
-        # get players before closing the client
-
-        client.close()
-        conn.game_state.remove_player(str(client.id))
-        conn.send_player_list()
-        print(f"There is now {conn.get_active()} active connections.")
-
-        # Get player count after removing client
-        players_after = conn.get_active()
-
-        if players_after < 4 and players_after > 0:
-            try:
-                # Send current scoreboard to remaining players
-                # The ball_updater_thread will reset it on the next cycle
-                conn.send_scoreboard()
-            except Exception as e:
-                print(f"Error sending scoreboard after disconnect: {e}")
-    pass
+        room.leave(client)
 
 def ball_updater_thread(conn: gs.server_connection):
     '''
-    This thread will update the ball position every update_interval seconds.
-    broadcast the new position to all clients.
+    This thread will tick every room on the deadlines of conn.scheduler. Each room moves its ball and
+    broadcasts the new position to its own clients, so one thread serves every match in the process.
 
     Requires a server_connection object.
     '''
-    game_state = conn.game_state
+    scheduler = conn.scheduler
     
     while True:
-        active_players = conn.get_active()
-        # Less than 4 players - pause game and reset scoreboard
-        if active_players < 4 and active_players > 0:
-            if not game_state.is_paused() or not game_state.is_ended():
-                with game_state.game_lock:
-                    # Reset scoreboard if not 0-0
-                    if (game_state.scoreboard["upper_score"] != 0 or 
-                        game_state.scoreboard["lower_score"] != 0):
-                        print(f"Resetting scoreboard due to insufficient players ({active_players}/4)")
-                        game_state.scoreboard["upper_score"] = 0
-                        game_state.scoreboard["lower_score"] = 0
-                        game_state.ball.reset()
-                    # Pause the game (but don't mark as ended)     
-                    game_state.paused = True
-                # Send updated scoreboard to remaining clients
-                try:
-                    conn.send_scoreboard()
-                except Exception as e:
-                    print(f"Error sending reset scoreboard: {e}")
-
-        # All 4 player present unpause if currently paused (but not ended)            
-        elif active_players == 4:
-            if game_state.is_paused() and not game_state.is_ended():    
-                game_state.unpause()
-
-        # No players pause but don't reset scoreboard yet
-        elif active_players == 0:
-            if not game_state.is_paused():
-                game_state.pause()
+        time.sleep(scheduler.delay())
 
-        #main loop            
-        #print(f"game_state.is_paused() = {game_state.is_paused()} conn.get_active() = {conn.get_active()} game_state.is_ended() = {game_state.is_ended()}")
-        if not game_state.is_paused() and conn.get_active() > 0:
-            with game_state.game_lock:
-                game_state.ball.update(players = game_state.players)
-                to_send = packet.serialize({"x": game_state.ball.x,"y": game_state.ball.y}, packet.Status.BALL_POS)
+        ticks = scheduler.due()
+        if ticks == 0:
+            continue
 
-            try:
-                #print(f"Sending Ball Position: {game_state.ball.x}, {game_state.ball.y}")
-                conn.update_clients(to_send)
-            except Exception as e:
-                print(f"Ball Exception: {e}")
-
-            with game_state.game_lock: 
-                curr_scoreboard = game_state.ball.scoreboard_ref
-                
-                if not curr_scoreboard:
-                    raise ValueError("Scoreboard not found in game state.")
-                    
-                upper_score = curr_scoreboard["upper_score"]
-                lower_score = curr_scoreboard["lower_score"]
-            
-            if lower_score == TARGET_SCORE or upper_score == TARGET_SCORE:
-                game_state.end()
-                    
-                    
-            if game_state.is_ended():
-                print("Game has ended.")
-                to_end = packet.serialize({"winner": game_state.ball.side.value}, packet.Status.END)
-                conn.game_state.pause()
-                try:
-                    conn.update_clients(to_end)
-                except Exception as e:
-                    print(f"Error sending END packet: {e}")
+        for _ in range(ticks):
+            running = conn.tick_rooms()
         
-        # If the game is paused or no clients are connected, wait for a while before checking again.
-        if game_state.is_paused() or conn.get_active() < 1:
-            time.sleep(IDLE_TIME)
-        else:
-            time.sleep(BALL_UPDATE_INTERVAL)
+        # If every room is paused or no clients are connected, wait for a while before checking again.
+        if not running:
+            time.sleep(gs.IDLE_TIME)
+            scheduler.reset()
     
-def player_list_updater_thread(conn: gs.server_connection):
+def serve_threaded(c: gs.server_connection):
     '''
-    This thread will update the player list every 5 seconds.
+    Runs the server with one thread per client, plus the ball thread.
     '''
 
-    while True:
-        
-        try:
-            if conn.get_active() > 0:
-                conn.send_player_list()
-        except Exception as e:
-            print(f"Error sending player list: {e}")
-            break
-        
-        time.sleep(PLAYER_LIST_UPDATE_INTERVAL)
+    # SIGNAL HANDLER because the server will not be able to interrupt while waiting for clients.
+    signal.signal(signal.SIGINT, handle_sigint)
+
+    ball_t = threading.Thread(target=ball_updater_thread, args=(c, ), daemon=True)
+    ball_t.start()
 
+    c.accept_clients(handle_client) # this is a blocking call for this thread.
 
 
 def main():
@@ -248,23 +91,32 @@ def main():
     
     global server_socket
 
-    # SIGNAL HANDLER because the server will not be able to interrupt while waiting for clients.
-    signal.signal(signal.SIGINT, handle_sigint)
-
-    ball_t = None
-    player_list_t = None
-
-    # initialize the socket and threads. 
+    # initialize the socket and pick the server mode from config.json.
     try:
+        config = gs.load_config()
+        mode = config.get("server_mode", "threaded")
         c = gs.init_host()
         server_socket = c.socket
+        metrics_port = config.get("metrics_port", 0)
+        metrics_interval = config.get("metrics_interval", metrics.METRICS_INTERVAL)
         print(c)
-        ball_t = threading.Thread(target=ball_updater_thread, args=(c, ), daemon=True)
-        ball_t.start()
-        player_list_t = threading.Thread(target=player_list_updater_thread, args=(c, ), daemon=True)
-        player_list_t.start()
 
-        c.accept_clients(handle_client) # this is a blocking call for this thread.
+        match mode:
+            case "threaded":
+                c.start_metrics(metrics_port, metrics_interval)
+                serve_threaded(c)
+            case "asyncio":
+                print("Running in asyncio mode.")
+                c.start_metrics(metrics_port, metrics_interval)
+                asyncio.run(async_server.serve(c))
+            case "supervisor":
+                print("Running in supervisor mode.")
+                supervisor.serve(c, config.get("workers", 0), metrics_port, metrics_interval)
+            case _:
+                raise ValueError(f"Unknown server_mode {mode} in config.json")
+
+    except KeyboardInterrupt:
+        pass
 
     except Exception as e:
         print(f"Server Exception occured: {e}")
@@ -279,5 +131,3 @@ def main():
 if __name__ == "__main__":
     main()
     sys.exit(0)
-
-
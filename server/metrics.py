@@ -0,0 +1,317 @@
+'''
+Server metrics. Counters, gauges and histograms are recorded in the hot paths with a plain addition, no lock and
+no allocation, and read from another thread when they are reported. Under contention an increment can rarely be
+lost, which is fine for monitoring and keeps recording cheap enough to leave on in the tick and receive loops.
+
+The metrics are reported two ways:
+    - as Prometheus text on http://127.0.0.1:<metrics_port>/metrics, when metrics_port is set in config.json
+    - as one line in the server log every metrics_interval seconds
+'''
+
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+METRICS_INTERVAL = 10 # seconds between metrics log lines.
+METRICS_HOST = "127.0.0.1" # the endpoint is only for the local machine or a sidecar scraper.
+TICK_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25) # seconds
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+
+class counter:
+    '''
+    A value that only goes up. .inc(amount) adds to it.
+    '''
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1) -> None:
+        self.value += amount
+
+
+class gauge:
+    '''
+    A value that goes up and down. .set(value) replaces it.
+    '''
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value) -> None:
+        self.value = value
+
+
+class histogram:
+    '''
+    Counts observations into buckets by upper bound, plus the sum and count of every observation.
+    .observe(value) records one observation.
+    '''
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # the last bucket is +Inf.
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class timed_lock:
+    '''
+    A threading.Lock that records how long threads waited for it. It first tries to take the lock without
+    blocking, so an uncontended acquire costs no clock reads. Only a wait is timed and counted in:
+        - wait_seconds: a counter of the seconds spent waiting
+        - contended: a counter of the acquires that had to wait
+
+    Use it like a Lock: with lock: ...
+    '''
+    __slots__ = ("lock", "wait_seconds", "contended")
+
+    def __init__(self, name: str, registry: Optional["registry"] = None):
+        registry = registry or REGISTRY
+        self.lock = threading.Lock()
+        self.wait_seconds = registry.counter("pong_lock_wait_seconds_total", "Seconds threads waited for a lock.", lock=name)
+        self.contended = registry.counter("pong_lock_contended_total", "Lock acquires that had to wait.", lock=name)
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self.lock.acquire(False):
+            return True
+
+        if not blocking:
+            return False
+
+        start = time.perf_counter()
+        acquired = self.lock.acquire(True, timeout)
+        self.wait_seconds.value += time.perf_counter() - start
+        self.contended.value += 1
+        return acquired
+
+    def release(self) -> None:
+        self.lock.release()
+
+    def locked(self) -> bool:
+        return self.lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.lock.release()
+
+
+class registry:
+    '''
+    Holds every metric by name and labels. It contains:
+        - metrics: dict of name to (kind, help, dict of labels to metric)
+        - collectors: functions called when the metrics are rendered, for values that are read instead of
+          recorded, like the number of rooms. Each returns a list of (name, kind, help, [(labels, value), ...]).
+
+    Methods:
+        .counter(name, help, **labels), .gauge(name, help, **labels) and .histogram(name, help, bounds, **labels)
+            return the metric with that name and labels, creating it the first time.
+        .add_collector(collect) adds a collector.
+        .render() returns every metric as Prometheus text.
+    '''
+
+    def __init__(self):
+        self.metrics: dict[str, tuple] = {}
+        self.collectors: list[Callable[[], list]] = []
+        self.lock = threading.Lock()
+
+    def get(self, kind: str, name: str, help: str, make: Callable, labels: dict):
+        key = tuple(sorted(labels.items()))
+
+        with self.lock:
+            entry = self.metrics.get(name)
+
+            if entry is None:
+                entry = self.metrics[name] = (kind, help, {})
+            elif entry[0] != kind:
+                raise ValueError(f"Metric {name} is a {entry[0]}, not a {kind}.")
+
+            metric = entry[2].get(key)
+
+            if metric is None:
+                metric = entry[2][key] = make()
+
+            return metric
+
+    def counter(self, name: str, help: str, **labels) -> counter:
+        return self.get(COUNTER, name, help, counter, labels)
+
+    def gauge(self, name: str, help: str, **labels) -> gauge:
+        return self.get(GAUGE, name, help, gauge, labels)
+
+    def histogram(self, name: str, help: str, bounds: tuple, **labels) -> histogram:
+        return self.get(HISTOGRAM, name, help, lambda: histogram(bounds), labels)
+
+    def add_collector(self, collect: Callable[[], list]) -> None:
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+
+        with self.lock:
+            entries = [(name, kind, help, list(children.items())) for name, (kind, help, children) in self.metrics.items()]
+
+        for name, kind, help, children in entries:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for key, metric in children:
+                labels = dict(key)
+
+                if kind == HISTOGRAM:
+                    cumulative = 0
+                    for bound, count in zip(metric.bounds + (float("inf"),), metric.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels({**labels, 'le': _number(bound)})} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(metric.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(metric.value)}")
+
+        for collect in self.collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+                continue
+
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+
+        lines.append("")
+        return "\n".join(lines)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = registry()
+
+# recorded by the tick loop.
+TICK_SECONDS = REGISTRY.histogram("pong_tick_seconds", "Seconds one tick of every room took.", TICK_BUCKETS)
+
+# recorded by every client's receive and writer. Each client also counts its own, see game_server.client.
+BYTES_IN = REGISTRY.counter("pong_received_bytes_total", "Bytes received from clients, frame headers included.")
+PACKETS_IN = REGISTRY.counter("pong_received_packets_total", "Packets received from clients.")
+BYTES_OUT = REGISTRY.counter("pong_sent_bytes_total", "Bytes sent to clients, frame headers included.")
+PACKETS_OUT = REGISTRY.counter("pong_sent_packets_total", "Packets sent to clients.")
+
+
+class metrics_handler(BaseHTTPRequestHandler):
+    '''
+    Serves the registry as Prometheus text on /metrics.
+    '''
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # a scraper requests this every few seconds, keep it out of the server log.
+        pass
+
+
+def serve_http(port: int, registry: Optional[registry] = None) -> ThreadingHTTPServer:
+    '''
+    Starts the /metrics endpoint on METRICS_HOST:port in a daemon thread and returns the HTTP server.
+    '''
+    server = ThreadingHTTPServer((METRICS_HOST, port), metrics_handler)
+    server.daemon_threads = True
+    server.registry = registry or REGISTRY
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    print(f"Metrics at http://{METRICS_HOST}:{port}/metrics")
+    return server
+
+
+class metrics_logger:
+    '''
+    Prints one line of the most important metrics every interval seconds, with the rates since the last line.
+    It requires:
+        - summary, a function that returns the values read instead of recorded: rooms, clients, overruns,
+          max_queue_depth, as a dict
+        - interval, seconds between lines
+
+    Methods:
+        .line() returns the line for the time since the last call.
+        .start() prints a line every interval seconds from a daemon thread.
+    '''
+
+    def __init__(self, summary: Callable[[], dict], interval: float = METRICS_INTERVAL, registry: Optional[registry] = None):
+        self.summary = summary
+        self.interval = interval
+        self.registry = registry or REGISTRY
+        self.last = self.totals()
+
+    def totals(self) -> tuple:
+        locks = self.registry.metrics.get("pong_lock_wait_seconds_total", (None, None, {}))[2]
+        lock_wait = {dict(key).get("lock"): metric.value for key, metric in list(locks.items())}
+        return (time.perf_counter(), TICK_SECONDS.count, TICK_SECONDS.sum, PACKETS_IN.value, BYTES_IN.value,
+                PACKETS_OUT.value, BYTES_OUT.value, lock_wait)
+
+    def line(self) -> str:
+        now = self.totals()
+        seconds = (now[0] - self.last[0]) or 1e-9
+        ticks = now[1] - self.last[1]
+        tick_ms = (now[2] - self.last[2]) / ticks * 1000 if ticks else 0.0
+        rates = [(a - b) / seconds for a, b in zip(now[3:7], self.last[3:7])]
+        waits = ", ".join(f"{name} {(value - self.last[7].get(name, 0)) * 1000:.1f}ms"
+                          for name, value in sorted(now[7].items()))
+        self.last = now
+
+        s = self.summary()
+        return (f"Metrics: {s['rooms']} rooms, {s['clients']} clients, {ticks / seconds:.1f} ticks/s averaging {tick_ms:.2f}ms, "
+                f"{s['overruns']} overruns, in {rates[0]:,.0f} packets/s {rates[1]:,.0f} B/s, "
+                f"out {rates[2]:,.0f} packets/s {rates[3]:,.0f} B/s, max send queue {s['max_queue_depth']}, "
+                f"lock wait {waits or 'none'}")
+
+    def start(self) -> None:
+        def run():
+            while True:
+                time.sleep(self.interval)
+                print(self.line())
+
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
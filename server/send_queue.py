@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+MAX_QUEUED_FRAMES = 256
+MAX_QUEUED_BYTES = 256 * 1024
+MAX_QUEUE_DELAY = 5 # seconds the queue can wait for a client that is not reading before it is disconnected.
+
+# Kinds of frames where only the newest one matters. A queued frame of the same kind that has not been
+# written yet is replaced instead of queueing another one. Frames without a kind are always delivered.
+WORLD = "world" # SNAPSHOT and DELTA, every one of them is decodable from the tick the client acknowledged.
+SCOREBOARD = "scoreboard"
+PLAYER_LIST = "player_list"
+
+class send_queue:
+    '''
+    A bounded queue of framed packets waiting to be written to one client, so the tick never waits for a
+    client's socket. A writer thread or task takes the frames out and writes them. It contains:
+        - frames: deque of [kind, frame] in the order they will be written
+        - size: bytes queued
+        - superseded: frames replaced by a newer frame of the same kind before they were written
+        - stalled_since: when frames were queued that the writer has not taken yet, None if it is keeping up
+        - closed: True once the client is closed, take() returns nothing from then on
+
+    Methods:
+        .put(frame, kind) queues a frame, replacing the queued frame of the same kind if there is one.
+            Raises ConnectionError if the client is not keeping up: too many frames or bytes queued, or
+            frames waiting for more than MAX_QUEUE_DELAY seconds.
+        .take(timeout) waits for frames and returns all of them, or an empty list once the queue is closed.
+        .take_nowait() returns all queued frames without waiting.
+        .depth() returns the number of frames queued.
+        .close() wakes up the writer and stops the queue.
+    '''
+
+    def __init__(self, max_frames: int = MAX_QUEUED_FRAMES, max_bytes: int = MAX_QUEUED_BYTES, max_delay: float = MAX_QUEUE_DELAY):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.frames: deque[list] = deque()
+        self.size = 0
+        self.superseded = 0
+        self.stalled_since: Optional[float] = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __str__(self):
+        return f"{len(self.frames)} frames, {self.size} bytes queued, {self.superseded} superseded"
+
+    def depth(self) -> int:
+        return len(self.frames)
+
+    def put(self, frame: bytes, kind: Optional[str] = None) -> None:
+        with self.lock:
+            if self.closed:
+                raise ConnectionError("Connection closed.")
+
+            now = time.monotonic()
+
+            if self.stalled_since is not None and now - self.stalled_since > self.max_delay:
+                raise ConnectionError(f"Client has not read for {now - self.stalled_since:.1f}s.")
+
+            if kind is not None:
+                for entry in self.frames:
+                    if entry[0] == kind:
+                        self.size += len(frame) - len(entry[1])
+                        entry[1] = frame
+                        self.superseded += 1
+                        return
+
+            if len(self.frames) >= self.max_frames or self.size + len(frame) > self.max_bytes:
+                raise ConnectionError(f"Send backlog of {len(self.frames)} frames, {self.size} bytes.")
+
+            self.frames.append([kind, frame])
+            self.size += len(frame)
+
+            if self.stalled_since is None:
+                self.stalled_since = now
+
+            self.ready.notify()
+
+    def take_nowait(self) -> list:
+        with self.lock:
+            return self._take()
+
+    def take(self, timeout: Optional[float] = None) -> list:
+        with self.lock:
+            while not self.frames and not self.closed:
+                if not self.ready.wait(timeout):
+                    return []
+            return self._take()
+
+    def _take(self) -> list:
+        frames = [frame for _, frame in self.frames]
+        self.frames.clear()
+        self.size = 0
+        self.stalled_since = None
+        return frames
+
+    def close(self) -> None:
+        with self.lock:
+            self.closed = True
+            self.frames.clear()
+            self.size = 0
+            self.ready.notify_all()
@@ -0,0 +1,223 @@
+'''
+Headless game engine. Steps a game_track.Game_State as fast as possible with scripted, random or tracking
+paddle inputs, without sockets, threads or sleeps. Used to measure physics changes and to run offline simulations.
+
+Run the benchmark from the server directory:
+    python -m simulation --ticks 200000 --inputs tracking
+'''
+
+import argparse
+import random
+import time
+from typing import Callable, Optional
+import game_track as gt
+
+STILL = "still"
+RANDOM = "random"
+TRACKING = "tracking"
+INPUT_CHANGE_TICKS = 10 # ticks a random input is held before a new one is picked.
+
+# An input source returns the direction of every paddle for one tick: -1, 0 or 1 along the paddle's axis,
+# up or left is -1. It is called with the game state and the tick number.
+Inputs = Callable[[gt.Game_State, int], dict]
+
+
+class simulation_result:
+    '''
+    The outcome of run(). It contains:
+        - ticks: the number of ticks stepped
+        - goals: the number of points scored in those ticks
+        - seconds: the wall time the ticks took
+        - dt: the game time of one tick
+        - scoreboard: the score at the end of the run
+
+    Methods:
+        .ticks_per_second() and .goals_per_second() are measured against wall time.
+        .goals_per_minute() is measured against game time.
+    '''
+
+    def __init__(self, ticks: int, goals: int, seconds: float, dt: float, scoreboard: dict):
+        self.ticks = ticks
+        self.goals = goals
+        self.seconds = seconds
+        self.dt = dt
+        self.scoreboard = scoreboard
+
+    def __str__(self):
+        return (f"{self.ticks} ticks in {self.seconds:.3f}s: {self.ticks_per_second():,.0f} ticks/s, "
+                f"{self.goals} goals, {self.goals_per_second():,.1f} goals/s, "
+                f"{self.goals_per_minute():.2f} goals per game minute")
+
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.seconds if self.seconds else 0.0
+
+    def goals_per_second(self) -> float:
+        return self.goals / self.seconds if self.seconds else 0.0
+
+    def goals_per_minute(self) -> float:
+        game_seconds = self.ticks * self.dt
+        return self.goals * 60 / game_seconds if game_seconds else 0.0
+
+
+def new_game(seed: Optional[int] = None) -> gt.Game_State:
+    '''
+    Returns a running Game_State with all four slots taken and every paddle at its home position.
+    seed seeds the random module, which the ball uses to pick its direction after a goal.
+    '''
+    if seed is not None:
+        random.seed(seed)
+
+    state = gt.Game_State()
+
+    for slot in gt.SLOTS:
+        x, y = gt.HOME_POSITIONS[slot]
+        state.add_player(f"sim-p{slot}", x, y)
+
+    state.ball.reset()
+    return state
+
+
+def step(state: gt.Game_State, directions: Optional[dict] = None, dt: float = gt.DEFAULT_DT) -> None:
+    '''
+    Advances a game by one tick: moves the paddles by directions, a dict of slot to direction, then the ball.
+    The engine is single threaded, so it does not take game_lock.
+    '''
+    if directions:
+        players = state.players
+        for slot, direction in directions.items():
+            players[slot - 1].move(direction, dt)
+
+    state.ball.update(players = state.players, dt = dt)
+
+
+def run(state: gt.Game_State, ticks: int, inputs: Optional[Inputs] = None, dt: float = gt.DEFAULT_DT) -> simulation_result:
+    '''
+    Steps a game ticks times as fast as possible and returns a simulation_result.
+    inputs is called before every tick, no paddle moves if it is None.
+    The score keeps counting past TARGET_SCORE, matches are not ended.
+    '''
+    scoreboard = state.scoreboard
+    goals_before = scoreboard["upper_score"] + scoreboard["lower_score"]
+
+    start = time.perf_counter()
+
+    if inputs is None:
+        for _ in range(ticks):
+            state.ball.update(players = state.players, dt = dt)
+    else:
+        for tick in range(ticks):
+            step(state, inputs(state, tick), dt)
+
+    seconds = time.perf_counter() - start
+
+    # the ball keeps a reference to the scoreboard it scores on.
+    scoreboard = state.ball.scoreboard_ref or scoreboard
+    goals = scoreboard["upper_score"] + scoreboard["lower_score"] - goals_before
+
+    return simulation_result(ticks, goals, seconds, dt, dict(scoreboard))
+
+
+def scripted_inputs(script: dict) -> Inputs:
+    '''
+    Returns inputs that replay a script, a dict of tick to the directions that start on that tick.
+    Each direction is held until the script changes it.
+    '''
+    held = {slot: 0 for slot in gt.SLOTS}
+
+    def inputs(state: gt.Game_State, tick: int) -> dict:
+        changes = script.get(tick)
+        if changes:
+            held.update(changes)
+        return held
+
+    return inputs
+
+
+def random_inputs(seed: Optional[int] = None, hold: int = INPUT_CHANGE_TICKS) -> Inputs:
+    '''
+    Returns inputs that pick a random direction for every paddle and hold it for hold ticks.
+    '''
+    rng = random.Random(seed)
+    held = {slot: 0 for slot in gt.SLOTS}
+
+    def inputs(state: gt.Game_State, tick: int) -> dict:
+        if tick % hold == 0:
+            for slot in gt.SLOTS:
+                held[slot] = rng.choice((-1, 0, 1))
+        return held
+
+    return inputs
+
+
+def tracking_inputs() -> Inputs:
+    '''
+    Returns inputs that move every paddle towards the ball, so rallies last like in a real match.
+    '''
+    directions = {slot: 0 for slot in gt.SLOTS}
+    half = gt.PADDLE_LENGTH / 2
+
+    def inputs(state: gt.Game_State, tick: int) -> dict:
+        ball = state.ball
+
+        for player in state.players:
+            slot = player.slot
+            if player.position in (gt.Position.LEFT, gt.Position.RIGHT):
+                offset = ball.y - (player.y + half)
+            else:
+                offset = ball.x - (player.x + half)
+
+            if offset > gt.PADDLE_WIDTH:
+                directions[slot] = 1
+            elif offset < -gt.PADDLE_WIDTH:
+                directions[slot] = -1
+            else:
+                directions[slot] = 0
+
+        return directions
+
+    return inputs
+
+
+def make_inputs(name: str, seed: Optional[int] = None) -> Optional[Inputs]:
+    '''
+    Returns the inputs called name: STILL, RANDOM or TRACKING.
+    '''
+    if name == STILL:
+        return None
+    if name == RANDOM:
+        return random_inputs(seed)
+    if name == TRACKING:
+        return tracking_inputs()
+
+    raise ValueError(f"Unknown inputs {name}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Steps games without a network and reports ticks and goals per second.")
+    parser.add_argument("--ticks", type=int, default=200_000, help="ticks to step per game")
+    parser.add_argument("--games", type=int, default=1, help="games to step one after another")
+    parser.add_argument("--inputs", choices=(STILL, RANDOM, TRACKING), default=RANDOM, help="paddle inputs")
+    parser.add_argument("--dt", type=float, default=gt.DEFAULT_DT, help="game seconds per tick")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the ball and the random inputs")
+    args = parser.parse_args()
+
+    total_ticks = 0
+    total_goals = 0
+    total_seconds = 0.0
+
+    for game in range(args.games):
+        seed = None if args.seed is None else args.seed + game
+        state = new_game(seed)
+        result = run(state, args.ticks, make_inputs(args.inputs, seed), args.dt)
+        print(f"Game {game + 1}: {result}")
+
+        total_ticks += result.ticks
+        total_goals += result.goals
+        total_seconds += result.seconds
+
+    if args.games > 1:
+        print(f"Total: {simulation_result(total_ticks, total_goals, total_seconds, args.dt, {})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import selectors
+import socket
+import threading
+import time
+import game_server as gs
+import game_track as gt
+import async_server
+
+LOAD_REPORT_INTERVAL = 1
+STATUS_INTERVAL = 10
+HANDOFF_MESSAGE = b'C'
+REPORT_SIZE = 1024
+LOAD_RESOLUTION = 0.01 # loads closer than this fraction of wall time count as equal, so idle workers take turns.
+
+class worker_handle:
+    '''
+    The supervisor's view of one worker process. It requires:
+        - worker ID
+        - process, the multiprocessing.Process running the worker
+        - sock, the supervisor end of the control socket pair
+
+    It keeps the last load report of the worker:
+        - rooms, clients and open_seats
+        - load, the fraction of wall time the worker spent ticking rooms in the last report interval
+        - accepted, the number of handed off connections the worker has picked up
+    and sent, the number of connections the supervisor has handed to the worker.
+
+    Methods:
+        .pending() returns the number of connections sent but not yet picked up.
+        .estimated_open_seats() returns the free seats once the pending connections are placed.
+        .estimated_load() returns the load once the pending connections are placed, scaled by clients.
+        .handoff(client_socket) passes a connected socket to the worker.
+        .update(report) stores a load report from the worker.
+    '''
+
+    def __init__(self, worker_id: int, process, sock: socket.socket):
+        self.id = worker_id
+        self.process = process
+        self.sock = sock
+        self.rooms = 0
+        self.clients = 0
+        self.open_seats = 0
+        self.load = 0.0
+        self.accepted = 0
+        self.sent = 0
+
+    def __str__(self):
+        return f"Worker {self.id}: {self.rooms} rooms, {self.clients} clients, load {self.load:.1%}"
+
+    def pending(self) -> int:
+        return self.sent - self.accepted
+
+    def estimated_open_seats(self) -> int:
+        '''
+        Pending connections fill the open seats first, then the worker opens new rooms for the rest.
+        '''
+        overflow = self.pending() - self.open_seats
+
+        if overflow <= 0:
+            return -overflow
+
+        return -overflow % gt.MAX_PLAYERS
+
+    def estimated_load(self) -> float:
+        '''
+        The last report is up to LOAD_REPORT_INTERVAL old, so a burst of connections would all go to the worker
+        that was least loaded before the burst. Each pending connection is counted at the reported load per client.
+        '''
+        if self.clients == 0:
+            return self.load
+
+        return self.load * (self.clients + self.pending()) / self.clients
+
+    def handoff(self, client_socket: socket.socket) -> None:
+        socket.send_fds(self.sock, [HANDOFF_MESSAGE], [client_socket.fileno()])
+        self.sent += 1
+
+    def update(self, report: dict) -> None:
+        self.rooms = report["rooms"]
+        self.clients = report["clients"]
+        self.open_seats = report["open_seats"]
+        self.load = report["load"]
+        self.accepted = report["accepted"]
+
+
+class supervisor:
+    '''
+    Accepts every connection on the listening socket and hands it to one of several worker processes,
+    each running the asyncio server with its own rooms. This class requires:
+        - a server_connection object with the listening socket
+        - workers, the number of worker processes. 0 starts one per CPU core.
+        - metrics_port and metrics_interval, see server_connection.start_metrics(). Worker N serves its metrics
+          on metrics_port + 1 + N, the supervisor itself hosts no rooms and serves none.
+
+    New connections fill the open seats of existing rooms first. When there are none, the connection
+    opens a new room on the worker with the lowest tick load, estimated from its last report and the connections
+    handed to it since. Workers with about the same load take turns by number of clients.
+
+    Methods:
+        .start() starts the worker processes and the load report reader.
+        .pick_worker() returns the worker_handle the next connection should go to.
+        .accept_clients() accepts and hands off connections, this is a blocking call.
+        .close() stops every worker.
+    '''
+
+    def __init__(self, conn: gs.server_connection, workers: int = 0, metrics_port: int = 0, metrics_interval: float = 0):
+        self.conn = conn
+        self.metrics_port = metrics_port
+        self.metrics_interval = metrics_interval
+        self.worker_count = workers or os.cpu_count() or 1
+        self.workers: list[worker_handle] = []
+        self.workers_lock = threading.Lock()
+
+    def start(self) -> None:
+        ctx = multiprocessing.get_context("spawn")
+
+        for worker_id in range(self.worker_count):
+            parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+            p = ctx.Process(
+                target=run_worker,
+                args=(worker_id, child_sock, self.conn.ip, self.conn.port, self.conn.max_rooms,
+                      self.conn.scheduler.tick_rate, self.conn.scheduler.policy, self.conn.idle_timeout,
+                      self.metrics_port and self.metrics_port + 1 + worker_id, self.metrics_interval),
+                daemon=True
+            )
+            p.start()
+            child_sock.close()
+            self.workers.append(worker_handle(worker_id, p, parent_sock))
+            print(f"Started worker {worker_id} (pid {p.pid}).")
+
+        t = threading.Thread(target=self.read_reports, daemon=True)
+        t.start()
+
+    def read_reports(self) -> None:
+        '''
+        Reads the load reports the workers send every LOAD_REPORT_INTERVAL seconds.
+        '''
+        sel = selectors.DefaultSelector()
+        for w in self.workers:
+            sel.register(w.sock, selectors.EVENT_READ, w)
+
+        last_status = time.monotonic()
+
+        while True:
+            if time.monotonic() - last_status >= STATUS_INTERVAL:
+                last_status = time.monotonic()
+                with self.workers_lock:
+                    for w in self.workers:
+                        print(w)
+
+            for key, _ in sel.select():
+                w = key.data
+                try:
+                    report = json.loads(w.sock.recv(REPORT_SIZE))
+                except (OSError, ValueError) as e:
+                    print(f"Error reading report from worker {w.id}: {e}")
+                    sel.unregister(w.sock)
+                    continue
+
+                with self.workers_lock:
+                    w.update(report)
+
+    def pick_worker(self) -> worker_handle:
+        '''
+        Picks the least loaded worker that still has an open seat. If no worker has one, picks the
+        least loaded worker overall, which will open a new room for the connection. Loads within LOAD_RESOLUTION
+        of each other are a tie, broken by the clients the worker has or was sent.
+        '''
+        alive = [w for w in self.workers if w.process.is_alive()]
+
+        if not alive:
+            raise ConnectionError("No worker processes are running.")
+
+        with_seats = [w for w in alive if w.estimated_open_seats() > 0]
+        candidates = with_seats or alive
+
+        return min(candidates, key=lambda w: (round(w.estimated_load() / LOAD_RESOLUTION), w.clients + w.pending()))
+
+    def accept_clients(self) -> None:
+        ''' .accept_clients() accepts new connections and hands each one to a worker. This is a blocking call.'''
+
+        listen_socket = self.conn.socket
+        listen_socket.settimeout(gs.SOCKET_TIMEOUT)
+
+        while True:
+            try:
+                client_c, client_addr = listen_socket.accept()
+            except socket.timeout:
+                continue
+            except socket.error as e:
+                print(f"Socket Accept Error: {e}")
+                raise ConnectionError(f"Failed to accept: {self.conn.ip}:{self.conn.port}.")
+
+            try:
+                with self.workers_lock:
+                    w = self.pick_worker()
+                    w.handoff(client_c)
+                print(f"Handed {client_addr[0]}:{client_addr[1]} to worker {w.id}.")
+            except (ConnectionError, OSError) as e:
+                print(f"Rejected Client {client_addr[0]}:{client_addr[1]}: {e}")
+            finally:
+                client_c.close()
+
+    def close(self) -> None:
+        for w in self.workers:
+            if w.process.is_alive():
+                w.process.terminate()
+            w.sock.close()
+
+
+def run_worker(worker_id: int, ctrl: socket.socket, ip: str, port: int, max_rooms: int, tick_rate: float, tick_policy: str,
+               idle_timeout: float, metrics_port: int = 0, metrics_interval: float = 0) -> None:
+    '''
+    Entry point of a worker process. Runs the asyncio server on connections handed over by the supervisor.
+    '''
+    conn = gs.server_connection(None, ip, port, max_rooms, tick_rate, tick_policy, idle_timeout)
+    conn.start_metrics(metrics_port, metrics_interval)
+
+    try:
+        asyncio.run(worker_loop(worker_id, ctrl, conn))
+    except KeyboardInterrupt:
+        pass
+
+
+async def worker_loop(worker_id: int, ctrl: socket.socket, conn: gs.server_connection) -> None:
+    '''
+    Picks up connections from the control socket, ticks the worker's rooms and reports load to the supervisor.
+    '''
+    loop = asyncio.get_running_loop()
+    ctrl.setblocking(False)
+    accepted = 0
+
+    def on_handoff():
+        nonlocal accepted
+        try:
+            _, fds, _, _ = socket.recv_fds(ctrl, len(HANDOFF_MESSAGE), 1)
+        except BlockingIOError:
+            return
+
+        for fd in fds:
+            accepted += 1
+            client_c = socket.socket(fileno=fd)
+            asyncio.ensure_future(start_client(client_c))
+
+    async def start_client(client_c: socket.socket):
+        reader, writer = await asyncio.open_connection(sock=client_c)
+        await async_server.handle_client(conn, reader, writer)
+
+    loop.add_reader(ctrl.fileno(), on_handoff)
+    ball_task = asyncio.create_task(async_server.ball_updater(conn))
+    print(f"Worker {worker_id} ready.")
+
+    last_time = time.perf_counter()
+    last_tick_seconds = 0.0
+
+    try:
+        while True:
+            await asyncio.sleep(LOAD_REPORT_INTERVAL)
+
+            now = time.perf_counter()
+            report = conn.get_load()
+            report["load"] = (report["tick_seconds"] - last_tick_seconds) / (now - last_time)
+            report["accepted"] = accepted
+            last_time = now
+            last_tick_seconds = report["tick_seconds"]
+
+            try:
+                ctrl.send(json.dumps(report).encode())
+            except BlockingIOError:
+                pass
+            except OSError:
+                # the supervisor is gone.
+                break
+    finally:
+        ball_task.cancel()
+
+
+def serve(conn: gs.server_connection, workers: int = 0, metrics_port: int = 0, metrics_interval: float = 0) -> None:
+    '''
+    Runs the server as a supervisor with worker processes. Needs a Unix platform to pass sockets between processes.
+    '''
+    if not hasattr(socket, "send_fds"):
+        raise OSError("Supervisor mode needs socket.send_fds, which is not available on this platform.")
+
+    s = supervisor(conn, workers, metrics_port, metrics_interval)
+    s.start()
+
+    try:
+        s.accept_clients()
+    finally:
+        s.close()
@@ -0,0 +1,76 @@
+import math
+import time
+
+CATCH_UP = "catch_up"
+SKIP = "skip"
+MAX_CATCH_UP = 5
+REPORT_INTERVAL = 10
+
+class tick_scheduler:
+    '''
+    Schedules fixed timestep ticks on monotonic deadlines, so the tick period does not stretch by the time
+    the tick itself takes. This class requires:
+        - tick_rate, ticks per second
+        - policy, what to do with ticks whose deadline passed while the previous tick ran:
+            - CATCH_UP runs them back to back, at most max_catch_up at a time, and drops the rest.
+            - SKIP drops them and runs the next tick on the original deadline grid.
+        - max_catch_up, the most ticks run back to back with CATCH_UP.
+
+    It counts overruns, the ticks that were late by at least a whole period, and prints them every REPORT_INTERVAL seconds.
+
+    Methods:
+        .reset() starts the deadlines from now, used after the ticker was idle.
+        .delay() returns the seconds until the next deadline.
+        .due() returns how many ticks to run now and moves the deadline past them.
+    '''
+
+    def __init__(self, tick_rate: float, policy: str = CATCH_UP, max_catch_up: int = MAX_CATCH_UP):
+        if tick_rate <= 0:
+            raise ValueError("tick_rate must be positive.")
+        if policy not in (CATCH_UP, SKIP):
+            raise ValueError(f"Unknown tick policy {policy}.")
+
+        self.tick_rate = tick_rate
+        self.dt = 1 / tick_rate
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.overruns = 0
+        self.next_deadline = time.monotonic()
+        self.last_report = self.next_deadline
+        self.reported_overruns = 0
+
+    def __str__(self):
+        return f"{self.tick_rate} Hz ticks ({self.policy}), {self.overruns} overruns"
+
+    def reset(self) -> None:
+        self.next_deadline = time.monotonic()
+
+    def delay(self) -> float:
+        return max(0.0, self.next_deadline - time.monotonic())
+
+    def due(self) -> int:
+        '''
+        Returns the number of ticks to run now. 0 if the next deadline has not passed yet.
+        '''
+        now = time.monotonic()
+
+        if now < self.next_deadline:
+            return 0
+
+        # ticks whose deadline has passed, including the one due now.
+        missed = math.floor((now - self.next_deadline) / self.dt) + 1
+        self.overruns += missed - 1
+        self.next_deadline += missed * self.dt
+
+        if self.policy == SKIP:
+            run = 1
+        else:
+            run = min(missed, self.max_catch_up)
+
+        if now - self.last_report >= REPORT_INTERVAL:
+            if self.overruns > self.reported_overruns:
+                print(f"Tick overruns: {self.overruns - self.reported_overruns} in the last {now - self.last_report:.0f}s at {self.tick_rate} Hz.")
+            self.reported_overruns = self.overruns
+            self.last_report = now
+
+        return run
@@ -0,0 +1,167 @@
+'''
+Every message on the wire is a frame: a 2 byte length header in network byte order followed by the payload.
+Packets from packet.py are binary and can contain any byte, including newlines, so the length is the only
+safe way to find where a message ends.
+'''
+
+import os
+import struct
+
+HEADER = struct.Struct("!H")
+MAX_PAYLOAD_SIZE = 0xFFFF
+BUFFER_SIZE = 4096
+MAX_IOVECS = min(os.sysconf("SC_IOV_MAX"), 1024) if hasattr(os, "sysconf") else 1024 # buffers per sendmsg call.
+
+def frame(payload) -> bytes:
+    '''
+    Returns the payload with its length header in front, ready to send.
+    Raises ValueError if the payload is too large for the header.
+    '''
+
+    if isinstance(payload, str):
+        payload = payload.encode()
+
+    if len(payload) > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Payload of {len(payload)} bytes is too large for a frame.")
+
+    return HEADER.pack(len(payload)) + payload
+
+
+def send_frames(sock, frames: list) -> None:
+    '''
+    Sends every frame in frames, in order, with as few system calls as possible. The frames are passed to one
+    sendmsg call as a scatter-gather list, so they are not copied into one buffer first and a frame shared by
+    many clients is never copied at all. sendmsg can send part of the list, the rest is sent by the next call.
+    Sockets without sendmsg (Windows) get the frames joined into one sendall.
+    '''
+
+    if not hasattr(sock, "sendmsg"):
+        sock.sendall(b"".join(frames))
+        return
+
+    buffers = [memoryview(f) for f in frames]
+    first = 0
+
+    while first < len(buffers):
+        sent = sock.sendmsg(buffers[first:first + MAX_IOVECS])
+
+        # skip the buffers that were sent completely, and cut the one that was sent in part.
+        while sent:
+            size = len(buffers[first])
+
+            if sent < size:
+                buffers[first] = buffers[first][sent:]
+                break
+
+            sent -= size
+            first += 1
+
+
+class frame_buffer:
+    '''
+    A per-connection receive buffer. It is allocated once and filled with recv_into, so receiving does not
+    create a new bytes object for every recv. Each recv_into can hold several frames and every one of them
+    is kept until it is read, so messages coalesced into one TCP segment are not lost.
+
+    The buffer contains:
+        - buffer, the bytearray that is received into
+        - view, a memoryview over the buffer
+        - start, the index of the first unread byte
+        - end, the index after the last received byte
+
+    Methods:
+        .recv_into(sock) receives from the socket into the free space and returns the number of bytes read.
+        .feed(data) copies data into the buffer, for sources that are not sockets.
+        .next_frame() returns the payload of the next complete frame or None.
+        .frames() yields the payload of every complete frame.
+
+    The payloads are memoryview slices of the buffer. They are only valid until the next recv_into or feed,
+    so decode them before receiving again, or copy them with bytes().
+    '''
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def compact(self) -> None:
+        '''
+        Moves the unread bytes to the front of the buffer to make room at the end.
+        '''
+        if self.start == 0:
+            return
+
+        unread = self.end - self.start
+        self.buffer[:unread] = self.view[self.start:self.end]
+        self.start = 0
+        self.end = unread
+
+    def recv_into(self, sock) -> int:
+        '''
+        Receives as many bytes as fit in the free space of the buffer. Returns 0 if the connection was closed.
+        '''
+        if self.end == len(self.buffer):
+            self.compact()
+
+            if self.end == len(self.buffer):
+                raise ValueError("Receive buffer is full, frame is larger than the buffer.")
+
+        n = sock.recv_into(self.view[self.end:])
+        self.end += n
+        return n
+
+    def feed(self, data) -> None:
+        '''
+        Copies data into the buffer. Raises ValueError if it does not fit.
+        '''
+        if len(self.buffer) - self.end < len(data):
+            self.compact()
+
+            if len(self.buffer) - self.end < len(data):
+                raise ValueError("Receive buffer is full, frame is larger than the buffer.")
+
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def next_frame(self):
+        '''
+        Returns the payload of the next complete frame as a memoryview, or None if no complete frame is buffered.
+        '''
+        available = self.end - self.start
+
+        if available < HEADER.size:
+            return None
+
+        size, = HEADER.unpack_from(self.buffer, self.start)
+
+        if size + HEADER.size > len(self.buffer):
+            raise ValueError(f"Frame of {size} bytes is larger than the receive buffer.")
+
+        if available < HEADER.size + size:
+            return None
+
+        payload_start = self.start + HEADER.size
+        self.start = payload_start + size
+
+        if self.start == self.end:
+            # nothing left to read, the next recv can start at the front.
+            self.start = 0
+            self.end = 0
+
+        return self.view[payload_start:payload_start + size]
+
+    def frames(self):
+        '''
+        Yields the payload of every complete frame in the buffer.
+        '''
+        while True:
+            payload = self.next_frame()
+
+            if payload is None:
+                return
+
+            yield payload
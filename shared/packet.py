@@ -1,4 +1,6 @@
 import struct
+from collections import namedtuple
+from functools import lru_cache, partial
 from enum import Enum
 
 class Status(Enum):
@@ -7,7 +9,7 @@ class Status(Enum):
     
     - SUCCESS: A successful operation.
     - FAILURE: A failed operation.
-    - MOVE: when a position is updated.
+    - MOVE: a client moved its paddle. seq numbers the client's inputs so the server can acknowledge them.
     - PAUSE: when the game is paused.
     - END: when the game ends.
     - BALL_POS: when the ball position is updated.
@@ -15,6 +17,12 @@ class Status(Enum):
     - PLAYER_NEW_SLOT: when a player is assigned a new slot.
     - PLAYER_LIST: when the player list is sent.
     - SCOREBOARD: when the scoreboard is updated.
+    - SNAPSHOT: the whole world once per tick: ball, the four paddles and the score, stamped with the server time of the tick.
+    - DELTA: the fields of the world that changed since a SNAPSHOT or DELTA the client acknowledged.
+    - ACK: the client acknowledges the last tick it received.
+    - INPUT: a client pressed or released a key. direction is held until the next INPUT and the server moves the paddle.
+    - PING: either side asks for a PONG, with the time it was sent on the sender's clock.
+    - PONG: the answer to a PING, echoing its time and adding the time on the answering side's clock.
     '''
     SUCCESS = 'S'
     FAILURE = 'F'
@@ -26,110 +34,199 @@ class Status(Enum):
     PLAYER_NEW_SLOT = 'N'
     PLAYER_LIST = 'L'
     SCOREBOARD = 'T'
+    SNAPSHOT = 'W'
+    DELTA = 'D'
+    ACK = 'A'
+    INPUT = 'I'
+    PING = '?'
+    PONG = '!'
 
-def serialize(data, s: Status):
+    # Members are singletons, so hash by identity. Enum's default __hash__ is Python code and the codec looks up a
+    # status on every packet.
+    __hash__ = object.__hash__
+
+# Fields of every packet after the status byte, in order, with their struct format.
+# Fields ending in s and c fields are strings: they are encoded before packing and decoded when unloaded.
+#
+# ! - network byte order
+# c - char
+# 36s - 36 byte string (for UUID)
+# f - float (x, y)
+# B - unsigned char (for player slot)
+# b - signed char (for an input direction, -1, 0 or 1)
+# i - integer (for upper and lower score)
+# I - unsigned integer (for tick and input sequence numbers)
+# d - double (for times in seconds, see shared/timing.py)
+
+# The world state sent every tick, in order: the ball, the paddle of each slot and the score.
+WORLD_FIELDS = (
+    ("ball_x", "f"), ("ball_y", "f"),
+    ("p1_x", "f"), ("p1_y", "f"),
+    ("p2_x", "f"), ("p2_y", "f"),
+    ("p3_x", "f"), ("p3_y", "f"),
+    ("p4_x", "f"), ("p4_y", "f"),
+    ("upper_score", "i"), ("lower_score", "i"),
+    # the seq of the last MOVE the server applied for each slot, so a client can tell which of its inputs
+    # the paddle position above already includes.
+    ("p1_seq", "I"), ("p2_seq", "I"), ("p3_seq", "I"), ("p4_seq", "I"),
+)
+
+FORMATS = {
+    Status.SUCCESS: (),
+    Status.FAILURE: (),
+    Status.MOVE: (("slot", "B"), ("seq", "I"), ("x", "f"), ("y", "f")),
+    Status.PAUSE: (),
+    Status.END: (("winner", "c"),),
+    Status.BALL_POS: (("x", "f"), ("y", "f")),
+    Status.START: (),
+    # the UUID to slot mapping is only sent at join time. Every other packet refers to a player by its 1 byte slot.
+    Status.PLAYER_NEW_SLOT: (("uuid", "36s"), ("slot", "B")),
+    Status.PLAYER_LIST: (("p1", "36s"), ("p2", "36s"), ("p3", "36s"), ("p4", "36s")),
+    Status.SCOREBOARD: (("upper_score", "i"), ("lower_score", "i")),
+    # server_time is the server's time.monotonic() when the tick ran, clients convert it with their clock offset.
+    Status.SNAPSHOT: (("tick", "I"), ("server_time", "d")) + WORLD_FIELDS,
+    # followed by the WORLD_FIELDS whose bit is set in mask, see encode_delta().
+    Status.DELTA: (("tick", "I"), ("server_time", "d"), ("base", "I"), ("mask", "H")),
+    Status.ACK: (("tick", "I"),),
+    Status.INPUT: (("seq", "I"), ("direction", "b")),
+    Status.PING: (("seq", "I"), ("time", "d")),
+    Status.PONG: (("seq", "I"), ("echo", "d"), ("time", "d")),
+}
+
+def _record(s: Status, fields: tuple):
     '''
-    Tries to format the byte string before sending. Returns a package ready to encode and send.
-    Requires a dictionary with the data and a Status enum.
+    Builds the record type of a status: a namedtuple of its fields with the status as a class attribute,
+    so decoding does not have to store it in every record.
+    '''
+    base = namedtuple(s.name.title().replace("_", "") + "Packet", tuple(name for name, _ in fields))
+    return type(base.__name__, (base,), {"__slots__": (), "status": s})
+
+# Precompiled structs, status bytes and record types, built once so packing does not parse a format string per call.
+STRUCTS = {s: struct.Struct("!c" + "".join(code for _, code in fields)) for s, fields in FORMATS.items()}
+TAGS = {s: s.value.encode() for s in FORMATS}
+RECORDS = {s: _record(s, fields) for s, fields in FORMATS.items()}
+MAX_SIZE = max(st.size for st in STRUCTS.values())
+
+# Keyed by the status byte so decoding needs a single lookup: body struct without the status byte, record type
+# and the indexes of the string fields.
+_DECODERS = {
+    TAGS[s][0]: (
+        struct.Struct("!" + "".join(code for _, code in fields)),
+        RECORDS[s],
+        tuple(i for i, (_, code) in enumerate(fields) if code.endswith("s") or code == "c")
+    )
+    for s, fields in FORMATS.items()
+}
+_PACKERS = {s: partial(STRUCTS[s].pack, TAGS[s]) for s in FORMATS}
+_PACKERS_INTO = {s: (STRUCTS[s].pack_into, TAGS[s], STRUCTS[s].size) for s in FORMATS}
+_new_record = tuple.__new__
+# the mask is the last field of the DELTA header, decode_delta only needs that one.
+_DELTA_MASK = struct.Struct("!" + FORMATS[Status.DELTA][-1][1])
+
+def encode(s: Status, *values) -> bytes:
+    '''
+    Packs a packet from its field values in FORMATS order. String fields must already be bytes.
+    '''
+    return _PACKERS[s](*values)
+
+def encode_into(buffer, offset: int, s: Status, *values) -> int:
+    '''
+    Packs a packet into a reusable buffer at offset. Returns the number of bytes written.
+    '''
+    pack_into, tag, size = _PACKERS_INTO[s]
+    pack_into(buffer, offset, tag, *values)
+    return size
 
-    Currently used types:
-    ! - network byte order
-    c - char
-    36s - 36 byte string (for UUID)
-    ff - two floats (x, y)
-    H - unsigned short (for player slot)
-    ii - two integers (for upper and lower score)
+def decode(recieved):
+    '''
+    Unpacks a packet into a lightweight record (a namedtuple of RECORDS, with a .status) instead of a dictionary.
+    Accepts bytes or a memoryview, and reads the fields in place without slicing the packet.
     '''
 
-    if not data:
+    if not recieved:
         raise ValueError("No Data was provided!")
-    
-    match s:
-        case Status.MOVE:
-            return struct.pack("!c36sff", Status.MOVE.value.encode(), data["uuid"].encode(), data["x"], data["y"] )
-        case Status.PAUSE:
-            return struct.pack("!c", Status.PAUSE.value.encode())
-        case Status.BALL_POS:
-            return struct.pack("!cff", Status.BALL_POS.value.encode(), data["x"], data["y"] )
-        case Status.END:
-            return struct.pack("!c36s", Status.END.value.encode(), data["winner"].encode())
-        case Status.START:
-            return struct.pack("!c", Status.START.value.encode())
-        case Status.PLAYER_NEW_SLOT:
-            return struct.pack("!c36sH", Status.PLAYER_NEW_SLOT.value.encode(), data["uuid"].encode(), data["slot"])
-        case Status.PLAYER_LIST:
-            return struct.pack("!c36s36s36s36s", Status.PLAYER_LIST.value.encode(), 
-                                data["p1"].encode(), 
-                                data["p2"].encode(),
-                                data["p3"].encode(), 
-                                data["p4"].encode()
-                              )
-        case Status.SCOREBOARD:
-            return struct.pack("!cii", Status.SCOREBOARD.value.encode(), data["upper_score"], data["lower_score"])
-        case Status.SUCCESS:
-            return struct.pack("!c", Status.SUCCESS.value.encode())
-        
-        case _:
-            raise ValueError("Unknown type.")
-        
 
-def unload_packet(recieved):
+    decoder = _DECODERS.get(recieved[0])
 
+    if decoder is None:
+        raise ValueError("Unknown packet type.")
+
+    body, record, strings = decoder
+    values = body.unpack_from(recieved, 1)
+
+    if strings:
+        values = list(values)
+        for i in strings:
+            values[i] = values[i].decode().rstrip('\x00')
+
+    # unpack_from always returns every field, so skip the length check of namedtuple._make.
+    return _new_record(record, values)
+
+@lru_cache(maxsize=None)
+def _delta_struct(mask: int) -> struct.Struct:
     '''
-    Checks the first status then unloads the packet recieved.
-    Returns a dictionary with the status and the data.
+    Returns the struct of the WORLD_FIELDS selected by mask, built once per mask.
     '''
+    return struct.Struct("!" + "".join(code for i, (_, code) in enumerate(WORLD_FIELDS) if mask >> i & 1))
 
-    if not recieved:
+def encode_delta(tick: int, server_time: float, base: int, base_world: tuple, world: tuple) -> bytes:
+    '''
+    Packs a DELTA of world against base_world, the world of tick base that the client already has.
+    Bit i of the mask is set when field i of WORLD_FIELDS changed, and only those fields are packed after the header.
+    '''
+    mask = 0
+    changed = []
+
+    for i, (old, new) in enumerate(zip(base_world, world)):
+        if old != new:
+            mask |= 1 << i
+            changed.append(new)
+
+    return STRUCTS[Status.DELTA].pack(TAGS[Status.DELTA], tick, server_time, base, mask) + _delta_struct(mask).pack(*changed)
+
+def decode_delta(recieved, base_world: tuple) -> tuple:
+    '''
+    Applies a DELTA packet to base_world, the world of the tick in its base field. Returns the new world.
+    '''
+    header = STRUCTS[Status.DELTA]
+    mask, = _DELTA_MASK.unpack_from(recieved, header.size - _DELTA_MASK.size)
+    changed = iter(_delta_struct(mask).unpack_from(recieved, header.size))
+
+    return tuple(next(changed) if mask >> i & 1 else old for i, old in enumerate(base_world))
+
+def values_of(data: dict, s: Status) -> list:
+    '''
+    Returns the field values of a packet dictionary in FORMATS order, with strings encoded.
+    '''
+    values = []
+    for field, _ in FORMATS[s]:
+        value = data[field]
+        if isinstance(value, str):
+            value = value.encode()
+        values.append(value)
+    return values
+
+def serialize(data, s: Status):
+    '''
+    Tries to format the byte string before sending. Returns a package ready to encode and send.
+    Requires a dictionary with the data and a Status enum. The fields of each status are listed in FORMATS.
+    '''
+
+    if data is None:
         raise ValueError("No Data was provided!")
-    
-    
-    # Check the first byte to determine the packet type
-    s = Status(struct.unpack("!c", recieved[:1])[0].decode())
-
-    match s:
-        case Status.MOVE:
-            uuid, x, y = struct.unpack("!36sff", recieved[1:])
-            return {'status': Status.MOVE, 'uuid': uuid.decode(), 'x': x, 'y': y}
-        case Status.PAUSE:
-            return {'status': Status.PAUSE}
-        case Status.END:
-            winner, = struct.unpack("!36s", recieved[1:])
-            return {'status': Status.END, 'winner': winner.decode()}
-        case Status.BALL_POS:
-            x, y = struct.unpack("!ff", recieved[1:])
-            return {'status': Status.BALL_POS, 'x': x, 'y': y}
-        case Status.START:
-            return {'status': Status.START}
-        case Status.PLAYER_NEW_SLOT:
-            uuid, slot = struct.unpack("!36sH", recieved[1:])
-            return {'status': Status.PLAYER_NEW_SLOT, 'uuid': uuid.decode(), 'slot': slot}
-        case Status.PLAYER_LIST:
-            p1, p2, p3, p4 = struct.unpack("!36s36s36s36s", recieved[1:])
-            return {
-                'status': Status.PLAYER_LIST,
-                'p1': p1.decode().strip('\x00'),
-                'p2': p2.decode().strip('\x00'),
-                'p3': p3.decode().strip('\x00'),
-                'p4': p4.decode().strip('\x00')
-            }
-        case Status.SCOREBOARD:
-            upper_score, lower_score = struct.unpack("!ii", recieved[1:])
-            return {
-                'status': Status.SCOREBOARD, 
-                'upper_score': upper_score, 
-                'lower_score': lower_score
-            }
-        case Status.SUCCESS:
-            return {'status': Status.SUCCESS}
-        
 
-        case _:
-            raise ValueError("Unknown packet type.")
+    if s not in STRUCTS:
+        raise ValueError("Unknown type.")
 
-    pass
+    return encode(s, *values_of(data, s))
+        
 
-    
-    
+def unload_packet(recieved):
 
+    '''
+    Checks the first status then unloads the packet recieved.
+    Returns a dictionary with the status and the data.
+    '''
 
+    record = decode(recieved)
+    return {'status': record.status, **record._asdict()}
@@ -0,0 +1,78 @@
+'''
+Round trip time and clock offset estimates from PING and PONG packets. Either side sends a PING with its own
+clock, the other side answers with a PONG that echoes that time and adds its own clock:
+
+    PING(seq, time=t0)  ->  PONG(seq, echo=t0, time=remote)  received at t1
+
+The round trip is t1 - t0. If the trip was as long both ways, the remote clock read remote at (t0 + t1) / 2 on ours,
+so the offset between the clocks is remote - (t0 + t1) / 2. Both clocks are time.monotonic().
+'''
+
+import time
+from collections import deque
+from typing import Optional
+
+PING_INTERVAL = 1 # seconds between PINGs from each side.
+RTT_GAIN = 1 / 8 # weight of a new sample in the smoothed RTT, as in TCP (RFC 6298).
+JITTER_GAIN = 1 / 4 # weight of a new sample in the jitter, the smoothed deviation of the RTT.
+OFFSET_WINDOW = 16 # samples the clock offset is picked from.
+
+class rtt_estimator:
+    '''
+    Smoothed round trip time, jitter and clock offset of one connection. It contains:
+        - srtt: smoothed round trip time in seconds, None before the first sample
+        - jitter: smoothed deviation of the round trip time in seconds
+        - rtt: the last round trip time measured
+        - offset: remote clock minus our clock in seconds, None before the first sample with a remote time
+        - samples: the number of PONGs measured
+
+    The offset is taken from the sample with the shortest round trip of the last OFFSET_WINDOW, the one that
+    waited least in queues and so is the least lopsided between the two directions.
+
+    Methods:
+        .sample(sent, received, remote) adds a PONG for a PING sent at sent and received at received, both on our
+            clock. remote is the other side's clock from the PONG, or None to only measure the round trip.
+        .to_local(remote_time) converts a time on the remote clock to ours.
+        .remote_now() returns the time on the remote clock now.
+        .synced() returns True once there is a clock offset.
+    '''
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.jitter = 0.0
+        self.rtt = 0.0
+        self.offset: Optional[float] = None
+        self.samples = 0
+        self.offsets: deque[tuple[float, float]] = deque(maxlen=OFFSET_WINDOW) # (rtt, offset)
+
+    def __str__(self):
+        if self.srtt is None:
+            return "no RTT yet"
+        return f"RTT {self.srtt * 1000:.1f}ms, jitter {self.jitter * 1000:.1f}ms"
+
+    def sample(self, sent: float, received: float, remote: Optional[float] = None) -> float:
+        rtt = max(received - sent, 0.0)
+        self.rtt = rtt
+        self.samples += 1
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.jitter = rtt / 2
+        else:
+            self.jitter += (abs(rtt - self.srtt) - self.jitter) * JITTER_GAIN
+            self.srtt += (rtt - self.srtt) * RTT_GAIN
+
+        if remote is not None:
+            self.offsets.append((rtt, remote - (sent + received) / 2))
+            self.offset = min(self.offsets)[1]
+
+        return rtt
+
+    def synced(self) -> bool:
+        return self.offset is not None
+
+    def to_local(self, remote_time: float) -> float:
+        return remote_time - (self.offset or 0.0)
+
+    def remote_now(self) -> float:
+        return time.monotonic() + (self.offset or 0.0)
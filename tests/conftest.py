@@ -0,0 +1,8 @@
+import os, sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# the server and client import their own modules by name, like when they are run from their folders.
+for path in (ROOT, os.path.join(ROOT, 'server'), os.path.join(ROOT, 'client')):
+    if path not in sys.path:
+        sys.path.append(path)
@@ -0,0 +1,67 @@
+import pytest
+import game_track as gt
+import simulation
+
+np = pytest.importorskip("numpy")
+import batch_physics
+
+GAMES = 8
+TICKS = 3000
+
+
+@pytest.mark.parametrize("dt", [gt.DEFAULT_DT, 0.4])
+def test_batch_matches_game_states_in_lockstep(dt):
+    states = [simulation.new_game(seed) for seed in range(GAMES)]
+    inputs = [simulation.random_inputs(seed) for seed in range(GAMES)]
+    batch = batch_physics.batch_world.from_states(states, seed=0)
+    goals = 0
+    hits = 0
+
+    for tick in range(TICKS):
+        directions = [dict(i(state, tick)) for i, state in zip(inputs, states)]
+        scores = [(s.scoreboard["upper_score"], s.scoreboard["lower_score"]) for s in states]
+
+        for state, d in zip(states, directions):
+            simulation.step(state, d, dt)
+
+        batch.move_paddles(np.array([[d[slot] for slot in gt.SLOTS] for d in directions]), dt)
+        batch.step(dt)
+
+        for i, state in enumerate(states):
+            ball = state.ball
+            assert batch.upper_score[i] == ball.scoreboard_ref["upper_score"]
+            assert batch.lower_score[i] == ball.scoreboard_ref["lower_score"]
+
+            if (ball.scoreboard_ref["upper_score"], ball.scoreboard_ref["lower_score"]) != scores[i]:
+                # after a goal the two engines pick the new direction from different generators.
+                goals += 1
+                batch.x_fac[i] = ball.xFac
+                batch.y_fac[i] = ball.yFac
+
+            assert batch.x[i] == pytest.approx(ball.x)
+            assert batch.y[i] == pytest.approx(ball.y)
+            assert batch.x_fac[i] == ball.xFac
+            assert batch.y_fac[i] == ball.yFac
+            assert batch_physics.SIDES[batch.side[i]] == ball.side
+            hits += ball.side != gt.Side.NONE
+
+            for column, slot in enumerate(gt.SLOTS):
+                assert batch.px[i, column] == pytest.approx(state.player(slot).x)
+                assert batch.py[i, column] == pytest.approx(state.player(slot).y)
+
+    # the run has to cover paddle hits and goals to compare anything but wall bounces.
+    assert goals > 0
+    assert hits > 0
+
+
+def test_store_and_load_round_trip():
+    state = simulation.new_game(1)
+    simulation.run(state, 500, simulation.random_inputs(1))
+
+    batch = batch_physics.batch_world.from_states([state])
+    copy = simulation.new_game(2)
+    batch.store(0, copy)
+
+    assert (copy.ball.x, copy.ball.y, copy.ball.xFac, copy.ball.yFac) == (state.ball.x, state.ball.y, state.ball.xFac, state.ball.yFac)
+    assert copy.ball.scoreboard_ref == state.ball.scoreboard_ref
+    assert [(p.x, p.y) for p in copy.players] == [(p.x, p.y) for p in state.players]
@@ -0,0 +1,49 @@
+import socket
+import connect
+from shared import packet, framing
+
+# a world with every field set, in packet.WORLD_FIELDS order.
+WORLD = tuple(1.5 if code == "f" else 3 for _, code in packet.WORLD_FIELDS)
+
+
+def test_acks_snapshots_and_every_ack_interval_ticks():
+    server_end, client_end = socket.socketpair()
+    conn = connect.client_connection(client_end, "127.0.0.1", 0)
+
+    try:
+        conn.receive_world(packet.encode(packet.Status.SNAPSHOT, 1, 0.0, *WORLD))
+
+        for tick in range(2, 2 + 2 * connect.ACK_INTERVAL):
+            assert conn.receive_world(packet.encode_delta(tick, 0.0, 1, WORLD, WORLD)) == WORLD
+
+        server_end.settimeout(1)
+        buffer = framing.frame_buffer()
+        buffer.recv_into(server_end)
+        acked = [packet.decode(data).tick for data in buffer.frames()]
+
+        assert acked == [1, 1 + connect.ACK_INTERVAL, 1 + 2 * connect.ACK_INTERVAL]
+    finally:
+        server_end.close()
+        client_end.close()
+
+
+def test_worlds_are_kept_for_world_history_size_ticks():
+    server_end, client_end = socket.socketpair()
+    conn = connect.client_connection(client_end, "127.0.0.1", 0)
+    moved = (2.5,) + WORLD[1:]
+
+    try:
+        conn.receive_world(packet.encode(packet.Status.SNAPSHOT, 1, 0.0, *WORLD))
+
+        # every other tick, like ticks the server skipped, each one a delta against the one before.
+        for tick in range(3, 3 + 2 * connect.WORLD_HISTORY_SIZE, 2):
+            assert conn.receive_world(packet.encode_delta(tick, 0.0, tick - 2, WORLD, WORLD)) == WORLD
+
+        last = 1 + 2 * connect.WORLD_HISTORY_SIZE
+        # tick 1 is more than WORLD_HISTORY_SIZE ticks old and has been replaced, the last tick is still kept.
+        assert conn.receive_world(packet.encode_delta(last + 2, 0.0, 1, WORLD, moved)) is None
+        assert conn.receive_world(packet.encode_delta(last + 2, 0.0, last, WORLD, moved)) == moved
+        assert len(conn.worlds) == connect.WORLD_HISTORY_SIZE
+    finally:
+        server_end.close()
+        client_end.close()
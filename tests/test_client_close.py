@@ -0,0 +1,26 @@
+import socket
+import time
+import game_server as gs
+
+
+def test_close_stops_writer_blocked_in_send():
+    server_end, client_end = socket.socketpair()
+    server_end.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    c = gs.client("player-1", server_end, "127.0.0.1", 1)
+    c.start_writer()
+
+    try:
+        # the peer never reads, so the writer blocks in sendmsg part way through these frames.
+        for _ in range(4):
+            c.send(bytes(32 * 1024))
+        deadline = time.monotonic() + 2
+        while c.queue_depth() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert c.queue_depth() == 0
+        assert c.writer_thread.is_alive()
+
+        c.close()
+        c.writer_thread.join(2)
+        assert not c.writer_thread.is_alive()
+    finally:
+        client_end.close()
@@ -0,0 +1,50 @@
+import os
+import socket
+import threading
+import time
+import importlib.util
+import pytest
+
+# the client opens a window when pong_setup is imported.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+pygame = pytest.importorskip("pygame")
+
+import connect
+from shared import packet, framing
+
+# server/main.py is also on the path as main, so load the client's by file.
+_spec = importlib.util.spec_from_file_location("client_main", os.path.join(os.path.dirname(connect.__file__), "main.py"))
+client_main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(client_main)
+
+
+def test_end_packet_ends_the_game_with_its_winner():
+    server_end, client_end = socket.socketpair()
+    conn = connect.client_connection(client_end, "127.0.0.1", 0)
+    client_main.ended = False
+    client_main.winner = ""
+
+    t = threading.Thread(target=client_main.recv_handler, args=(conn, ), daemon=True)
+    t.start()
+
+    try:
+        # END is 2 bytes, shorter than any packet the receive loop used to accept.
+        server_end.sendall(framing.frame(packet.encode(packet.Status.END, b"u")))
+
+        deadline = time.monotonic() + 2
+        while not client_main.ended and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        with client_main.end_lock:
+            assert client_main.ended
+            # ended by the END packet, not by the connection closing.
+            assert client_main.winner == ""
+        # the side in the END packet wins, even though the scoreboard is still 0-0.
+        assert conn.get_winner() == "upper"
+    finally:
+        server_end.close()
+        t.join(2)
+        client_end.close()
+        client_main.ended = False
+        client_main.winner = ""
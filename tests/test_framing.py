@@ -0,0 +1,138 @@
+import socket
+import pytest
+from shared import framing
+
+
+def payloads(buffer: framing.frame_buffer) -> list:
+    return [bytes(p) for p in buffer.frames()]
+
+
+def test_coalesced_frames_are_all_kept():
+    buffer = framing.frame_buffer()
+    buffer.feed(framing.frame(b"one") + framing.frame(b"") + framing.frame(b"three"))
+
+    assert payloads(buffer) == [b"one", b"", b"three"]
+    assert len(buffer) == 0
+
+
+def test_frame_split_across_reads():
+    data = framing.frame(b"hello") + framing.frame(b"world")
+    buffer = framing.frame_buffer()
+    received = []
+
+    # one byte at a time, the header is split as well as the payload.
+    for i in range(len(data)):
+        buffer.feed(data[i:i + 1])
+        received += payloads(buffer)
+
+    assert received == [b"hello", b"world"]
+
+
+def test_partial_frame_waits_for_the_rest():
+    data = framing.frame(b"abcdef")
+    buffer = framing.frame_buffer()
+
+    buffer.feed(data[:1])
+    assert buffer.next_frame() is None
+    buffer.feed(data[1:5])
+    assert buffer.next_frame() is None
+    buffer.feed(data[5:])
+    assert bytes(buffer.next_frame()) == b"abcdef"
+    assert buffer.next_frame() is None
+
+
+def test_unread_bytes_are_compacted_to_make_room():
+    buffer = framing.frame_buffer(16)
+    buffer.feed(framing.frame(b"12345678") + framing.frame(b"ab")[:3])
+    assert payloads(buffer) == [b"12345678"]
+
+    # the rest of the second frame only fits once the first one is moved out of the way.
+    buffer.feed(b"b" + framing.frame(b"0123456789"))
+    assert payloads(buffer) == [b"ab", b"0123456789"]
+
+
+def test_frame_larger_than_the_buffer_is_rejected():
+    buffer = framing.frame_buffer(16)
+    buffer.feed(framing.frame(bytes(20))[:16])
+
+    with pytest.raises(ValueError):
+        buffer.next_frame()
+
+
+def test_recv_into_reads_frames_from_a_socket():
+    a, b = socket.socketpair()
+    buffer = framing.frame_buffer()
+
+    try:
+        a.sendall(framing.frame(b"ping") + framing.frame(b"pong")[:3])
+        assert buffer.recv_into(b) == 9
+        assert payloads(buffer) == [b"ping"]
+
+        a.sendall(b"ong")
+        assert buffer.recv_into(b) == 3
+        assert payloads(buffer) == [b"pong"]
+
+        a.close()
+        assert buffer.recv_into(b) == 0
+    finally:
+        a.close()
+        b.close()
+
+
+def test_frame_rejects_oversized_payloads():
+    assert framing.frame("hi") == b"\x00\x02hi"
+
+    with pytest.raises(ValueError):
+        framing.frame(bytes(framing.MAX_PAYLOAD_SIZE + 1))
+
+
+class partial_socket:
+    '''Accepts at most limit bytes per sendmsg, like a socket with a nearly full send buffer.'''
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.sent = bytearray()
+        self.calls = 0
+
+    def sendmsg(self, buffers) -> int:
+        self.calls += 1
+        data = b"".join(bytes(b) for b in buffers)[:self.limit]
+        self.sent += data
+        return len(data)
+
+
+@pytest.mark.parametrize("limit", [1, 3, 5, 7, 1000])
+def test_send_frames_resumes_after_a_partial_sendmsg(limit):
+    frames = [framing.frame(b"ping"), framing.frame(b""), framing.frame(bytes(range(200)))]
+    sock = partial_socket(limit)
+
+    framing.send_frames(sock, frames)
+
+    assert bytes(sock.sent) == b"".join(frames)
+    assert sock.calls == -(-len(sock.sent) // limit)
+
+
+def test_send_frames_splits_more_buffers_than_one_sendmsg_takes():
+    frames = [framing.frame(bytes([i % 256])) for i in range(framing.MAX_IOVECS + 5)]
+    sock = partial_socket(1 << 20)
+
+    framing.send_frames(sock, frames)
+
+    assert bytes(sock.sent) == b"".join(frames)
+    assert sock.calls == 2
+
+
+def test_send_frames_without_sendmsg_uses_sendall():
+    a, b = socket.socketpair()
+    frames = [framing.frame(b"ping"), framing.frame(b"pong")]
+
+    class no_sendmsg:
+        def sendall(self, data):
+            a.sendall(data)
+
+    try:
+        framing.send_frames(no_sendmsg(), frames)
+        assert b.recv(64) == b"".join(frames)
+    finally:
+        a.close()
+        b.close()
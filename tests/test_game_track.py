@@ -0,0 +1,79 @@
+import pytest
+import game_track as gt
+import simulation
+
+LONG_DT = 0.4 # about 67 pixels per tick, more than a paddle is wide.
+
+
+def ball_at(state: gt.Game_State, x: float, y: float, xFac: int, yFac: int, side=gt.Side.NONE) -> gt.Game_State.Ball:
+    ball = state.ball
+    ball.x, ball.y = x, y
+    ball.xFac, ball.yFac = xFac, yFac
+    ball.side = side
+    return ball
+
+
+def test_long_tick_does_not_tunnel_through_a_paddle():
+    state = simulation.new_game(0)
+    # heading for the left goal, last touched by the lower side, so passing the paddle would score.
+    ball = ball_at(state, 60.0, 300.0, -1, 1, gt.Side.LOWER)
+
+    ball.update(players=state.players, dt=LONG_DT)
+
+    step = ball.speed * LONG_DT
+    paddle_right = gt.HOME_POSITIONS[1][0] + gt.PADDLE_WIDTH
+    assert ball.xFac == 1
+    assert ball.side == gt.Side.UPPER
+    assert ball.last_touched_player == 1
+    assert ball.x == pytest.approx(paddle_right + (step - (60.0 - paddle_right)))
+    assert state.scoreboard == {"upper_score": 0, "lower_score": 0}
+
+
+def test_fast_ball_stays_inside_the_walls():
+    state = gt.Game_State()
+    ball = ball_at(state, 450.0, 300.0, 1, -1)
+    ball.speed = gt.BALL_SPEED * 20
+
+    for _ in range(10):
+        ball.update(players=state.players, dt=LONG_DT)
+        assert 0 <= ball.x <= gt.WIDTH
+        assert 0 <= ball.y <= gt.HEIGHT
+
+
+def test_corner_reflects_both_axes():
+    state = gt.Game_State()
+    ball = ball_at(state, 10.0, 10.0, -1, -1)
+
+    ball.update(players=state.players, dt=LONG_DT)
+
+    step = ball.speed * LONG_DT
+    assert (ball.xFac, ball.yFac) == (1, 1)
+    assert ball.x == pytest.approx(step - 10.0)
+    assert ball.y == pytest.approx(step - 10.0)
+
+
+def test_ball_bounces_off_the_end_of_a_paddle():
+    state = simulation.new_game(0)
+    left, top = gt.HOME_POSITIONS[1]
+    # comes down onto the top end of the left paddle.
+    ball = ball_at(state, left - 15.0, top - 20.0, 1, 1)
+
+    ball.update(players=state.players, dt=LONG_DT)
+
+    step = ball.speed * LONG_DT
+    assert (ball.xFac, ball.yFac) == (1, -1)
+    assert ball.side == gt.Side.UPPER
+    assert ball.last_touched_player == 1
+    assert ball.x == pytest.approx(left - 15.0 + step)
+    assert ball.y == pytest.approx(top - (step - 20.0))
+
+
+def test_ball_behind_a_paddle_goes_into_the_goal():
+    state = simulation.new_game(0)
+    left, top = gt.HOME_POSITIONS[1]
+    ball = ball_at(state, left - 5.0, top + 50.0, -1, 1, gt.Side.LOWER)
+
+    ball.update(players=state.players, dt=LONG_DT)
+
+    # the lower side scored on the left wall.
+    assert state.scoreboard == {"upper_score": 0, "lower_score": 1}
@@ -0,0 +1,23 @@
+import connect
+
+
+def test_reconcile_replays_unacknowledged_inputs_with_their_frame_time():
+    history = connect.input_history()
+    first = history.record(1, 0.016)
+    history.record(-1, 0.033)
+    history.record(1, 0.020)
+
+    assert history.reconcile() is None
+
+    history.acknowledge(first, 20.0, 240.0)
+    assert history.reconcile() == (20.0, 240.0, [(-1, 0.033), (1, 0.020)])
+    # the position is used once.
+    assert history.reconcile() is None
+
+
+def test_position_before_any_applied_input_is_ignored():
+    history = connect.input_history()
+    history.record(1, 0.016)
+
+    history.acknowledge(0, 0.0, 0.0)
+    assert history.reconcile() is None
@@ -0,0 +1,45 @@
+import socket
+import pytest
+import loadgen
+from shared import packet, framing
+
+
+@pytest.fixture
+def pair():
+    bot_end, server_end = socket.socketpair()
+    bot_end.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    bot_end.setblocking(False)
+    yield loadgen.bot_connection(bot_end, "127.0.0.1", 1), server_end
+    bot_end.close()
+    server_end.close()
+
+
+def test_partial_sends_wait_in_the_outbound_queue(pair):
+    conn, server_end = pair
+    sent = 0
+
+    # the server does not read, so the socket fills up and the rest of the frames are queued.
+    while not conn.outbound:
+        conn.send_values(packet.Status.ACK, sent)
+        sent += 1
+
+    buffer = framing.frame_buffer()
+    received = []
+    server_end.settimeout(1)
+    while len(received) < sent:
+        conn.flush()
+        buffer.recv_into(server_end)
+        received += [packet.decode(data).tick for data in buffer.frames()]
+
+    assert received == list(range(sent))
+    assert conn.flush()
+
+
+def test_full_outbound_queue_drops_the_bot(pair):
+    conn, _ = pair
+
+    with pytest.raises(OSError):
+        for tick in range(loadgen.MAX_OUTBOUND):
+            conn.send_values(packet.Status.ACK, tick)
+
+    assert len(conn.outbound) > loadgen.MAX_OUTBOUND
@@ -0,0 +1,105 @@
+import pytest
+from shared import packet
+
+UUID = "3f2b7c1e-9a4d-4e8b-b5c6-0d1e2f3a4b5c"
+
+# a value for every struct code in packet.FORMATS that survives packing unchanged, floats included.
+SAMPLES = {"f": 1.5, "d": 2.25, "i": -3, "I": 7, "H": 2, "B": 1, "b": -1, "c": "u", "36s": UUID}
+
+
+def fields(s: packet.Status) -> dict:
+    return {name: SAMPLES[code] for name, code in packet.FORMATS[s]}
+
+
+def encoded(values) -> list:
+    return [value.encode() if isinstance(value, str) else value for value in values]
+
+
+def test_every_status_has_a_format():
+    assert set(packet.FORMATS) == set(packet.Status)
+
+
+@pytest.mark.parametrize("s", list(packet.Status), ids=lambda s: s.name)
+def test_encode_decode_round_trip(s):
+    values = fields(s)
+    data = packet.encode(s, *encoded(values.values()))
+
+    assert len(data) == packet.STRUCTS[s].size
+    assert data[:1] == s.value.encode()
+
+    record = packet.decode(data)
+    assert record.status is s
+    assert record._asdict() == values
+
+
+@pytest.mark.parametrize("s", list(packet.Status), ids=lambda s: s.name)
+def test_encode_into_decodes_in_place(s):
+    values = fields(s)
+    buffer = bytearray(packet.MAX_SIZE + 3)
+
+    size = packet.encode_into(buffer, 3, s, *encoded(values.values()))
+
+    assert size == packet.STRUCTS[s].size
+    assert packet.decode(memoryview(buffer)[3:3 + size])._asdict() == values
+
+
+@pytest.mark.parametrize("s", list(packet.Status), ids=lambda s: s.name)
+def test_dictionary_wrappers_round_trip(s):
+    values = fields(s)
+    data = packet.serialize(values, s)
+
+    assert data == packet.encode(s, *encoded(values.values()))
+    assert packet.unload_packet(data) == {"status": s, **values}
+
+
+def test_short_strings_are_padded_and_stripped():
+    s = packet.Status.PLAYER_LIST
+    record = packet.decode(packet.encode(s, UUID.encode(), b"", b"", b"abc"))
+
+    assert tuple(record) == (UUID, "", "", "abc")
+
+
+def test_bad_packets_are_rejected():
+    with pytest.raises(ValueError):
+        packet.decode(b"")
+
+    with pytest.raises(ValueError):
+        packet.decode(b"\xff")
+
+    with pytest.raises(ValueError):
+        packet.serialize(None, packet.Status.SUCCESS)
+
+
+WORLD = tuple(SAMPLES[code] for _, code in packet.WORLD_FIELDS)
+
+
+def delta_world(mask: int) -> tuple:
+    '''WORLD with the fields selected by mask changed.'''
+    return tuple(value + 1 if mask >> i & 1 else value for i, value in enumerate(WORLD))
+
+
+def test_delta_with_every_field_changed():
+    full = (1 << len(packet.WORLD_FIELDS)) - 1
+    world = delta_world(full)
+    data = packet.encode_delta(9, 2.5, 4, WORLD, world)
+
+    record = packet.decode(data)
+    assert (record.tick, record.server_time, record.base, record.mask) == (9, 2.5, 4, full)
+    assert packet.decode_delta(data, WORLD) == world
+
+
+def test_delta_with_nothing_changed():
+    data = packet.encode_delta(9, 2.5, 4, WORLD, WORLD)
+
+    assert len(data) == packet.STRUCTS[packet.Status.DELTA].size
+    assert packet.decode(data).mask == 0
+    assert packet.decode_delta(data, WORLD) == WORLD
+
+
+def test_delta_with_some_fields_changed():
+    mask = 0b100000000101
+    world = delta_world(mask)
+    data = packet.encode_delta(9, 2.5, 4, WORLD, world)
+
+    assert packet.decode(data).mask == mask
+    assert packet.decode_delta(memoryview(data), WORLD) == world
@@ -0,0 +1,120 @@
+import socket
+import time
+import pytest
+import game_server as gs
+import game_track as gt
+from shared import packet, framing
+
+
+@pytest.fixture
+def lobby():
+    '''A room with one player, so the match is paused.'''
+    r = gs.room(1)
+    server_end, client_end = socket.socketpair()
+    c = gs.client("player-1", server_end, "127.0.0.1", 1)
+    c.room = r
+    r.add_client(c)
+    assert r.join(c)
+    yield r, c
+    c.close()
+    client_end.close()
+
+
+def test_move_in_paused_room_keeps_ticking(lobby):
+    r, c = lobby
+    assert not r.tick()
+
+    r.handle_packet(c, packet.encode(packet.Status.MOVE, c.slot, 1, 20.0, 255.0))
+
+    assert r.game_state.is_paused()
+    assert r.tick()
+    # nothing moved since, so the room goes back to idle.
+    assert not r.tick()
+
+
+def test_held_paddle_in_paused_room_keeps_ticking(lobby):
+    r, c = lobby
+    player = r.game_state.player(c.slot)
+    start = player.y
+
+    r.handle_packet(c, packet.encode(packet.Status.INPUT, 1, 1))
+    assert r.tick()
+    assert r.tick()
+    assert player.y > start
+
+    r.handle_packet(c, packet.encode(packet.Status.INPUT, 2, 0))
+    # the release is sent once, then the room goes back to idle.
+    assert r.tick()
+    assert not r.tick()
+
+
+def test_end_carries_the_winning_side():
+    r = gs.room(1)
+    pairs = [socket.socketpair() for _ in range(gt.MAX_PLAYERS)]
+    clients = [gs.client(f"player-{i}", server_end, "127.0.0.1", i) for i, (server_end, _) in enumerate(pairs)]
+
+    try:
+        for c in clients:
+            c.start_writer()
+            c.room = r
+            r.add_client(c)
+            assert r.join(c)
+
+        r.game_state.scoreboard["lower_score"] = gs.TARGET_SCORE
+        r.tick()
+
+        buffer = framing.frame_buffer()
+        client_end = pairs[0][1]
+        client_end.settimeout(1)
+        ends = []
+        while not ends:
+            assert buffer.recv_into(client_end)
+            # the first frame is the bare UUID, so only decode END packets.
+            ends = [packet.decode(f) for f in buffer.frames() if f[:1] == packet.TAGS[packet.Status.END]]
+
+        # the ball's side is reset after a goal, END has to carry the side that reached the target score.
+        assert ends[0].winner == gt.Side.LOWER.value
+    finally:
+        for c in clients:
+            c.close()
+        for _, client_end in pairs:
+            client_end.close()
+
+
+def test_idle_lobby_sends_a_keepalive():
+    r = gs.room(1)
+    server_end, client_end = socket.socketpair()
+    c = gs.client("player-1", server_end, "127.0.0.1", 1)
+    c.start_writer()
+    c.room = r
+    r.add_client(c)
+    buffer = framing.frame_buffer()
+    client_end.settimeout(0.2)
+
+    def received() -> list:
+        try:
+            while buffer.recv_into(client_end):
+                pass
+        except socket.timeout:
+            pass
+        return [bytes(f) for f in buffer.frames()]
+
+    def statuses() -> list:
+        return [packet.decode(f).status for f in received()]
+
+    try:
+        assert r.join(c)
+        r.tick()
+        # the join handshake, starting with the bare UUID.
+        received()
+
+        # nothing changed, so the lobby is silent until KEEPALIVE_INTERVAL has passed.
+        assert not r.tick()
+        assert statuses() == []
+
+        r.last_broadcast = time.monotonic() - gs.KEEPALIVE_INTERVAL
+        assert not r.tick()
+        assert statuses() == [packet.Status.PLAYER_LIST]
+    finally:
+        c.close()
+        client_end.close()
@@ -0,0 +1,30 @@
+import os
+import pytest
+
+# the client opens a window when pong_setup is imported.
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+pygame = pytest.importorskip("pygame")
+
+import pong_setup
+from Striker import striker
+
+
+@pytest.mark.parametrize("fps", [30, 60, 144])
+def test_striker_moves_the_same_distance_per_second_at_any_frame_rate(fps):
+    s = striker(20, 0, 10, 100, pong_setup.STRIKER_SPEED, pong_setup.GREEN)
+
+    for _ in range(fps // 2):
+        s.updateVert(1, 1 / fps)
+
+    assert s.posy == pytest.approx(pong_setup.STRIKER_SPEED / 2)
+
+
+def test_striker_stays_on_the_screen():
+    s = striker(0, pong_setup.HEIGHT - 110, 100, 10, pong_setup.STRIKER_SPEED, pong_setup.GREEN)
+
+    s.updateHori(-1, 1)
+    assert s.posx == 0
+
+    s.updateHori(1, 10)
+    assert s.posx == pong_setup.WIDTH - s.width
@@ -0,0 +1,67 @@
+import socket
+import pytest
+import supervisor
+import game_server as gs
+import game_track as gt
+
+
+class running_process:
+    pid = 0
+
+    def is_alive(self) -> bool:
+        return True
+
+
+@pytest.fixture
+def workers():
+    pairs = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(2)]
+    s = supervisor.supervisor(gs.server_connection(None, "127.0.0.1", 0), workers=2)
+    s.workers = [supervisor.worker_handle(i, running_process(), parent) for i, (parent, _) in enumerate(pairs)]
+    yield s.workers, s
+    for parent, child in pairs:
+        parent.close()
+        child.close()
+
+
+def hand_off(s: supervisor.supervisor, connections: int) -> list:
+    counts = [0] * len(s.workers)
+
+    with socket.socket() as client_socket:
+        for _ in range(connections):
+            w = s.pick_worker()
+            w.handoff(client_socket)
+            counts[w.id] += 1
+
+    return counts
+
+
+def test_burst_spreads_across_idle_workers(workers):
+    handles, s = workers
+    # both idle, with a little noise in the reported load like real workers.
+    handles[0].load = 0.0002
+    handles[1].load = 0.0001
+
+    counts = hand_off(s, 40)
+
+    assert counts == [20, 20]
+
+
+def test_burst_fills_open_seats_first(workers):
+    handles, s = workers
+    handles[0].update({"rooms": 1, "clients": 3, "open_seats": 1, "load": 0.02, "accepted": 0})
+    handles[1].update({"rooms": 0, "clients": 0, "open_seats": 0, "load": 0.0, "accepted": 0})
+
+    assert s.pick_worker() is handles[0]
+    handles[0].sent += 1
+    assert s.pick_worker() is handles[1]
+
+
+def test_burst_follows_load_per_client(workers):
+    handles, s = workers
+    # the same clients, but worker 0 spends twice as long ticking them.
+    handles[0].update({"rooms": 2, "clients": 8, "open_seats": 0, "load": 0.4, "accepted": 0})
+    handles[1].update({"rooms": 2, "clients": 8, "open_seats": 0, "load": 0.2, "accepted": 0})
+
+    counts = hand_off(s, 4 * gt.MAX_PLAYERS * 3)
+
+    assert 0 < counts[0] < counts[1]